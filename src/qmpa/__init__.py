@@ -1,6 +1,17 @@
 from qmpa import allocator
+from qmpa import ancilla
+from qmpa import batch
 from qmpa import circuit
+from qmpa import compiler
 from qmpa import constraints
+from qmpa import gate_store
 from qmpa import gates
+from qmpa import liveness
+from qmpa import optimize
+from qmpa import policy_compare
+from qmpa import profiler
 from qmpa import qargs
+from qmpa import resources
+from qmpa import schedule
+from qmpa import templates
 from qmpa import virtual_chunk
@@ -43,6 +43,8 @@ to_cirq_adapter = {
     qmpa.gates.X : to_cirq_X,
     qmpa.gates.CNOT : to_cirq_CNOT,
     qmpa.gates.Toffoli : to_cirq_Toffoli,
+    qmpa.gates.And : to_cirq_Toffoli,
+    qmpa.gates.AndUncompute : to_cirq_Toffoli,
 }
 
 from_cirq_adapter = {
@@ -61,7 +63,7 @@ def to_cirq(circ: qmpa.circuit.Circuit) -> cirq.Circuit:
     cirq_circuit = cirq.Circuit()
     register = [cirq.NamedQubit(str(i)) for i in range(n_qubits)]
 
-    for gate in circ.circuit:
+    for gate in circ.gates():
         cirq_gate_constructor = to_cirq_adapter.get(type(gate), None)
         if cirq_gate_constructor is not None:
             cirq_gate = cirq_gate_constructor(gate, register) 
@@ -1,3 +1,4 @@
+import bisect
 import numpy as np
 from qmpa.virtual_chunk import Virtual_QChunk
 
@@ -8,63 +9,118 @@ class QArgs():
     def __call__(self):
         return [reg[index] for reg, index in zip(regs, indices)]
 
+POLICIES = ('first_fit', 'best_fit', 'next_fit', 'buddy', 'stack')
+
 class QAllocator():
     '''
         Manages memory for quantum registers
+        :: policy : str :: Placement strategy
+            first_fit :: Lowest address gap that fits
+            best_fit :: Smallest gap that fits, ties go to the lowest address
+            next_fit :: First gap that fits searching on from the previous allocation
+            buddy :: Power of two blocks aligned to their size, the unused tail of a block is reserved
+            stack :: Always allocate above the highest live chunk, freed space is only reused
+                once everything above it is freed, suiting nested ancilla scopes
     '''
-    def __init__(self):
+    def __init__(self, policy='first_fit'):
+        if policy not in POLICIES:
+            raise Exception(f"Unknown allocation policy {policy}")
+        self.policy = policy
         self.chunks = [QChunk(0, 0, 0, None, None, allocator=self, name='HEAD')]
         self.max_mem = 0
+        self.reserved = {} # Chunk to the qubits reserved after it by the buddy policy
+        self.rover = self.chunks[0] # Chunk the next fit search starts from
+        self.live_mem = 0
+        self.peak_live_mem = 0
+        self.profiler = None # AllocProfiler recording each event, if enabled
                
     def __call__(self, *args, **kwargs):
         return self.alloc(*args, **kwargs)
     
     def anc_alloc(self, fn, *args, **kwargs):
         return self.alloc(*args, anc_chunk=fn, **kwargs)
+
+    def block_size(self, size):
+        if self.policy == 'buddy':
+            return 1 << max(size - 1, 0).bit_length()
+        return size
+
+    def placement(self, chunk, block):
+        '''
+            Start address for a block in the free space trailing chunk
+        '''
+        start = chunk.end + self.reserved.get(chunk, 0)
+        if self.policy == 'buddy':
+            start = -(-start // block) * block
+        return start
+
+    def fits(self, chunk, block):
+        return self.placement(chunk, block) + block <= chunk.end + chunk.trailing_free
+
+    def find(self, block):
+        '''
+            Index of the chunk whose trailing free space the policy places a block in, or None
+        '''
+        if self.policy == 'stack':
+            return None
+        if self.policy == 'best_fit':
+            fits = [(chunk.trailing_free, i) for i, chunk in enumerate(self.chunks) if self.fits(chunk, block)]
+            return min(fits)[1] if fits else None
+        if self.policy == 'next_fit':
+            offset = self.chunks.index(self.rover)
+            order = self.chunks[offset:] + self.chunks[:offset]
+        else:
+            offset, order = 0, self.chunks
+        for i, chunk in enumerate(order):
+            if self.fits(chunk, block):
+                return (i + offset) % len(self.chunks)
+        return None
     
     def alloc(self, size, name=None, padding=0, anc_chunk=False):
         
         # For higher methods that need to add additional qubits to a register
         size += padding
+        block = self.block_size(size)
         
         # See if there's free space in the existing region of memory
-        for i, chunk in enumerate(self.chunks):
-            if chunk.trailing_free >= size: # Found unallocated space
-                
-                # Allocate the memory
-                start = chunk.end
-                new_chunk = QChunk(
-                    start,
-                    size,
-                    chunk.trailing_free - size,
-                    chunk, chunk.next_chunk,
-                    allocator=self,
-                    name=name,
-                    anc_chunk=anc_chunk
-                )
-                self.chunks.insert(i + 1, new_chunk)
-                chunk.trailing_free = 0
-                
-                # Fix connections
-                if chunk.next_chunk is not None:
-                    chunk.next_chunk.prev_chunk = new_chunk
-                chunk.next_chunk = new_chunk
-                return new_chunk
-        
-        # No free space, increase mem and go from there
-        
-        trailing_free = self.chunks[-1].trailing_free
-        self.chunks[-1].trailing_free = 0
-        
-        start = self.max_mem - trailing_free
-        
-        
-        self.max_mem += size - trailing_free
-        new_chunk = QChunk(start, size, 0, self.chunks[-1], None, allocator=self, name=name, anc_chunk=anc_chunk)
-        self.chunks[-1].next_chunk = new_chunk
-        self.chunks.append(new_chunk)
+        i = self.find(block)
+        if i is None:
+            # No free space, increase mem and go from there
+            i = len(self.chunks) - 1
+            chunk = self.chunks[i]
+            self.max_mem = max(self.max_mem, self.placement(chunk, block) + block)
+            chunk.trailing_free = self.max_mem - chunk.end
+        chunk = self.chunks[i]
+        start = self.placement(chunk, block)
+
+        # Allocate the memory
+        new_chunk = QChunk(
+            start,
+            size,
+            chunk.end + chunk.trailing_free - start - size,
+            chunk, chunk.next_chunk,
+            allocator=self,
+            name=name,
+            anc_chunk=anc_chunk
+        )
+        self.chunks.insert(i + 1, new_chunk)
+        chunk.trailing_free = start - chunk.end
+        if block > size:
+            self.reserved[new_chunk] = block - size
+        
+        # Fix connections
+        if chunk.next_chunk is not None:
+            chunk.next_chunk.prev_chunk = new_chunk
+        chunk.next_chunk = new_chunk
+        self.rover = new_chunk
+        self.track(size, new_chunk, 'alloc')
         return new_chunk
-                
+
+    def track(self, size, chunk, kind):
+        self.live_mem += size
+        self.peak_live_mem = max(self.peak_live_mem, self.live_mem)
+        if self.profiler is not None:
+            self.profiler.record(kind, chunk, abs(size))
         
     def free(self, chunk):
         if chunk.anc_chunk:
@@ -82,9 +138,39 @@ class QAllocator():
         
         # Tally free space
         chunk.prev_chunk.trailing_free += chunk.size + chunk.trailing_free
+        self.reserved.pop(chunk, None)
+        if self.rover is chunk:
+            self.rover = chunk.prev_chunk
+        self.track(-chunk.size, chunk, 'free')
         
         # Remove the chunk
         self.chunks.remove(chunk)
+
+    def fragmentation(self):
+        '''
+            External fragmentation of the allocated width
+            One minus the largest free extent over all free qubits, 0 when free space is contiguous
+        '''
+        free = [chunk.trailing_free for chunk in self.chunks]
+        if sum(free) == 0:
+            return 0.0
+        return 1 - max(free) / sum(free)
+
+    def stats(self):
+        '''
+            Width and fragmentation statistics
+        '''
+        free = [chunk.trailing_free for chunk in self.chunks]
+        return dict(
+            policy=self.policy,
+            max_mem=self.max_mem,
+            live_mem=self.live_mem,
+            peak_live_mem=self.peak_live_mem,
+            free_mem=sum(free),
+            largest_free=max(free),
+            n_chunks=len(self.chunks) - 1,
+            fragmentation=self.fragmentation()
+        )
     
     def anc_free(self, chunk, fn):
         if chunk.anc_chunk == fn:
@@ -113,6 +199,7 @@ class QAllocator():
         chunk.prev_chunk.trailing_free += size
         chunk.start += size
         chunk.size -= size
+        self.track(-size, chunk, 'free_start')
     
     def partial_free_end(self, chunk, size):
         if size > chunk.size:
@@ -121,6 +208,7 @@ class QAllocator():
         chunk.trailing_free += size
         chunk.size -= size
         chunk.end -= size
+        self.track(-size, chunk, 'free_end')
         
     def __getitem__(self, i):
         return self.chunks[i]
@@ -131,6 +219,132 @@ class QAllocator():
     def __repr__(self):
         return f"{self.max_mem} : {str(self.chunks)}"
     
+class IndexedQAllocator(QAllocator):
+    '''
+        Allocator backend with indexed free space
+        Free extents are kept ordered by (size, start) and live chunks by start address
+        so finding space, freeing and membership checks use binary search rather than scans
+        Space is chosen best fit, the smallest extent that fits with ties going to the lowest address
+        The indices are sorted Python lists, searches are O(log n) but each insert and delete shifts the list,
+        so alloc and free are O(n) pointer moves with no Python level loop, against the O(n) scans of QAllocator
+    '''
+    def __init__(self):
+        super().__init__(policy='best_fit')
+        self.starts = [0] # Start address of each chunk in self.chunks
+        self.extents = [] # Sorted (size, start) of the free space trailing each chunk
+        self.owners = {} # Extent start to the chunk it trails
+        self.live = set([self.chunks[0]])
+
+    def _drop_extent(self, chunk):
+        if chunk.trailing_free > 0:
+            entry = (chunk.trailing_free, chunk.end)
+            del self.extents[bisect.bisect_left(self.extents, entry)]
+            del self.owners[chunk.end]
+
+    def _add_extent(self, chunk):
+        if chunk.trailing_free > 0:
+            bisect.insort(self.extents, (chunk.trailing_free, chunk.end))
+            self.owners[chunk.end] = chunk
+
+    def _index(self, chunk):
+        # Chunks of size zero may share a start address
+        i = bisect.bisect_left(self.starts, chunk.start)
+        while self.chunks[i] is not chunk:
+            i += 1
+        return i
+
+    def _link(self, chunk):
+        i = self._index(chunk.prev_chunk) + 1
+        self.chunks.insert(i, chunk)
+        self.starts.insert(i, chunk.start)
+        self.live.add(chunk)
+
+    def alloc(self, size, name=None, padding=0, anc_chunk=False):
+        size += padding
+
+        i = bisect.bisect_left(self.extents, (size, -1))
+        if i < len(self.extents):
+            prev_chunk = self.owners[self.extents[i][1]]
+            self._drop_extent(prev_chunk)
+        else:
+            # No free space, grow memory after the last chunk
+            prev_chunk = self.chunks[-1]
+            self._drop_extent(prev_chunk)
+            self.max_mem += size - prev_chunk.trailing_free
+            prev_chunk.trailing_free = size
+
+        new_chunk = QChunk(
+            prev_chunk.end,
+            size,
+            prev_chunk.trailing_free - size,
+            prev_chunk, prev_chunk.next_chunk,
+            allocator=self,
+            name=name,
+            anc_chunk=anc_chunk
+        )
+        prev_chunk.trailing_free = 0
+        if prev_chunk.next_chunk is not None:
+            prev_chunk.next_chunk.prev_chunk = new_chunk
+        prev_chunk.next_chunk = new_chunk
+        self._link(new_chunk)
+        self._add_extent(new_chunk)
+        self.track(size, new_chunk, 'alloc')
+        return new_chunk
+
+    def free(self, chunk):
+        if chunk.anc_chunk:
+            raise Exception(f"Ancillae register: {chunk} should be freed using anc_free")
+
+        if chunk not in self.live:
+            raise Exception(f"Double free on chunk: {str(chunk)}")
+
+        if chunk is self.chunks[0]:
+            raise Exception("Attempting to free head!")
+
+        prev_chunk = chunk.prev_chunk
+        self._drop_extent(prev_chunk)
+        self._drop_extent(chunk)
+
+        prev_chunk.next_chunk = chunk.next_chunk
+        if chunk.next_chunk is not None:
+            chunk.next_chunk.prev_chunk = prev_chunk
+        prev_chunk.trailing_free += chunk.size + chunk.trailing_free
+        self._add_extent(prev_chunk)
+
+        i = self._index(chunk)
+        del self.chunks[i]
+        del self.starts[i]
+        self.live.remove(chunk)
+        self.track(-chunk.size, chunk, 'free')
+
+    def qubit_allocated(self, n):
+        i = bisect.bisect_right(self.starts, n) - 1
+        return i >= 0 and self.chunks[i].start <= n < self.chunks[i].end
+
+    def partial_free_start(self, chunk, size):
+        if size > chunk.size:
+            raise Exception(f"Cannot partial free {size} on chunk {chunk.name} of size {chunk.size}")
+
+        i = self._index(chunk)
+        self._drop_extent(chunk.prev_chunk)
+        chunk.prev_chunk.trailing_free += size
+        self._add_extent(chunk.prev_chunk)
+        chunk.start += size
+        chunk.size -= size
+        self.starts[i] = chunk.start
+        self.track(-size, chunk, 'free_start')
+
+    def partial_free_end(self, chunk, size):
+        if size > chunk.size:
+            raise Exception(f"Cannot partial free {size} on chunk {chunk.name} of size {chunk.size}")
+
+        self._drop_extent(chunk)
+        chunk.trailing_free += size
+        chunk.size -= size
+        chunk.end -= size
+        self._add_extent(chunk)
+        self.track(-size, chunk, 'free_end')
+
 class QChunk():
     def __init__(self, 
                  start, 
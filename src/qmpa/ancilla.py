@@ -0,0 +1,57 @@
+from qmpa.gates import Alloc, Free
+
+class AncillaScope():
+    '''
+        Context manager for the ancillae of a macro
+        Ancillae are allocated on entry and freed in reverse order on exit
+        Each Free asserts that its register was returned to zero when the circuit is simulated,
+        no check is made on exit as the gates have not been executed yet
+        Registers provided by the caller are passed through and left allocated, empty ancillae are None
+        :: circuit : Circuit :: Circuit to allocate on
+        :: specs : dict :: Name to a size, a register, or a (size, register) pair that is allocated when the register is None,
+            a (size, register, label) triple labels the allocated chunk differently from its attribute name
+    '''
+    def __init__(self, circuit, **specs):
+        self.circuit = circuit
+        self.specs = specs
+        self.registers = {}
+        self.owned = []
+
+    def __enter__(self):
+        for name, spec in self.specs.items():
+            label = name
+            if isinstance(spec, tuple) and len(spec) == 3:
+                size, reg, label = spec
+            elif isinstance(spec, tuple):
+                size, reg = spec
+            elif isinstance(spec, int):
+                size, reg = spec, None
+            else:
+                size, reg = len(spec), spec
+            if reg is None and size == 0:
+                # Nothing to allocate, the macro does not touch this ancilla
+                pass
+            elif reg is None:
+                reg = self.circuit.allocator.alloc(size, name=label)
+                self.circuit.add_gate(Alloc(reg, name=label))
+                self.owned.append(reg)
+            self.registers[name] = reg
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            return False
+        for reg in self.owned[::-1]:
+            self.circuit.add_gate(Free(reg))
+            self.circuit.allocator.free(reg)
+        self.owned = []
+        return False
+
+    def __getattr__(self, name):
+        registers = self.__dict__.get('registers', {})
+        if name not in registers:
+            raise AttributeError(f"No ancilla named {name}")
+        return registers[name]
+
+    def __getitem__(self, name):
+        return self.registers[name]
@@ -0,0 +1,159 @@
+import numpy as np
+
+from qmpa.gates import OP_X, OP_CNOT, OP_TOFFOLI, OP_ALLOC, OP_FREE, OP_AND, OP_AND_UNCOMPUTE, int_to_bin
+from qmpa.compiler import bind_inputs, check_bound
+
+'''
+Bit-sliced batch simulation
+Each qubit is stored as a plane of packed uint64 words, one bit per input lane
+A single XOR / AND on a plane then evaluates a gate across 64 inputs per word
+'''
+
+WORD_SIZE = 64
+ALL_ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+def n_words(n_lanes : int) -> int:
+    '''
+        Number of uint64 words required to hold one bit for each lane
+        :: n_lanes : int :: Number of inputs simulated in parallel
+    '''
+    return max(1, -(-n_lanes // WORD_SIZE))
+
+def lane_mask(n_lanes : int) -> np.ndarray:
+    '''
+        Mask of the lanes that carry real inputs, padding lanes are zero
+        :: n_lanes : int :: Number of inputs simulated in parallel
+    '''
+    bits = np.zeros(n_words(n_lanes) * WORD_SIZE, dtype=np.uint8)
+    bits[:n_lanes] = 1
+    return np.packbits(bits, bitorder='little').view('<u8')
+
+def as_values(values, n_bits : int) -> np.ndarray:
+    '''
+        Coerces operand values to an array that supports shifts up to n_bits
+        Registers wider than an int64 fall back to python integers
+        :: values : array_like :: Operand values, one per lane
+        :: n_bits : int :: Width of the register being loaded
+    '''
+    values = np.asarray(values)
+    if values.ndim == 0:
+        values = values.reshape(1)
+    if n_bits >= WORD_SIZE - 1 or values.dtype == object:
+        return np.array([int(v) for v in values], dtype=object)
+    return values.astype(np.int64)
+
+def pack_bit(values : np.ndarray, bit : int, n_lanes : int) -> np.ndarray:
+    '''
+        Packs a single bit of each lane's value into a plane
+        :: values : np.ndarray :: Operand values, one per lane
+        :: bit : int :: Bit of the operand to pack
+        :: n_lanes : int :: Number of inputs simulated in parallel
+    '''
+    bits = np.zeros(n_words(n_lanes) * WORD_SIZE, dtype=np.uint8)
+    bits[:n_lanes] = ((values >> bit) & 1).astype(np.uint8)
+    return np.packbits(bits, bitorder='little').view('<u8')
+
+def unpack_bit(plane : np.ndarray, n_lanes : int) -> np.ndarray:
+    '''
+        Unpacks a plane into one bit per lane
+        :: plane : np.ndarray :: Packed plane for a single qubit
+        :: n_lanes : int :: Number of inputs simulated in parallel
+    '''
+    return np.unpackbits(plane.view(np.uint8), bitorder='little')[:n_lanes]
+
+def unpack_register(planes : np.ndarray, qubits, n_lanes : int) -> np.ndarray:
+    '''
+        Reads a register out of the planes, qubit 0 is the least significant bit
+        :: planes : np.ndarray :: Simulator state
+        :: qubits : array_like :: Physical qubits of the register
+        :: n_lanes : int :: Number of inputs simulated in parallel
+    '''
+    qubits = list(qubits)
+    if len(qubits) >= WORD_SIZE:
+        vals = np.zeros(n_lanes, dtype=object)
+        for i, qubit in enumerate(qubits):
+            vals += unpack_bit(planes[qubit], n_lanes).astype(object) << i
+        return vals
+
+    vals = np.zeros(n_lanes, dtype=np.uint64)
+    for i, qubit in enumerate(qubits):
+        vals |= unpack_bit(planes[qubit], n_lanes).astype(np.uint64) << np.uint64(i)
+    return vals
+
+def input_slots(inputs : dict, n_lanes : int) -> dict:
+    '''
+        Groups operand values by the chunk they are bound to
+        Values replace the initial value when the chunk's Alloc gate is simulated
+        Raises if any value is negative or does not fit in the qubits it is bound to
+        :: inputs : dict :: Map of register to operand values
+        :: n_lanes : int :: Number of inputs simulated in parallel
+    '''
+    slots = bind_inputs(inputs)
+    for chunk_id, bound in slots.items():
+        for i, (positions, values) in enumerate(bound):
+            values = as_values(values, len(positions))
+            if len(values) != n_lanes:
+                raise Exception(f"Register bound to {len(values)} values, expected {n_lanes}")
+            # Negative values shift to -1, so they are caught along with values that are too wide
+            overflow = np.flatnonzero(values >> len(positions) != 0)
+            if len(overflow):
+                raise Exception(f"Input {values[overflow[0]]} does not fit in {len(positions)} qubits")
+            bound[i] = (positions, values)
+    return slots
+
+class BatchSimulator():
+    '''
+        Bit-sliced simulator for classical reversible circuits
+        Runs over the opcode arrays of a CompiledCircuit
+    '''
+    def __init__(self, n_qubits, n_lanes):
+        self.n_qubits = n_qubits
+        self.n_lanes = n_lanes
+        self.planes = np.zeros((n_qubits, n_words(n_lanes)), dtype=np.uint64)
+        self.mask = lane_mask(n_lanes)
+
+    def __call__(self, program, inputs=None):
+        slots = input_slots(inputs or {}, self.n_lanes)
+        check_bound(program, slots)
+        planes = self.planes
+        opcodes, ctrl_a, ctrl_b, targ = (column.tolist() for column in program.columns())
+        for op, a, b, t in zip(opcodes, ctrl_a, ctrl_b, targ):
+            if op == OP_TOFFOLI:
+                planes[t] ^= planes[a] & planes[b]
+            elif op == OP_CNOT:
+                planes[t] ^= planes[a]
+            elif op == OP_X:
+                planes[t] ^= ALL_ONES
+            elif op == OP_AND:
+                assert(not (planes[t] & self.mask).any())
+                planes[t] = planes[a] & planes[b]
+            elif op == OP_AND_UNCOMPUTE:
+                assert(not ((planes[t] ^ (planes[a] & planes[b])) & self.mask).any())
+                planes[t] = 0
+            elif op == OP_ALLOC:
+                self.alloc(program.meta[t], slots)
+            elif op == OP_FREE:
+                self.free(program.meta[t])
+        return planes
+
+    def alloc(self, record, slots):
+        qubits = record.qubits
+        for i, val in enumerate(int_to_bin(record.initial_value)):
+            if val:
+                self.planes[qubits[i]] ^= ALL_ONES
+
+        for positions, values in slots.get(id(record.chunk), []):
+            for bit, position in enumerate(positions):
+                self.planes[qubits[position]] = pack_bit(values, bit, self.n_lanes)
+
+    def free(self, record):
+        qubits = record.qubits
+        if record.assert_cleanup:
+            final_bits = int_to_bin(record.final_value)
+            for i, qubit in enumerate(qubits):
+                expected = ALL_ONES if i < len(final_bits) and final_bits[i] else np.uint64(0)
+                assert(((self.planes[qubit] ^ expected) & self.mask).sum() == 0)
+        self.planes[qubits] = 0
+
+    def readout(self, *regs):
+        return [unpack_register(self.planes, reg(), self.n_lanes) for reg in regs]
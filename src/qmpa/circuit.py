@@ -1,51 +1,239 @@
-import inspect
 import copy
+import functools
 import numpy as np
 
-from qmpa.virtual_chunk import Virtual_QChunk
-from qmpa.allocator import QAllocator
-from qmpa.gates import Gate, X, CNOT, Toffoli, Space, Alloc, Free
+from qmpa.virtual_chunk import Virtual_QChunk, Physical_QChunk
+from qmpa.ancilla import AncillaScope
+from qmpa.allocator import QAllocator, IndexedQAllocator, POLICIES
+from qmpa.batch import BatchSimulator
+from qmpa.compiler import CompiledCircuit, Checkpoint, execute, inputs_key
+from qmpa.gate_store import GateStore, GateTally
+from qmpa.gates import Gate, X, CNOT, Toffoli, And, AndUncompute, Space, Alloc, Free, Segment
+from qmpa import liveness
+from qmpa.profiler import AllocProfiler
+from qmpa.schedule import Schedule, asap
+from qmpa.templates import Template, TemplateCache, Call
+from qmpa.qargs import join
 from qmpa.utils import hamming_weight
 
 def vwrap(fn):
     def inner(*args, **kwargs):
         return fn(*[arg[:] for arg in args], **kwargs)
     return inner
+
+def karatsuba_split(n_a, n_b):
+    '''
+        Size of the low halves of the operands at a Karatsuba step
+    '''
+    return min(n_a, n_b) // 2
+
+def karatsuba_garbage(n_a, n_b, cutoff):
+    '''
+        Number of garbage qubits left by the forward pass of the Karatsuba multiplier
+        Each step above the cutoff keeps the two operand sums and the middle product
+    '''
+    if min(n_a, n_b) <= cutoff:
+        return 0
+    h = karatsuba_split(n_a, n_b)
+    n_sa, n_sb = n_a - h + 1, n_b - h + 1
+    return (n_sa + n_sb + (n_sa + n_sb)
+            + karatsuba_garbage(h, h, cutoff)
+            + karatsuba_garbage(n_a - h, n_b - h, cutoff)
+            + karatsuba_garbage(n_sa, n_sb, cutoff))
+
+def naf(value):
+    '''
+        Non adjacent form of a non negative integer, digits in -1, 0, 1 from the lowest
+    '''
+    digits = []
+    while value > 0:
+        digit = 2 - (value & 3) if value & 1 else 0
+        digits.append(digit)
+        value = (value - digit) >> 1
+    return digits
+
+def mod_inverse(value, modulus):
+    '''
+        Inverse of value modulo modulus, used to uncompute in place modular multiplications
+    '''
+    try:
+        return pow(int(value), -1, int(modulus))
+    except ValueError:
+        raise Exception(f"{value} has no inverse modulo {modulus}")
+
+def profiled(fn):
+    '''
+        Attributes the allocations made inside a macro to it when the allocator is profiled
+    '''
+    @functools.wraps(fn)
+    def inner(self, *args, **kwargs):
+        if self.allocator.profiler is None:
+            return fn(self, *args, **kwargs)
+        with self.allocator.profiler.operation(fn.__name__):
+            return fn(self, *args, **kwargs)
+    return inner
     
 # TODO: 
 # - Register conversion
 # - Non-local registers
-# - Realloc
-# - Symbolic resolution at execution
+
+KARATSUBA_CUTOFF = 16
 
 class Circuit():
     
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, store='list', mode='build', templates=None, allocator='linear'):
+        '''
+            :: debug : bool :: Print the state after every gate when simulating
+            :: store : str :: Gate container, 'list' of Gate objects, 'columnar' GateStore
+                or 'hierarchical' list where subroutines are recorded as calls to shared blocks
+            :: mode : str :: 'build' constructs gates, 'count' only tracks counts and allocator state
+            :: templates : TemplateCache :: Cache of subroutine gate patterns, may be shared between circuits
+            :: allocator : str :: QAllocator policy ('linear' is first fit) or 'indexed' for the best fit IndexedQAllocator
+        '''
         
-        self.allocator = QAllocator()
-        self.circuit = []
+        if allocator == 'linear':
+            self.allocator = QAllocator()
+        elif allocator in POLICIES:
+            self.allocator = QAllocator(policy=allocator)
+        elif allocator == 'indexed':
+            self.allocator = IndexedQAllocator()
+        else:
+            raise Exception(f"Unknown allocator {allocator}")
+        self.mode = mode
+        if mode == 'count':
+            self.circuit = GateTally()
+        elif mode != 'build':
+            raise Exception(f"Unknown circuit mode {mode}")
+        elif store in ('list', 'hierarchical'):
+            self.circuit = []
+        elif store == 'columnar':
+            self.circuit = GateStore()
+        else:
+            raise Exception(f"Unknown gate store {store}")
         
         self.toffoli_count = 0
         self.cnot_count = 0
         self.non_clifford_count = 0
         self.debug = debug
+        self._compiled = None
+        self._sim = None # Most recently simulated state
+        self._schedule = None
+        self.layout = None # Set once qubits are reallocated
+        self.checkpoints = {}
+        self._anc_scopes = {} # Ancillae allocated by anc_register to their open scope
+        self.hierarchical = mode == 'build' and store == 'hierarchical'
+        if self.hierarchical and templates is None:
+            templates = TemplateCache()
+        self.templates = templates
             
-    def __call__(self, *regs, debug=False):
-        vec = np.zeros(self.allocator.max_mem, dtype=np.int32)
+    def __call__(self, *regs, debug=False, inputs=None):
+        '''
+            Simulates the circuit on a single basis state
+            :: regs : registers :: Registers to return, otherwise the full state is returned
+            :: inputs : dict :: Map of register to operand value, bound at the register's Alloc
+        '''
+        vec = np.zeros(self.width(), dtype=np.int32)
         
-        for gate in self.circuit:
-            vec = gate(vec)
-            print(vec)
+        if (debug or self.debug) and inputs is None and self.layout is None:
+            for gate in self.circuit:
+                vec = gate(vec)
+                print(vec)
+        else:
+            vec = self.simulate(inputs=inputs).vec.copy()
             
         if len(regs) > 0:
-            return [vec[reg()] for reg in regs]
+            return [vec[self.physical(reg)()] for reg in regs]
         
         return vec
     
-    def readout(self, *regs):
-        vals = self.__call__()
-        return [int(''.join(map(str, vals[reg()]))[::-1], 2) for reg in regs]
-    
+    def readout(self, *regs, inputs=None):
+        vals = self.__call__(inputs=inputs)
+        return [int(''.join(map(str, vals[self.physical(reg)()]))[::-1], 2) for reg in regs]
+
+    def run_batch(self, inputs, outputs=()):
+        '''
+            Bit-sliced simulation over many operand values in a single pass
+            :: inputs : dict :: Map of register to an array of operand values
+            :: outputs : list :: Registers to read out
+            Returns a list of arrays of readouts, one per output register
+        '''
+        n_lanes = max([len(np.atleast_1d(np.asarray(vals, dtype=object))) for vals in inputs.values()], default=1)
+        sim = BatchSimulator(self.width(), n_lanes)
+        sim(self.compile(), inputs)
+        return sim.readout(*[self.physical(reg) for reg in outputs])
+
+    def simulate(self, inputs=None):
+        '''
+            Simulates up to the end of the circuit
+            Resumes from the cached state when it was simulated with the same inputs
+            so only gates appended since the last call are executed
+            Returns a Checkpoint of the final state
+        '''
+        program = self.compile()
+        key = inputs_key(inputs)
+        state = self._sim
+        if state is None or state.inputs != key:
+            state = Checkpoint(np.zeros(0, dtype=np.int32), 0, 0, key)
+
+        vec = np.zeros(self.width(), dtype=np.int32)
+        vec[:len(state.vec)] = state.vec
+        if state.n_ops < program.size:
+            vec = execute(program, vec, start=state.n_ops, inputs=inputs)
+        self._sim = Checkpoint(vec, program.size, program.n_gates, key)
+        return self._sim
+
+    def checkpoint(self, name, inputs=None):
+        '''
+            Saves the simulated state at the current end of the circuit
+            :: name : hashable :: Name of the checkpoint
+            :: inputs : dict :: Map of register to operand value
+        '''
+        self.checkpoints[name] = self.simulate(inputs=inputs)
+        return self.checkpoints[name]
+
+    def resume(self, name):
+        '''
+            Restores a named checkpoint as the cached simulation state
+            The next simulation only executes gates appended after the checkpoint
+        '''
+        if name not in self.checkpoints:
+            raise Exception(f"No checkpoint named {name}")
+        self._sim = self.checkpoints[name]
+        return self._sim
+
+    def invalidate(self, n_gates=0):
+        '''
+            Discards compiled operations and simulated states from gate n_gates onwards
+            The reallocated layout is only valid for the compiled circuit, so this is refused once one is set
+        '''
+        if self.layout is not None:
+            raise Exception("Cannot recompile a circuit after its qubits are reallocated")
+        if self._compiled is not None:
+            self._compiled.truncate(n_gates)
+            if n_gates == 0:
+                self._compiled = None
+        self._schedule = None
+        if self._sim is not None and self._sim.n_gates > n_gates:
+            self._sim = None
+        self.checkpoints = {
+            name: state for name, state in self.checkpoints.items() if state.n_gates <= n_gates
+        }
+
+    def compile(self):
+        '''
+            Resolves the circuit into flat opcode arrays
+            Gates appended since the last call are compiled incrementally
+            A columnar gate store is already compiled and is returned directly
+        '''
+        if self.mode == 'count':
+            raise Exception("Count-only circuits cannot be compiled or simulated")
+        if isinstance(self.circuit, GateStore):
+            return self.circuit
+        if self._compiled is None:
+            self._compiled = CompiledCircuit()
+        self._compiled.extend(self.circuit[self._compiled.n_gates:])
+        return self._compiled
+
     '''
         Display Functions
     '''
@@ -60,7 +248,7 @@ class Circuit():
         
         latex_circuit = [[] for i in range(self.allocator.max_mem)]
         
-        for gate in self.circuit:
+        for gate in self.gates():
             
             if type(gate) is Alloc:
                 for i in gate.qargs():
@@ -103,35 +291,151 @@ class Circuit():
         Properties
     '''
     def circuit_len(self):
+        if isinstance(self.circuit, list):
+            # Calls and segments stand in for several gates
+            return sum(getattr(gate, 'n_gates', 1) for gate in self.circuit)
         return len(self.circuit)
 
+    def gates(self):
+        '''
+            Iterates over the flattened gates of the circuit
+        '''
+        for gate in self.circuit:
+            if hasattr(gate, 'flatten'):
+                yield from gate.flatten()
+            else:
+                yield gate
+
+    def depth(self):
+        '''
+            As soon as possible depth of the X, CNOT and Toffoli gates
+            Calls are layered through the longest paths of their template without flattening
+        '''
+        if self.mode == 'count':
+            raise Exception("Count-only circuits do not store gates")
+        if not self.hierarchical or self.layout is not None:
+            return self.schedule().depth
+        ready = np.zeros(self.allocator.max_mem, dtype=np.int64)
+        self.schedule_blocks(self.circuit, ready, CompiledCircuit())
+        return int(ready.max(initial=0))
+
+    def toffoli_depth(self):
+        '''
+            Largest number of Toffoli gates on any path through the circuit
+        '''
+        return self.schedule().toffoli_depth
+
+    def schedule(self):
+        '''
+            As soon as possible layering of the compiled circuit
+            The schedule is extended incrementally as gates are appended
+        '''
+        if self.mode == 'count':
+            raise Exception("Count-only circuits do not store gates")
+        if self._schedule is None:
+            self._schedule = Schedule(self.width())
+        return self._schedule.extend(self.compile())
+
+    def schedule_blocks(self, gates, ready, program):
+        '''
+            Layers gates into ready, calls by the longest paths of their template
+        '''
+        for gate in gates:
+            if isinstance(gate, Call):
+                gate.schedule(ready)
+            elif isinstance(gate, Segment):
+                self.schedule_blocks(gate.items(), ready, program)
+            else:
+                start = program.size
+                program.append_gate(gate)
+                asap(program.columns(start), ready)
+
     def counts(self):
         return (self.toffoli_count, self.cnot_count, self.non_clifford_count)
+
+    def width(self):
+        '''
+            Number of qubits the compiled circuit acts on
+        '''
+        if self.layout is None:
+            return self.allocator.max_mem
+        return self.layout.width_after
+
+    def physical(self, reg):
+        '''
+            Register over the qubits that hold its value at the end of the circuit
+        '''
+        if self.layout is None:
+            return reg
+        return Physical_QChunk(*self.layout.mapping[reg()], name=getattr(reg, 'name', None))
+
+    def reallocate(self):
+        '''
+            Recolours the live intervals of the compiled circuit's qubits to minimise width
+            Gate indices are rewritten in place, registers are read out through the returned layout
+            No further gates can be added to the circuit, nor can it be invalidated or optimised, afterwards
+            With the list and hierarchical stores, drawing and export still show the qubits assigned at construction
+            The columnar store is the compiled circuit, so it is rewritten and its gates show the reallocated qubits
+        '''
+        if self.layout is not None:
+            return self.layout
+        program = self.compile()
+        self.layout = liveness.reallocate(program, self.allocator.max_mem)
+        self._sim = None
+        self._schedule = None
+        self.checkpoints = {}
+        return self.layout
     
     
     '''
         Base Gate Operations
     '''
     def register(self, n_qubits, name=None, initial_value=0, **kwargs):
+        '''
+            Allocates a register, which also acts as an input slot
+            Values passed as inputs at execution replace the initial value
+        '''
         reg = self.allocator.alloc(n_qubits, name=name, **kwargs)
         self.add_gate(Alloc(reg, name=name, initial_value=initial_value))
         return reg.virt()
     
-    def anc_register(self, n_qubits, reg=None, name=None, initial_value=0, **kwargs):
-        # Get stack frame from caller
-        if reg is None:
-            fn = id(inspect.currentframe().f_back)
-            reg = self.allocator.anc_alloc(fn, n_qubits, name=name, **kwargs)
-            self.add_gate(Alloc(reg, name=name, initial_value=initial_value))
-        return reg
+    def ancillas(self, **specs):
+        '''
+            Scope for the ancillae of a macro
+            with self.ancillas(carry=(1, reg_carry), cpy=n) as anc:
+            allocates anc.carry unless reg_carry is provided and anc.cpy, freeing them on exit
+            with self.ancillas(cpy=(n, None, 'MULCPY')) as anc: labels the chunk of anc.cpy MULCPY
+            The Free gates assert the ancillae are clean when the circuit is simulated, exiting the scope does not check them
+        '''
+        return AncillaScope(self, **specs)
+
+    def anc_register(self, n_qubits, reg=None, name=None):
+        '''
+            Unscoped form of ancillas, allocates n_qubits unless reg is provided
+            Registers allocated here are freed by anc_free, others are passed through
+        '''
+        scope = AncillaScope(self, anc=(n_qubits, reg, name)).__enter__()
+        if scope.owned:
+            self._anc_scopes[id(scope.anc)] = scope
+        return scope.anc
+
+    def anc_free(self, reg):
+        '''
+            Frees a register allocated by anc_register, registers provided by the caller are left allocated
+        '''
+        scope = self._anc_scopes.pop(id(reg), None)
+        if scope is not None:
+            scope.__exit__(None, None, None)
+
+    def profile(self):
+        '''
+            Starts recording allocator events, call before allocating any registers
+            Returns the AllocProfiler, events are stamped with the gate index and enclosing operations
+        '''
+        if self.allocator.profiler is None:
+            self.allocator.profiler = AllocProfiler(clock=self.circuit_len)
+        return self.allocator.profiler
 
-    def anc_free(self, reg, *args, **kwargs):
-        fn = id(inspect.currentframe().f_back)
-        if reg.anc_chunk == fn:
-            self.allocator.anc_free(reg, fn)
-            self.add_gate(Free(reg, *args, **kwargs))
-        return
-    
     def free(self, reg, end=None, start=None, final_value=0):
         if end is None and start is None:
             self.add_gate(Free(reg, final_value=final_value))
@@ -143,46 +447,132 @@ class Circuit():
         if start > 0:
             self.add_gate(Free(reg[:start], final_value=final_value))
             self.allocator.partial_free_start(reg, start)
+            # Shifting the chunk moves the qubits of every gate already on it
+            self.invalidate()
         return
             
         
     def add_gate(self, gate):
+        if self.layout is not None:
+            raise Exception("Cannot add gates to a circuit after its qubits are reallocated")
         self.circuit.append(gate)
         self.toffoli_count += gate.toffoli_count
         self.cnot_count += gate.cnot_count
         self.non_clifford_count += gate.non_clifford_count
+
+    def cached(self, key, operands, build):
+        '''
+            Emits a subroutine through the template cache
+            :: key : tuple :: Operation name, operand sizes and flags
+            :: operands : list :: Registers the subroutine acts on, the template is relative to these
+            :: build : function :: Emits the subroutine's gates on a cache miss
+        '''
+        if self.templates is None or self.mode == 'count':
+            return build()
+        qubits = np.concatenate([np.asarray(reg(), dtype=np.int32) for reg in operands])
+        template = self.templates.get(key)
+        if template is not None:
+            return self.splice(template, qubits, operands)
+
+        circuit_pt = len(self.circuit)
+        counts = self.counts()
+        build()
+        template = Template.record(
+            self.circuit[circuit_pt:], qubits, tuple(n - m for n, m in zip(self.counts(), counts))
+        )
+        if template is not None:
+            self.templates.put(key, template)
+            if self.hierarchical:
+                # Replace the gates just built with a call to the block
+                del self.circuit[circuit_pt:]
+                self.toffoli_count, self.cnot_count, self.non_clifford_count = counts
+                self.add_gate(Call(template, operands))
+
+    def splice(self, template, qubits, operands):
+        '''
+            Appends a template over the physical qubits of its operands
+        '''
+        if self.hierarchical:
+            return self.add_gate(Call(template, operands))
+        if isinstance(self.circuit, GateStore):
+            self.circuit.splice(template, qubits)
+        else:
+            views = [reg[i] for reg in operands for i in range(len(reg))]
+            self.circuit.extend(template.gates(views))
+        self.toffoli_count += template.counts[0]
+        self.cnot_count += template.counts[1]
+        self.non_clifford_count += template.counts[2]
+
+    def tally(self, gate_type, n=1):
+        '''
+            Count-only equivalent of adding n gates of gate_type
+        '''
+        self.circuit.n_gates += n
+        self.toffoli_count += n * gate_type.costs['toffoli_count']
+        self.cnot_count += n * gate_type.costs['cnot_count']
+        self.non_clifford_count += n * gate_type.costs['non_clifford_count']
     
     
     def reverse(self, fn, *args, permit_rev_alloc=False, **kwargs):
         circuit_pt = len(self.circuit)
-        fn(*args, **kwargs)
-        for i, gate in enumerate(self.circuit[circuit_pt:]):
-            if not permit_rev_alloc and type(gate) in (Free, Alloc):
+        if self.mode == 'count':
+            # Reversal does not change counts, only check that it is permitted
+            n_alloc_free = self.circuit.n_alloc_free
+            fn(*args, **kwargs)
+            if not permit_rev_alloc and self.circuit.n_alloc_free != n_alloc_free:
                 raise Exception(f"Cannot reverse function {fn}, contains Alloc or Free")
-                
-            if type(gate) is Free:
-                circuit[circuit_pt + i] = Alloc(*gate.qargs, name=gate.name, initial_value=gate.final_value)
-            if type(gate) is Alloc:
-                circuit[circuit_pt + i] = Free(*gate.qargs, name=gate.name, final_value=gate.initial_value)
-                
-        self.circuit[circuit_pt:] = self.circuit[circuit_pt:][::-1]
+            return
+        fn(*args, **kwargs)
+        if isinstance(self.circuit, GateStore):
+            self.circuit.reverse(circuit_pt, permit_rev_alloc=permit_rev_alloc)
+            self.invalidate(circuit_pt)
+            return
+        segment = self.circuit[circuit_pt:]
+        n_alloc_free = sum(getattr(gate, 'n_alloc_free', type(gate) in (Alloc, Free)) for gate in segment)
+        if not permit_rev_alloc and n_alloc_free > 0:
+            raise Exception(f"Cannot reverse function {fn}, contains Alloc or Free")
+
+        # The gates are kept by reference and inverted lazily when iterated
+        del self.circuit[circuit_pt:]
+        if len(segment) == 1:
+            self.circuit.append(segment[0].inverse())
+        elif len(segment) > 1:
+            self.circuit.append(Segment(segment, inverse=True))
+        self.invalidate(circuit_pt)
         return
     
     '''
         Singular Gates
     '''
     def X(self, targ):
+        if self.mode == 'count':
+            return self.tally(X)
         self.add_gate(X(targ))
     
     def cnot(self, ctrl, targ):
+        if self.mode == 'count':
+            return self.tally(CNOT)
         self.add_gate(CNOT(ctrl, targ))
     
     def toffoli(self, ctrl_a, ctrl_b, targ):
+        if self.mode == 'count':
+            return self.tally(Toffoli)
         self.add_gate(Toffoli(ctrl_a, ctrl_b, targ))
 
+    def logical_and(self, ctrl_a, ctrl_b, targ):
+        if self.mode == 'count':
+            return self.tally(And)
+        self.add_gate(And(ctrl_a, ctrl_b, targ))
+
+    def logical_and_uncompute(self, ctrl_a, ctrl_b, targ):
+        if self.mode == 'count':
+            return self.tally(AndUncompute)
+        self.add_gate(AndUncompute(ctrl_a, ctrl_b, targ))
+
     '''
         Macros
     '''
+    @profiled
     def Ccpy(self, ctrl, targ, cpy_reg=None, **kwargs):
         '''
         :: blank_alloc :: Allocated qubits that are not copied to
@@ -191,17 +581,28 @@ class Circuit():
         '''
         
         if cpy_reg is None:
-            cpy_reg = self.register(len(targs), **kwargs)
-            
-        for i in range(len(targ)):
-            self.toffoli(ctrl, targ[i], cpy_reg[i])
+            cpy_reg = self.register(len(targ), **kwargs)
+
+        if self.mode == 'count':
+            self.tally(Toffoli, len(targ))
+            return cpy_reg
+
+        def build():
+            for i in range(len(targ)):
+                self.toffoli(ctrl, targ[i], cpy_reg[i])
+
+        self.cached(('Ccpy', len(targ)), (ctrl, targ, cpy_reg[:len(targ)]), build)
         return cpy_reg
 
+    @profiled
     def cpy(self, src, dst, **kwargs):
         '''
         :: cpy :: 
         Performs CNOTs from the control to the target
         '''
+
+        if self.mode == 'count':
+            return self.tally(CNOT, src.size)
         
         for i in range(src.size):
             self.cnot(src[i], dst[i])
@@ -211,6 +612,9 @@ class Circuit():
         '''
             Injects a MAJ gadget
         '''
+        if self.mode == 'count':
+            self.tally(CNOT, 2)
+            return self.tally(Toffoli)
         self.cnot(a, b)
         self.cnot(a, carry)
         self.toffoli(carry, b, a)
@@ -220,6 +624,9 @@ class Circuit():
         '''
             Injects a UMA gadget
         '''
+        if self.mode == 'count':
+            self.tally(CNOT, 2)
+            return self.tally(Toffoli)
         self.toffoli(carry, b, a)
         self.cnot(a, carry)
         self.cnot(carry, b)
@@ -227,6 +634,7 @@ class Circuit():
         
 ##################################
         
+    @profiled
     def add(self,
             reg_a,
             reg_b,
@@ -239,94 +647,393 @@ class Circuit():
         '''
         n_qubits = len(reg_a)
         
-        # Conditional alloc on reg_carry
-        reg_carry = self.anc_register(1, reg=reg_carry, name='carry')
-        
-        # MAJ with carry
-        self.MAJ(reg_a[0], reg_b[0], reg_carry[0])
+        # Conditional alloc on reg_carry, freed when the scope exits
+        with self.ancillas(carry=(1, reg_carry)) as anc:
+            reg_carry = anc.carry
+
+            if self.mode == 'count':
+                # n MAJ and n UMA gadgets plus the carry out
+                self.tally(CNOT, 4 * n_qubits + int(bool(carry)))
+                self.tally(Toffoli, 2 * n_qubits)
+                return
         
-        # MAJ sequence
-        for i in range(1, n_qubits):
-            self.MAJ(reg_a[i], reg_b[i], reg_a[i - 1])
+            def build():
+                # MAJ with carry
+                self.MAJ(reg_a[0], reg_b[0], reg_carry[0])
+            
+                # MAJ sequence
+                for i in range(1, n_qubits):
+                    self.MAJ(reg_a[i], reg_b[i], reg_a[i - 1])
 
-        # Carry Bit
-        if carry:
-            self.cnot(reg_a[n_qubits - 1], reg_b[n_qubits])
+                # Carry Bit
+                if carry:
+                    self.cnot(reg_a[n_qubits - 1], reg_b[n_qubits])
 
-        # UMA Sequence
-        for i in range(n_qubits - 1, 0, -1):
-            self.UMA(reg_a[i], reg_b[i], reg_a[i - 1])
-        
-        # UMA with carry
-        self.UMA(reg_a[0], reg_b[0], reg_carry[0])
-        
-        # Conditional free on reg_carry
-        self.anc_free(reg_carry)
+                # UMA Sequence
+                for i in range(n_qubits - 1, 0, -1):
+                    self.UMA(reg_a[i], reg_b[i], reg_a[i - 1])
+            
+                # UMA with carry
+                self.UMA(reg_a[0], reg_b[0], reg_carry[0])
+
+            self.cached(
+                ('add', n_qubits, bool(carry)),
+                (reg_a, reg_b[:n_qubits + int(bool(carry))], reg_carry[:1]),
+                build
+            )
 
         return 
    
     def add_cuccaro(self, *args, **kwargs):
         return self.add(*args, **kwargs)
 
+    @profiled
+    def add_gidney(self,
+            reg_a,
+            reg_b,
+            reg_carry=None,
+            carry=True):
+        '''
+            Ripple carry adder with the carries held in temporary logical ANDs
+            https://arxiv.org/abs/1709.06648
+            Each carry is computed with one AND and erased by measurement, so n - 1 + carry ANDs
+            cost 4 (n - 1 + carry) T gates against the 2n Toffolis of the Cuccaro adder
+            reg_a(a_n)[n]               ->  reg_a(a_n)[n]
+            reg_b(b_n)[n + 1]           ->  reg_b(a_n + b_n)[n + 1], n bits without the carry
+            {reg_carry(0)[n - 1 + carry]} -> {reg_carry(0)[n - 1 + carry]}, only the low qubits of a longer register are used
+        '''
+        n_qubits = len(reg_a)
+        carry = int(bool(carry))
+        n_ands = n_qubits - 1 + carry
+
+        with self.ancillas(ands=(n_ands, None if reg_carry is None else reg_carry[:n_ands])) as anc:
+            ands = anc.ands
+
+            if self.mode == 'count':
+                n_cnots = 1 if n_ands == 0 else 6 * (n_ands - 1) + 1 + carry + 2 * (1 - carry)
+                self.tally(And, n_ands)
+                self.tally(AndUncompute, n_ands)
+                self.tally(CNOT, n_cnots)
+                return
+
+            def build():
+                # c[i] is the carry into bit i
+                c = [None] + [ands[i] for i in range(n_ands)]
+
+                # Carries, c[i + 1] = maj(a[i], b[i], c[i]) = ((a[i] ^ c[i]) & (b[i] ^ c[i])) ^ c[i]
+                for i in range(n_ands):
+                    if i > 0:
+                        self.cnot(c[i], reg_a[i])
+                        self.cnot(c[i], reg_b[i])
+                    self.logical_and(reg_a[i], reg_b[i], c[i + 1])
+                    if i > 0:
+                        self.cnot(c[i], c[i + 1])
+
+                # Carry Bit
+                if carry:
+                    self.cnot(c[n_qubits], reg_b[n_qubits])
+                elif n_qubits > 1:
+                    self.cnot(reg_a[n_qubits - 1], reg_b[n_qubits - 1])
+                    self.cnot(c[n_qubits - 1], reg_b[n_qubits - 1])
+
+                # Erase the carries from the top, leaving the sum bits
+                for i in range(n_ands - 1, 0, -1):
+                    self.cnot(c[i], c[i + 1])
+                    self.logical_and_uncompute(reg_a[i], reg_b[i], c[i + 1])
+                    self.cnot(c[i], reg_a[i])
+                    self.cnot(reg_a[i], reg_b[i])
+
+                if n_ands > 0:
+                    self.logical_and_uncompute(reg_a[0], reg_b[0], c[1])
+                self.cnot(reg_a[0], reg_b[0])
+
+            self.cached(
+                ('add_gidney', n_qubits, carry),
+                [reg_a, reg_b[:n_qubits + carry]] + ([ands] if n_ands > 0 else []),
+                build
+            )
+
+    def carry_lookahead(self, p, g, anc):
+        '''
+            P, G and C rounds of the Draper-Kutin-Rains-Svore carry lookahead in O(log n) depth
+            :: p : list :: Propagate qubit p[i] = a[i] ^ b[i] for 1 <= i < n, p[0] is unused
+            :: g : list :: Generate qubit g[i] = a[i - 1] & b[i - 1] for 1 <= i <= n, g[0] is unused
+            :: anc : register :: n - w(n) - floor(log n) zeroed qubits for the propagate tree, returned to zero
+            Leaves g[i] holding the carry into bit i
+        '''
+        n = len(g) - 1
+        log_n = n.bit_length() - 1
+
+        # P[t][m] propagates over bits 2^t m .. 2^t (m + 1) - 1
+        P = [p]
+        offset = 0
+        for t in range(1, log_n):
+            P.append([None] + [anc[offset + m - 1] for m in range(1, n >> t)])
+            offset += (n >> t) - 1
+
+        # P Round
+        for t in range(1, log_n):
+            for m in range(1, n >> t):
+                self.toffoli(P[t - 1][2 * m], P[t - 1][2 * m + 1], P[t][m])
+
+        # G Round
+        for t in range(1, log_n + 1):
+            for m in range(n >> t):
+                self.toffoli(g[(m << t) + (1 << (t - 1))], P[t - 1][2 * m + 1], g[(m + 1) << t])
+
+        # C Round
+        for t in range((2 * n // 3).bit_length() - 1, 0, -1):
+            for m in range(1, (n - (1 << (t - 1))) // (1 << t) + 1):
+                self.toffoli(g[m << t], P[t - 1][2 * m], g[(m << t) + (1 << (t - 1))])
+
+        # P-1 Round
+        for t in range(log_n - 1, 0, -1):
+            for m in range(1, n >> t):
+                self.toffoli(P[t - 1][2 * m], P[t - 1][2 * m + 1], P[t][m])
+
+    @profiled
     def add_draper(self,
             reg_a,
             reg_b,
             target_reg=None,
             reg_carry=None,
             carry=True,
+            in_place=False,
             name='Adder Output'):
         '''
-            Draper Adder
+            Draper-Kutin-Rains-Svore carry lookahead adder
             https://arxiv.org/pdf/quant-ph/0406142
+            Out of place
+                reg_a(a_n)[n]       ->  reg_a(a_n)[n]
+                reg_b(b_n)[n]       ->  reg_b(b_n)[n]
+                target_reg(0)[n + 1] -> target_reg(a_n + b_n)[n + 1], n bits without the carry
+            In place
+                reg_a(a_n)[n]       ->  reg_a(a_n)[n]
+                reg_b(b_n)[n + 1]   ->  reg_b(a_n + b_n)[n + 1], n bits without the carry
+            :: reg_carry : register :: Accepted as for the ripple carry adders and ignored, the lookahead has no carry in qubit
         '''
+        n = len(reg_a)
+        carry = int(bool(carry))
+        if in_place:
+            assert(len(reg_b) == n + carry)
+            return self.add_draper_in_place(reg_a, reg_b, carry)
+
         assert(len(reg_a) == len(reg_b))
-        w_n = hamming_weight(len(reg_a))
+        if target_reg is None:
+            target_reg = self.register(n + carry, name=name)
 
-        target_reg = self.anc_register(
-                    reg_a.size + reg_b.size + 1, 
-                    reg=target_reg,
-                    name=name, 
-                )
-        anc_reg = self.anc_register(
-                    1, 
-                    reg=reg_carry,
-                    name='carry'
-                )
+        # Without a carry out the lookahead only needs the carries into the top n - 1 bits
+        m = n - 1 + carry
+        w_m = hamming_weight(m)
+        with self.ancillas(lookahead=m - w_m - max(m.bit_length() - 1, 0)) as anc:
+            # Initial Round
+            for i in range(m):
+                self.toffoli(reg_a[i], reg_b[i], target_reg[i + 1])
 
-        # Initial Round
-        for i in range(len(reg_a)):
-            self.toffoli(reg_a[i], reg_b[i], target_reg[i])
+            for i in range(1, n):
+                self.cnot(reg_a[i], reg_b[i])
 
-        for  i in range(1, len(reg_a)):
-            self.cnot(reg_a[i], reg_b[i])
+            self.carry_lookahead(reg_b, [None] + [target_reg[i] for i in range(1, m + 1)], anc.lookahead)
 
-        # P Round
-        # G Round
-        # C Round
-        # P-1 Round 
+            # Final Round
+            for i in range(1, n):
+                self.cnot(reg_b[i], target_reg[i])
 
-        # Final Round
-        for  i in range(1, len(reg_a)):
-            self.cnot(reg_a[i], reg_b[i])
+            for i in range(1, n):
+                self.cnot(reg_a[i], reg_b[i])
 
-        for i in range(len(reg_a)):
-            self.toffoli(reg_a[i], reg_b[i], target_reg[i])
+            self.cnot(reg_a[0], target_reg[0])
+            self.cnot(reg_b[0], target_reg[0])
 
-        self.anc_free(anc_reg)
         return target_reg
- 
+
+    def add_draper_in_place(self, reg_a, reg_b, carry):
+        '''
+            In place carry lookahead, the carries are computed into an ancilla register
+            and erased by running the lookahead backwards on the complement of the sum
+            whose carries over the low n - 1 bits are the same as those of the inputs
+        '''
+        n = len(reg_a)
+        m = n - 1 + carry
+        w_m = hamming_weight(m)
+        with self.ancillas(
+                carries=n - 1,
+                lookahead=m - w_m - max(m.bit_length() - 1, 0)) as anc:
+            g = [None] + [anc.carries[i] for i in range(n - 1)] + ([reg_b[n]] if carry else [])
+
+            for i in range(m):
+                self.toffoli(reg_a[i], reg_b[i], g[i + 1])
+
+            for i in range(n):
+                self.cnot(reg_a[i], reg_b[i])
+
+            self.carry_lookahead(reg_b, g[:m + 1], anc.lookahead)
+
+            for i in range(1, n):
+                self.cnot(g[i], reg_b[i])
+
+            # Erase the carries from the complement of the low n - 1 bits of the sum
+            for i in range(n - 1):
+                self.X(reg_b[i])
+            for i in range(1, n - 1):
+                self.cnot(reg_a[i], reg_b[i])
+
+            self.reverse(self.carry_lookahead, reg_b, g[:n], anc.lookahead)
+
+            for i in range(1, n - 1):
+                self.cnot(reg_a[i], reg_b[i])
+            for i in range(n - 1):
+                self.toffoli(reg_a[i], reg_b[i], g[i + 1])
+            for i in range(n - 1):
+                self.X(reg_b[i])
+
+        return reg_b
+
+    @profiled
     def subtract(self, 
                 reg_a, 
                 reg_b, 
                 reg_carry = None, 
                 carry=True):
         
-        reg_carry = self.anc_register(1, reg=reg_carry, name='carry')
-            
-        self.reverse(self.add, reg_a, reg_b, reg_carry=reg_carry, carry=carry)
-        
-        self.anc_free(reg_carry)
+        with self.ancillas(carry=(1, reg_carry)) as anc:
+            self.reverse(self.add, reg_a, reg_b, reg_carry=anc.carry, carry=carry)
+
+    @profiled
+    def subtract_gidney(self,
+                reg_a,
+                reg_b,
+                reg_carry=None,
+                carry=True):
+        '''
+            reg_b - reg_a as ~(~reg_b + reg_a)
+            Reversing the adder would also work, this keeps every logical AND ahead of its uncompute
+        '''
+        reg_b = reg_b[:len(reg_a) + int(bool(carry))]
+        for i in range(len(reg_b)):
+            self.X(reg_b[i])
+        self.add_gidney(reg_a, reg_b, reg_carry=reg_carry, carry=carry)
+        for i in range(len(reg_b)):
+            self.X(reg_b[i])
+
+    def adders(self, adder):
+        '''
+            In place adder and subtractor selected by name
+            :: adder : str :: 'cuccaro' for add and subtract, 'gidney' for add_gidney and subtract_gidney
+        '''
+        if adder == 'cuccaro':
+            return self.add, self.subtract
+        if adder == 'gidney':
+            return self.add_gidney, self.subtract_gidney
+        raise Exception(f"Unknown adder {adder}")
     
+    def accumulate(self, src, dst, subtract=False, adder='cuccaro'):
+        '''
+            dst += src modulo 2 ** len(dst) for operands of any size
+            src is truncated when dst is no longer than it and zero extended with ancillae when dst is longer than src + 1
+        '''
+        op = self.adders(adder)[int(subtract)]
+        if len(dst) <= len(src):
+            return op(src[:len(dst)], dst, carry=False)
+        if len(dst) == len(src) + 1:
+            return op(src, dst)
+        with self.ancillas(pad=len(dst) - len(src) - 1) as anc:
+            op(join(src, anc.pad), dst)
+
+    def majority_chain(self, reg_a, reg_b, reg_carry):
+        '''
+            MAJ half of the Cuccaro adder, leaves the carry out of reg_a + reg_b + reg_carry in reg_a[-1]
+            No sum bits are written, so running it backwards restores both operands
+        '''
+        self.MAJ(reg_a[0], reg_b[0], reg_carry[0])
+        for i in range(1, len(reg_a)):
+            self.MAJ(reg_a[i], reg_b[i], reg_a[i - 1])
+
+    def and_carries(self, reg_a, reg_b, ands, uncompute=False):
+        '''
+            Carry half of the Gidney adder, ands[i] -> carry into bit i + 1 of reg_a + reg_b
+            reg_a and reg_b are left xored with the carry into each bit above bit 0
+            :: uncompute : bool :: Erase the carries from the top by measurement, restoring both operands
+        '''
+        c = [None] + [ands[i] for i in range(len(reg_a))]
+        if not uncompute:
+            for i in range(len(reg_a)):
+                if i > 0:
+                    self.cnot(c[i], reg_a[i])
+                    self.cnot(c[i], reg_b[i])
+                self.logical_and(reg_a[i], reg_b[i], c[i + 1])
+                if i > 0:
+                    self.cnot(c[i], c[i + 1])
+            return
+        for i in range(len(reg_a) - 1, -1, -1):
+            if i > 0:
+                self.cnot(c[i], c[i + 1])
+            self.logical_and_uncompute(reg_a[i], reg_b[i], c[i + 1])
+            if i > 0:
+                self.cnot(c[i], reg_b[i])
+                self.cnot(c[i], reg_a[i])
+
+    def lookahead_carries(self, reg_a, reg_b, g, anc):
+        '''
+            Carries of reg_a + reg_b by the Draper-Kutin-Rains-Svore lookahead, g[i] -> carry into bit i + 1
+            reg_b is left holding the propagate bits above bit 0
+        '''
+        n = len(reg_a)
+        for i in range(n):
+            self.toffoli(reg_a[i], reg_b[i], g[i])
+        for i in range(1, n):
+            self.cnot(reg_a[i], reg_b[i])
+        self.carry_lookahead(reg_b, [None] + [g[i] for i in range(n)], anc)
+
+    @profiled
+    def compare(self, reg_a, reg_b, target_reg=None, method='ripple', adder='cuccaro', name='CMP'):
+        '''
+            reg_a(a_n)[n_a]     ->  reg_a(a_n)[n_a]
+            reg_b(b_n)[n_b]     ->  reg_b(b_n)[n_b]
+            target_reg(t)[1]    ->  target_reg(t ^ (a_n < b_n))[1]
+            a_n < b_n exactly when ~a_n + b_n carries out, so only the carries are computed and then uncomputed
+            The shorter operand is zero extended with ancillae
+            :: method : str :: 'ripple' for a carry chain, 'lookahead' for the O(log n) depth carry lookahead
+                with 2n - w(n) - floor(log n) ancillae
+            :: adder : str :: Carry chain of the ripple method, 'cuccaro' for MAJ gadgets with 2n Toffolis and one ancilla,
+                'gidney' for n logical ANDs erased by measurement and n ancillae
+        '''
+        if method not in ('ripple', 'lookahead'):
+            raise Exception(f"Unknown comparison method {method}")
+        if adder not in ('cuccaro', 'gidney'):
+            raise Exception(f"Unknown adder {adder}")
+        if target_reg is None:
+            target_reg = self.register(1, name=name)
+
+        n = max(len(reg_a), len(reg_b))
+        with self.ancillas(pad_a=n - len(reg_a), pad_b=n - len(reg_b)) as pad:
+            if pad.pad_a is not None:
+                reg_a = join(reg_a, pad.pad_a)
+            if pad.pad_b is not None:
+                reg_b = join(reg_b, pad.pad_b)
+
+            for i in range(n):
+                self.X(reg_a[i])
+            if method == 'ripple' and adder == 'gidney':
+                with self.ancillas(ands=n) as anc:
+                    self.and_carries(reg_a, reg_b, anc.ands)
+                    self.cnot(anc.ands[n - 1], target_reg)
+                    self.and_carries(reg_a, reg_b, anc.ands, uncompute=True)
+            elif method == 'ripple':
+                with self.ancillas(carry=1) as anc:
+                    self.majority_chain(reg_a, reg_b, anc.carry)
+                    self.cnot(reg_a[n - 1], target_reg)
+                    self.reverse(self.majority_chain, reg_a, reg_b, anc.carry)
+            else:
+                with self.ancillas(g=n, lookahead=n - hamming_weight(n) - (n.bit_length() - 1)) as anc:
+                    self.lookahead_carries(reg_a, reg_b, anc.g, anc.lookahead)
+                    self.cnot(anc.g[n - 1], target_reg)
+                    self.reverse(self.lookahead_carries, reg_a, reg_b, anc.g, anc.lookahead)
+            for i in range(n):
+                self.X(reg_a[i])
+        return target_reg
+
+    @profiled
     def multiply(self,
                  reg_a,
                  reg_b,
@@ -335,98 +1042,699 @@ class Circuit():
                  cpy_target_reg=None,
                  reg_carry=None,
                  name='MUL',
+                 method='schoolbook',
+                 cutoff=KARATSUBA_CUTOFF,
+                 adder='cuccaro',
                  **kwargs):
-        
+        '''
+            Shift and add multiplier
+            reg_a(a_n)[n_a]                 ->  reg_a(a_n)[n_a]
+            reg_b(b_n)[n_b]                 ->  reg_b(b_n)[n_b]
+            target_reg(0)[n_a + n_b + 1]    ->  target_reg(a_n * b_n)[n_a + n_b + 1]
+            :: precision : int :: Only keep the high precision bits of the product
+            :: method : str :: 'schoolbook' or 'karatsuba', see multiply_karatsuba
+            :: adder : str :: Inner adder, 'cuccaro' or 'gidney', see adders
+        '''
+        if method == 'karatsuba':
+            if precision is not None:
+                raise Exception("Karatsuba multiplication does not support a precision")
+            return self.multiply_karatsuba(reg_a, reg_b, target_reg=target_reg, cutoff=cutoff, name=name, adder=adder, **kwargs)
+        elif method != 'schoolbook':
+            raise Exception(f"Unknown multiplication method {method}")
         if precision is not None:
             assert precision > 0
         
-        target_reg = self.anc_register(reg_a.size + reg_b.size + 1, reg=target_reg, name=name, **kwargs)
-        cpy_target_reg = self.anc_register(reg_a.size + reg_b.size, reg=cpy_target_reg, name='MULCPY')
-        reg_carry = self.anc_register(1, reg=reg_carry, name='carry')
-            
-        for i in range(reg_a.size):
-            self.Ccpy(reg_a[i], reg_b, cpy_reg=cpy_target_reg)
-            self.add(
-                cpy_target_reg[:len(cpy_target_reg) - i],
-                target_reg[i:],
-                reg_carry=reg_carry
-            )
-            self.Ccpy(reg_a[i], reg_b, cpy_reg=cpy_target_reg)
-            
+        if target_reg is None:
+            target_reg = self.register(reg_a.size + reg_b.size + 1, name=name, **kwargs)
+
+        # The logical AND adder holds one carry per bit of the widest addition
+        n_carries = reg_a.size + reg_b.size if adder == 'gidney' else 1
+        with self.ancillas(cpy=(reg_a.size + reg_b.size, cpy_target_reg, 'MULCPY'), carry=(n_carries, reg_carry)) as anc:
+            cpy_target_reg = anc.cpy
+
+            def row(i):
+                def load(size):
+                    self.Ccpy(reg_a[i], reg_b[:size], cpy_reg=cpy_target_reg[:size])
+                return (i, reg_b.size, len(cpy_target_reg) - i, load)
+
+            self.shift_add([row(i) for i in range(reg_a.size)], target_reg, cpy_target_reg,
+                           reg_carry=anc.carry, precision=precision, adder=adder)
+
+        return target_reg
+    
+    def shift_add(self, rows, target_reg, cpy_reg, reg_carry=None, precision=None, adder='cuccaro'):
+        '''
+            Adds the rows of a schoolbook product into target_reg
+            :: rows : list :: (offset, size, width, load) for each row, load(m) writes the low m bits of the row's addend
+                into cpy_reg and is its own inverse, the row is added by a width bit adder at offset in the target
+            :: precision : int :: Only keep the high precision bits of the product, the rows are subtracted again
+                below the precision bit with full width subtractors
+        '''
+        add, subtract = self.adders(adder)
+        for offset, size, width, load in rows:
+            load(size)
+            add(cpy_reg[:width], target_reg[offset:offset + width + 1], reg_carry=reg_carry)
+            load(size)
+
+        if precision is None:
+            return target_reg
+
+        precision_bit = target_reg.size - precision + 1
+        for offset, size, _, load in rows[::-1]:
+            adder_high_bit = offset + size + 1
+
+            # Limit
+            if offset > precision_bit:
+                continue
+
+            if adder_high_bit > precision_bit:
+                adder_size = size - (adder_high_bit - precision_bit)
+                load(adder_size)
+                subtract(
+                    cpy_reg[:len(cpy_reg) - offset],
+                    target_reg[offset:],
+                    reg_carry=reg_carry,
+                    carry=False
+                )
+                load(adder_size)
+            else:
+                load(size)
+                subtract(
+                    cpy_reg[:len(cpy_reg) - offset],
+                    target_reg[offset:],
+                    reg_carry=reg_carry,
+                )
+                load(size)
+        return target_reg
+
+    @profiled
+    def square(self, reg, precision=None, target_reg=None, adder='cuccaro', name='SQR'):
+        '''
+            reg(a_n)[n]                 ->  reg(a_n)[n]
+            target_reg(0)[2n + 1]       ->  target_reg(a_n ** 2)[2n + 1]
+            Each cross term a_i a_j is added once at twice its weight, so row i adds
+            a_i + 2 a_i (a_(i+1) .. a_(n-1)) at bit 2i and needs n - 1 - i controlled copies
+            The partial sum after row i is below 2 ** (n + i + 2), so each row only adds into n - i + 2 bits
+            :: precision : int :: Only keep the high precision bits of the square as in multiply,
+                dropping the terms of the symmetric layout with weight below 2n + 1 - precision
+        '''
+        n = reg.size
         if precision is not None:
-            precision_bit = target_reg.size - precision + 1
-            for i in range(reg_a.size - 1, -1, -1):
-                #precision_bit = i + reg_b.size + 1
-                adder_high_bit = i + reg_b.size + 1 
-                
-                # Limit 
-                if i > precision_bit:
-                    continue
-                
-                if adder_high_bit > precision_bit:
-                    adder_size = reg_b.size - (adder_high_bit - precision_bit)
-                    
-                    self.Ccpy(reg_a[i], reg_b[:adder_size], cpy_reg=cpy_target_reg[:adder_size])
-                    self.subtract(
-                        cpy_target_reg[:len(cpy_target_reg) - i],
-                        target_reg[i:],
-                        reg_carry=reg_carry,
-                        carry=False
-                    )
-                    self.Ccpy(reg_a[i], reg_b[:adder_size], cpy_reg=cpy_target_reg[:adder_size])
-                    
+            assert precision > 0
+        if target_reg is None:
+            target_reg = self.register(2 * n + 1, name=name)
+
+        n_carries = 2 * n if adder == 'gidney' else 1
+        with self.ancillas(cpy=2 * n, carry=n_carries) as anc:
+            def row(i):
+                def load(size):
+                    # The diagonal term a_i a_i = a_i, bit 1 of the row is always zero
+                    if size >= 1:
+                        self.cnot(reg[i], anc.cpy[0])
+                    n_cross = min(size - 2, n - 1 - i)
+                    if n_cross > 0:
+                        self.Ccpy(reg[i], reg[i + 1:i + 1 + n_cross], cpy_reg=anc.cpy[2:2 + n_cross])
+                return (2 * i, n - i + 1, n - i + 1, load)
+
+            self.shift_add([row(i) for i in range(n)], target_reg, anc.cpy,
+                           reg_carry=anc.carry, precision=precision, adder=adder)
+        return target_reg
+
+    @profiled
+    def multiply_karatsuba(self,
+                           reg_a,
+                           reg_b,
+                           target_reg=None,
+                           cutoff=KARATSUBA_CUTOFF,
+                           name='MUL',
+                           adder='cuccaro',
+                           **kwargs):
+        '''
+            Karatsuba multiplier, O(n ^ log2(3)) Toffoli gates
+            The product is built in an ancilla register by a forward pass that keeps the operand sums
+            and middle products of each step as garbage, added into the target, then the forward pass is reversed
+            Operands no longer than cutoff use the shift and add multiplier
+            reg_a(a_n)[n_a]                 ->  reg_a(a_n)[n_a]
+            reg_b(b_n)[n_b]                 ->  reg_b(b_n)[n_b]
+            target_reg(0)[n_a + n_b + 1]    ->  target_reg(a_n * b_n)[n_a + n_b + 1]
+            :: cutoff : int :: Largest operand size multiplied directly, at least 3 so the operand sums shrink
+        '''
+        if cutoff < 3:
+            raise Exception(f"Karatsuba cutoff must be at least 3, not {cutoff}")
+        if min(len(reg_a), len(reg_b)) <= cutoff:
+            return self.multiply(reg_a, reg_b, target_reg=target_reg, name=name, adder=adder, **kwargs)
+
+        if target_reg is None:
+            target_reg = self.register(len(reg_a) + len(reg_b) + 1, name=name, **kwargs)
+
+        with self.ancillas(
+                product=len(reg_a) + len(reg_b),
+                garbage=karatsuba_garbage(len(reg_a), len(reg_b), cutoff)) as anc:
+            self.karatsuba(reg_a, reg_b, anc.product, anc.garbage, cutoff, adder)
+            self.accumulate(anc.product, target_reg, adder=adder)
+            # Each logical AND adder uncomputes its own ANDs, so the reversed pass has the same counts
+            self.reverse(self.karatsuba, reg_a, reg_b, anc.product, anc.garbage, cutoff, adder, permit_rev_alloc=True)
+
+        return target_reg
+
+    def karatsuba(self, reg_a, reg_b, out, garbage, cutoff, adder='cuccaro'):
+        '''
+            Forward pass of the Karatsuba multiplier
+            out(0)[n_a + n_b]                           -> out(a_n * b_n)[n_a + n_b]
+            garbage(0)[karatsuba_garbage(n_a, n_b)]     -> garbage(operand sums and middle products)
+            Ancillae are scoped, so reversing the pass with the same garbage register returns it to zero
+        '''
+        n_a, n_b = len(reg_a), len(reg_b)
+        if min(n_a, n_b) <= cutoff:
+            # Schoolbook rows, the partial product after row i fits in n_b + i + 1 bits
+            with self.ancillas(cpy=n_b) as anc:
+                for i in range(n_a):
+                    self.Ccpy(reg_a[i], reg_b, cpy_reg=anc.cpy)
+                    self.accumulate(anc.cpy, out[i:i + n_b + 1], adder=adder)
+                    self.Ccpy(reg_a[i], reg_b, cpy_reg=anc.cpy)
+            return
+
+        h = karatsuba_split(n_a, n_b)
+        n_sa, n_sb = n_a - h + 1, n_b - h + 1
+        sizes = [n_sa, n_sb, n_sa + n_sb,
+                 karatsuba_garbage(h, h, cutoff),
+                 karatsuba_garbage(n_a - h, n_b - h, cutoff),
+                 karatsuba_garbage(n_sa, n_sb, cutoff)]
+        bounds = np.cumsum([0] + sizes)
+        reg_sa, reg_sb, reg_mid, garbage_lo, garbage_hi, garbage_mid = (
+            garbage[int(start):int(stop)] for start, stop in zip(bounds[:-1], bounds[1:])
+        )
+
+        # Low and high products straight into their halves of the output
+        self.karatsuba(reg_a[:h], reg_b[:h], out[:2 * h], garbage_lo, cutoff, adder)
+        self.karatsuba(reg_a[h:], reg_b[h:], out[2 * h:], garbage_hi, cutoff, adder)
+
+        # (a_0 + a_1)(b_0 + b_1) - a_0 b_0 - a_1 b_1
+        self.cpy(reg_a[h:], reg_sa)
+        self.accumulate(reg_a[:h], reg_sa, adder=adder)
+        self.cpy(reg_b[h:], reg_sb)
+        self.accumulate(reg_b[:h], reg_sb, adder=adder)
+        self.karatsuba(reg_sa, reg_sb, reg_mid, garbage_mid, cutoff, adder)
+        self.accumulate(out[:2 * h], reg_mid, subtract=True, adder=adder)
+        self.accumulate(out[2 * h:], reg_mid, subtract=True, adder=adder)
+
+        self.accumulate(reg_mid, out[h:], adder=adder)
+
+    '''
+        Classical Constant Arithmetic
+    '''
+    def const_carries(self, reg, value, carries):
+        '''
+            Carry chain of reg + value with the bits of value known classically
+            A zero bit of value makes the carry out b & c and a one bit makes it b | c
+            :: reg : register :: Quantum operand, only read
+            :: value : int :: Odd constant, so the first carry is reg[0] itself
+            :: carries : list :: Zeroed qubits for the carries into bits 2 .. len(carries) + 1
+        '''
+        prev = reg[0]
+        for i, carry in enumerate(carries, start=1):
+            if (value >> i) & 1:
+                self.X(reg[i])
+                self.X(prev)
+                self.toffoli(reg[i], prev, carry)
+                self.X(reg[i])
+                self.X(prev)
+                self.X(carry)
+            else:
+                self.toffoli(reg[i], prev, carry)
+            prev = carry
+
+    @profiled
+    def add_const(self, reg, value):
+        '''
+            reg(b_n)[n] -> reg(b_n + value)[n], modulo 2 ** n
+            Bits below the lowest set bit of value are untouched and the known bits replace the second operand
+            The carries are erased by recomputing them from the complement of the sum, which has the same carries
+            :: value : int :: Classical constant, may be negative
+        '''
+        value = int(value) % (1 << len(reg))
+        if value == 0:
+            return reg
+        shift = (value & -value).bit_length() - 1
+        reg, value = reg[shift:], value >> shift
+        n = len(reg)
+
+        with self.ancillas(carries=max(n - 2, 0)) as anc:
+            carries = [anc.carries[i] for i in range(n - 2)]
+            self.const_carries(reg, value, carries)
+
+            # Sum from the top down, reg[0] is the first carry until it is flipped
+            for i in range(n - 1, 0, -1):
+                self.cnot(([reg[0]] + carries)[i - 1], reg[i])
+                if (value >> i) & 1:
+                    self.X(reg[i])
+            self.X(reg[0])
+
+            for i in range(n - 1):
+                self.X(reg[i])
+            self.reverse(self.const_carries, reg, value, carries)
+            for i in range(n - 1):
+                self.X(reg[i])
+        return reg
+
+    def sub_const(self, reg, value):
+        '''
+            reg(b_n)[n] -> reg(b_n - value)[n], modulo 2 ** n
+        '''
+        return self.add_const(reg, -int(value))
+
+    @profiled
+    def mul_const(self, reg, value, target_reg=None, name='MULC'):
+        '''
+            reg(a_n)[n]             ->  reg(a_n)[n]
+            target_reg(t)[m]        ->  target_reg(t + a_n * value)[m], modulo 2 ** m
+            One addition of reg per nonzero digit of value, in binary or non adjacent form
+            whichever has fewer digits, so no controlled copies are needed
+            :: value : int :: Non negative classical constant
+            :: target_reg : register :: Defaults to a new n + value.bit_length() qubit register
+        '''
+        value = int(value)
+        if value < 0:
+            raise Exception(f"Constant multiplier must be non negative, not {value}")
+        if target_reg is None:
+            target_reg = self.register(len(reg) + value.bit_length(), name=name)
+
+        digits = naf(value)
+        if sum(d != 0 for d in digits) >= hamming_weight(value):
+            digits = [(value >> i) & 1 for i in range(value.bit_length())]
+
+        for i, digit in enumerate(digits):
+            if digit != 0 and i < len(target_reg):
+                self.accumulate(reg, target_reg[i:], subtract=digit < 0)
+        return target_reg
+
+    @profiled
+    def compare_const(self, reg, value, target_reg=None, method='ripple', name='CMPC'):
+        '''
+            reg(b_n)[n]         ->  reg(b_n)[n]
+            target_reg(t)[1]    ->  target_reg(t ^ (b_n < value))[1]
+            b_n < value exactly when b_n + 2 ** n - value has no carry out, so only the carries are computed
+            :: value : int :: Classical constant
+            :: method : str :: 'ripple' for the carry chain of the known bits of value,
+                'lookahead' to load value into ancillae and use the O(log n) depth compare
+        '''
+        if method not in ('ripple', 'lookahead'):
+            raise Exception(f"Unknown comparison method {method}")
+        if target_reg is None:
+            target_reg = self.register(1, name=name)
+        n = len(reg)
+        value = int(value)
+        if value <= 0:
+            return target_reg
+        if value >= 1 << n:
+            self.X(target_reg)
+            return target_reg
+
+        if method == 'lookahead':
+            with self.ancillas(const=n) as anc:
+                for i in range(n):
+                    if (value >> i) & 1:
+                        self.X(anc.const[i])
+                self.compare(reg, anc.const, target_reg=target_reg, method='lookahead')
+                for i in range(n):
+                    if (value >> i) & 1:
+                        self.X(anc.const[i])
+            return target_reg
+
+        complement = (1 << n) - value
+        shift = (complement & -complement).bit_length() - 1
+        reg, complement = reg[shift:], complement >> shift
+
+        with self.ancillas(carries=len(reg) - 1) as anc:
+            carries = [anc.carries[i] for i in range(len(reg) - 1)]
+            self.const_carries(reg, complement, carries)
+            self.cnot(([reg[0]] + carries)[-1], target_reg)
+            self.X(target_reg)
+            self.reverse(self.const_carries, reg, complement, carries)
+        return target_reg
+
+    '''
+        Modular Arithmetic
+    '''
+    def swap(self, reg_a, reg_b):
+        '''
+            Exchanges two registers of the same size with three CNOTs per qubit
+        '''
+        for i in range(len(reg_a)):
+            self.cnot(reg_a[i], reg_b[i])
+            self.cnot(reg_b[i], reg_a[i])
+            self.cnot(reg_a[i], reg_b[i])
+
+    @profiled
+    def lookup(self, address, table, target):
+        '''
+            address(k)[w]   ->  address(k)[w]
+            target(t)[m]    ->  target(t ^ table[k])[m]
+            Unary iteration over the address bits from the top, https://arxiv.org/abs/1805.03662
+            Each node of the binary tree turns its control into the controls of its two halves with one logical AND,
+            so a full table costs 2 ** w - 2 ANDs and w - 1 ancillae, and a one bit address costs no Toffolis
+            Subtrees of zero entries are skipped
+            :: table : list :: Classical entries, missing entries are zero
+        '''
+        w = len(address)
+        table = [int(entry) % (1 << len(target)) for entry in table[:1 << w]]
+        table += [0] * ((1 << w) - len(table))
+
+        def write(ctrl, entry):
+            if self.mode == 'count':
+                return self.tally(X if ctrl is None else CNOT, hamming_weight(entry))
+            for i in range(len(target)):
+                if (entry >> i) & 1:
+                    if ctrl is None:
+                        self.X(target[i])
+                    else:
+                        self.cnot(ctrl, target[i])
+
+        def iterate(ctrl, level, offset):
+            # Writes the entries offset to offset + 2 ** level under ctrl, the address bits below level select
+            if not any(table[offset:offset + (1 << level)]):
+                return
+            if level == 0:
+                return write(ctrl, table[offset])
+            bit, half = address[level - 1], 1 << (level - 1)
+            low, high = any(table[offset:offset + half]), any(table[offset + half:offset + 2 * half])
+
+            if ctrl is None:
+                if low:
+                    self.X(bit)
+                    iterate(bit, level - 1, offset)
+                    self.X(bit)
+                iterate(bit, level - 1, offset + half)
+                return
+
+            select = anc.select[level - 1]
+            if low:
+                self.X(bit)
+                self.logical_and(ctrl, bit, select)
+                self.X(bit)
+                iterate(select, level - 1, offset)
+                if high:
+                    self.cnot(ctrl, select)
                 else:
-                                
-                    self.Ccpy(reg_a[i], reg_b, cpy_reg=cpy_target_reg)
-                    self.subtract(
-                        cpy_target_reg[:len(cpy_target_reg) - i],
-                        target_reg[i:],
-                        reg_carry=reg_carry,
-                    )
-                    self.Ccpy(reg_a[i], reg_b, cpy_reg=cpy_target_reg)
-            
-        
-        self.anc_free(cpy_target_reg)
-        self.anc_free(reg_carry)
-            
+                    self.X(bit)
+            else:
+                self.logical_and(ctrl, bit, select)
+            iterate(select, level - 1, offset + half)
+            self.logical_and_uncompute(ctrl, bit, select)
+            if low and not high:
+                self.X(bit)
+
+        with self.ancillas(select=max(w - 1, 0)) as anc:
+            iterate(None, w, 0)
+        return target
+
+    def reduce_mod(self, reg, modulus, flag, const, adder='cuccaro'):
+        '''
+            reg(s)[n + 1]   ->  reg(s % modulus)[n + 1], for s < 2 modulus
+            flag(0)[1]      ->  flag(s < modulus)[1]
+            The modulus is subtracted and then added back under the sign
+            :: const : register :: n zeroed qubits that hold the modulus, returned to zero
+        '''
+        n = len(reg) - 1
+        add, subtract = self.adders(adder)
+        for i in range(n):
+            if (modulus >> i) & 1:
+                self.X(const[i])
+        subtract(const, reg)
+        self.cnot(reg[n], flag)
+
+        # Keep the modulus only when the difference was negative
+        self.lookup(flag, [modulus, 0], const)
+        add(const, reg)
+        self.lookup(flag, [0, modulus], const)
+
+    @profiled
+    def add_mod(self, reg_a, reg_b, modulus, adder='cuccaro'):
+        '''
+            reg_a(a_n)[n]   ->  reg_a(a_n)[n]
+            reg_b(b_n)[n]   ->  reg_b((a_n + b_n) % modulus)[n]
+            Both operands must already be reduced, a_n, b_n < modulus <= 2 ** n
+            The sum is reduced by subtracting the modulus and adding it back when the result is negative,
+            that sign is then erased by a compare against reg_a, as the sum wrapped exactly when it is now below a_n
+            :: modulus : int :: Classical modulus
+            :: adder : str :: Inner adder, 'cuccaro' or 'gidney', see adders
+        '''
+        n = len(reg_a)
+        modulus = int(modulus)
+        assert(len(reg_b) == n and 0 < modulus <= 1 << n)
+        add = self.adders(adder)[0]
+
+        # The modulus does not fit in the n qubit constant, but the reduction is the wrap of an n bit adder
+        if modulus == 1 << n:
+            add(reg_a, reg_b, carry=False)
+            return reg_b
+
+        with self.ancillas(high=1, flag=1, const=n) as anc:
+            reg_s = join(reg_b, anc.high)
+            add(reg_a, reg_s)
+            self.reduce_mod(reg_s, modulus, anc.flag, anc.const, adder=adder)
+
+            # The flag is set exactly when the reduced sum is at least a_n
+            self.X(anc.flag)
+            self.compare(reg_b, reg_a, target_reg=anc.flag, adder=adder)
+        return reg_b
+
+    @profiled
+    def sub_mod(self, reg_a, reg_b, modulus, adder='cuccaro'):
+        '''
+            reg_a(a_n)[n]   ->  reg_a(a_n)[n]
+            reg_b(b_n)[n]   ->  reg_b((b_n - a_n) % modulus)[n]
+        '''
+        self.reverse(self.add_mod, reg_a, reg_b, modulus, adder=adder, permit_rev_alloc=True)
+        return reg_b
+
+    def double_mod(self, reg, modulus, adder='cuccaro'):
+        '''
+            reg(b_n)[n + 1] ->  reg(2 b_n % modulus)[n + 1], the top qubit is zero before and after
+            The doubled value is reduced as in add_mod, and as the modulus is odd
+            the reduced value is odd exactly when the modulus was subtracted, which erases the sign
+        '''
+        n = len(reg) - 1
+        with self.ancillas(flag=1, const=n) as anc:
+            for i in range(n, 0, -1):
+                self.swap(reg[i], reg[i - 1])
+            self.reduce_mod(reg, modulus, anc.flag, anc.const, adder=adder)
+
+            self.X(reg[0])
+            self.cnot(reg[0], anc.flag)
+            self.X(reg[0])
+        return reg
+
+    @profiled
+    def mul_mod(self, reg_a, reg_b, modulus, target_reg=None, adder='cuccaro', name='MULM'):
+        '''
+            reg_a(a_n)[n_a]     ->  reg_a(a_n)[n_a]
+            reg_b(b_n)[n]       ->  reg_b(b_n)[n]
+            target_reg(t)[n]    ->  target_reg((t 2 ** n_a + a_n * b_n) % modulus)[n]
+            Horner's rule from the top bit of reg_a, doubling the target and adding the controlled copy of reg_b
+            :: modulus : int :: Odd classical modulus, b_n and t must be reduced
+        '''
+        modulus = int(modulus)
+        if modulus % 2 == 0:
+            raise Exception(f"Modular multiplication needs an odd modulus, not {modulus}")
+        if target_reg is None:
+            target_reg = self.register(len(reg_b), name=name)
+
+        with self.ancillas(high=1, cpy=len(reg_b)) as anc:
+            for i in range(len(reg_a) - 1, -1, -1):
+                self.double_mod(join(target_reg, anc.high), modulus, adder=adder)
+                self.Ccpy(reg_a[i], reg_b, cpy_reg=anc.cpy)
+                self.add_mod(anc.cpy, target_reg, modulus, adder=adder)
+                self.Ccpy(reg_a[i], reg_b, cpy_reg=anc.cpy)
         return target_reg
-    
-    # TODO Register Realloc
-    
+
+    def mul_mod_accumulate(self, reg, target, factors, modulus, address=None, window=1, subtract=False, adder='cuccaro'):
+        '''
+            target(t)[n] -> target((t +- reg * factors[address]) % modulus)[n]
+            reg is split into windows of window bits, for each window the reduced multiple of the selected factor
+            is looked up into an ancilla and added to the target
+            :: factors : list :: Classical multipliers, indexed by the value of address
+            :: address : register :: Selects the factor, None for a single factor
+        '''
+        op = self.sub_mod if subtract else self.add_mod
+        n_address = 0 if address is None else len(address)
+        with self.ancillas(entry=len(target)) as anc:
+            for start in range(0, len(reg), window):
+                bits = reg[start:min(start + window, len(reg))]
+                w = len(bits)
+                table = [
+                    (k << start) * factors[e] % modulus
+                    for e in range(1 << n_address) for k in range(1 << w)
+                ]
+                index = bits if address is None else join(bits, address)
+                self.lookup(index, table, anc.entry)
+                op(anc.entry, target, modulus, adder=adder)
+                self.lookup(index, table, anc.entry)
+        return target
+
+    @profiled
+    def mul_mod_const(self, reg, value, modulus, target_reg=None, in_place=False, window=1, adder='cuccaro', name='MULM'):
+        '''
+            Out of place
+                reg(a_n)[n]         ->  reg(a_n)[n]
+                target_reg(t)[n]    ->  target_reg((t + a_n * value) % modulus)[n]
+            In place
+                reg(a_n)[n]         ->  reg(a_n * value % modulus)[n]
+                The product is computed out of place, swapped in, and the ancilla cleared by subtracting
+                the product times the inverse of value, so value must be invertible and a_n reduced
+            :: window : int :: Bits of reg per table lookup and modular addition
+        '''
+        modulus = int(modulus)
+        value = int(value) % modulus
+        if not in_place:
+            if target_reg is None:
+                target_reg = self.register(len(reg), name=name)
+            return self.mul_mod_accumulate(reg, target_reg, [value], modulus, window=window, adder=adder)
+
+        inverse = mod_inverse(value, modulus)
+        with self.ancillas(product=len(reg)) as anc:
+            self.mul_mod_accumulate(reg, anc.product, [value], modulus, window=window, adder=adder)
+            self.swap(reg, anc.product)
+            self.mul_mod_accumulate(reg, anc.product, [inverse], modulus, window=window, subtract=True, adder=adder)
+        return reg
+
+    @profiled
+    def exp_mod(self, reg_e, base, modulus, target_reg=None, window_exp=1, window_mul=1, adder='cuccaro', name='EXPM'):
+        '''
+            reg_e(e)[m]         ->  reg_e(e)[m]
+            target_reg(t)[n]    ->  target_reg(t * base ** e % modulus)[n], t defaults to 1
+            Windowed modular exponentiation, https://arxiv.org/abs/1905.07682
+            Each window of exponent bits selects the factor of an in place multiplication through the table lookups,
+            so no multiplication is controlled
+            :: window_exp : int :: Exponent bits per in place multiplication
+            :: window_mul : int :: Multiplicand bits per modular addition
+            :: base : int :: Classical base, invertible modulo the modulus
+        '''
+        modulus = int(modulus)
+        n = modulus.bit_length()
+        if target_reg is None:
+            target_reg = self.register(n, name=name, initial_value=1)
+
+        with self.ancillas(product=len(target_reg)) as anc:
+            for start in range(0, len(reg_e), window_exp):
+                bits = reg_e[start:min(start + window_exp, len(reg_e))]
+                factors = [pow(int(base), k << start, modulus) for k in range(1 << len(bits))]
+                inverses = [mod_inverse(factor, modulus) for factor in factors]
+
+                self.mul_mod_accumulate(target_reg, anc.product, factors, modulus,
+                                        address=bits, window=window_mul, adder=adder)
+                self.swap(target_reg, anc.product)
+                self.mul_mod_accumulate(target_reg, anc.product, inverses, modulus,
+                                        address=bits, window=window_mul, subtract=True, adder=adder)
+        return target_reg
+
+    @profiled
     def divide(self, 
                reg_a,
                reg_b, 
                cpy_target_reg=None,
-               reg_carry=None):
+               reg_carry=None,
+               adder='cuccaro'):
+        add, subtract = self.adders(adder)
         reg_r = self.register(reg_a.size + 1, name='Remainder') # Remainder, high bit needed
         reg_q = self.register(reg_a.size - reg_b.size + 1, name='Quotient') # Quotient
         
-        cpy_target_reg = self.anc_register(reg_a.size + 1, name='DIVANC', reg=cpy_target_reg)
-        reg_carry = self.anc_register(reg_a.size + 1, name='Carry', reg=reg_carry)
+        with self.ancillas(cpy=(reg_a.size + 1, cpy_target_reg, 'DIVANC'), carry=(reg_a.size + 1, reg_carry, 'Carry')) as anc:
+            cpy_target_reg = anc.cpy
+            reg_carry = anc.carry
 
-        # Initial copy to the remainder column
-        self.cpy(reg_a[reg_a.size - reg_b.size:], reg_r[reg_a.size - reg_b.size:])
-        for i in range(reg_a.size - reg_b.size + 1):
+            # Initial copy to the remainder column
+            self.cpy(reg_a[reg_a.size - reg_b.size:], reg_r[reg_a.size - reg_b.size:])
+            for i in range(reg_a.size - reg_b.size + 1):
             
-            targ_index = reg_a.size - reg_b.size - i
+                targ_index = reg_a.size - reg_b.size - i
             
-            if i > 0:
-                self.cpy(reg_a[targ_index], cpy_target_reg[0])
-                self.add(cpy_target_reg[:reg_r.size - targ_index - 1], reg_r[targ_index:], reg_carry=reg_carry)
-                self.cpy(reg_a[targ_index], cpy_target_reg[0])
+                if i > 0:
+                    self.cpy(reg_a[targ_index], cpy_target_reg[0])
+                    add(cpy_target_reg[:reg_r.size - targ_index - 1], reg_r[targ_index:], reg_carry=reg_carry)
+                    self.cpy(reg_a[targ_index], cpy_target_reg[0])
 
-            # Parity, might remove this CNOT
-            self.cnot(reg_r[-1 - i], reg_q[-1 - i])
+                # The window is below 2 b_n < 2 ** (n_b + 1), so it was at least b_n exactly when the difference has a clear top bit
+                subtract(reg_b, reg_r[reg_a.size - reg_b.size - i: reg_r.size - i], reg_carry=reg_carry)
+                self.cnot(reg_r[-1 - i], reg_q[-1 - i])
 
-            self.subtract(reg_b, reg_r[reg_a.size - reg_b.size - i: reg_r.size - i], reg_carry=reg_carry)
-            self.cnot(reg_r[-1 - i], reg_q[-1 - i])
+                self.Ccpy(reg_q[-1 - i], reg_b, cpy_reg=cpy_target_reg)
+                add(cpy_target_reg[:reg_b.size], reg_r[reg_a.size - reg_b.size - i: reg_r.size - i], reg_carry=reg_carry)
+                self.Ccpy(reg_q[-1 - i], reg_b, cpy_reg=cpy_target_reg)
+                self.X(reg_q[-1 - i])
 
-            self.Ccpy(reg_q[-1 - i], reg_b, cpy_reg=cpy_target_reg)
-            self.add(cpy_target_reg[:reg_b.size], reg_r[reg_a.size - reg_b.size - i: reg_r.size - i], reg_carry=reg_carry)
-            self.Ccpy(reg_q[-1 - i], reg_b, cpy_reg=cpy_target_reg)
-            self.X(reg_q[-1 - i])
-            
-        self.anc_free(cpy_target_reg)
-        self.anc_free(reg_carry)
+        return reg_r, reg_q
+
+    @profiled
+    def divide_compare(self, reg_a, reg_b, method='ripple', adder='cuccaro'):
+        '''
+            Long division with each quotient bit found by a compare, same outputs as divide
+            The divisor is then only subtracted under the quotient bit, so no step restores the remainder
+            and bits of reg_a are never brought down by an addition, as the remainder is built in place over a copy of it
+            reg_a(a_n)[n_a]     ->  reg_a(a_n)[n_a]
+            reg_b(b_n)[n_b]     ->  reg_b(b_n)[n_b]
+            Returns reg_r(a_n - q b_n)[n_a + 1], reg_q(q)[n_a - n_b + 1]
+            :: method : str :: Comparison method, see compare
+            :: adder : str :: Inner adder, 'cuccaro' or 'gidney', see adders, also selects the carry chain of the compares
+        '''
+        _, subtract = self.adders(adder)
+        reg_r = self.register(reg_a.size + 1, name='Remainder') # Remainder, zero above the window
+        reg_q = self.register(reg_a.size - reg_b.size + 1, name='Quotient') # Quotient
+
+        self.cpy(reg_a, reg_r[:reg_a.size])
+        with self.ancillas(cpy=reg_b.size, carry=reg_b.size + 1 if adder == 'gidney' else 1) as anc:
+            for shift in range(reg_a.size - reg_b.size, -1, -1):
+                # The window is below twice the divisor, so one subtraction reduces it
+                window = reg_r[shift:shift + reg_b.size + 1]
+                self.compare(window, reg_b, target_reg=reg_q[shift], method=method, adder=adder)
+                self.X(reg_q[shift])
+
+                self.Ccpy(reg_q[shift], reg_b, cpy_reg=anc.cpy)
+                subtract(anc.cpy, window, reg_carry=anc.carry)
+                self.Ccpy(reg_q[shift], reg_b, cpy_reg=anc.cpy)
+
+        return reg_r, reg_q
+
+    @profiled
+    def divide_nonrestoring(self, reg_a, reg_b, remainder=True, adder='cuccaro'):
+        '''
+            Non restoring long division, same outputs as divide
+            The partial remainder is kept in two's complement and each step adds or subtracts the shifted divisor
+            depending on the previous quotient bit, so no step restores the remainder
+            Subtraction is addition conjugated by complementing the remainder, R - b = ~(~R + b)
+            so each step is a single uncontrolled adder
+            reg_a(a_n)[n_a]     ->  reg_a(a_n)[n_a]
+            reg_b(b_n)[n_b]     ->  reg_b(b_n)[n_b]
+            Returns reg_r(a_n - q b_n)[n_a + 1], reg_q(q)[n_a - n_b + 1]
+            :: remainder : bool :: Correct a negative final remainder with one controlled adder,
+                otherwise only the quotient is guaranteed and reg_r holds r - b_n when the last quotient bit is 0
+            :: adder : str :: Inner adder, 'cuccaro' or 'gidney', see adders
+        '''
+        reg_r = self.register(reg_a.size + 1, name='Remainder') # Remainder, sign bit needed
+        reg_q = self.register(reg_a.size - reg_b.size + 1, name='Quotient') # Quotient
+        sign = reg_r[reg_a.size]
+
+        self.cpy(reg_a, reg_r[:reg_a.size])
+        for shift in range(reg_a.size - reg_b.size, -1, -1):
+            window = reg_r[shift:]
+            if shift == reg_a.size - reg_b.size:
+                self.accumulate(reg_b, window, subtract=True, adder=adder)
+            else:
+                # Subtract after a non negative remainder, add after a negative one
+                for i in range(len(window)):
+                    self.cnot(reg_q[shift + 1], window[i])
+                self.accumulate(reg_b, window, adder=adder)
+                for i in range(len(window)):
+                    self.cnot(reg_q[shift + 1], window[i])
+            self.cnot(sign, reg_q[shift])
+            self.X(reg_q[shift])
+
+        if remainder:
+            self.X(reg_q[0])
+            with self.ancillas(cpy=reg_b.size) as anc:
+                self.Ccpy(reg_q[0], reg_b, cpy_reg=anc.cpy)
+                self.accumulate(anc.cpy, reg_r, adder=adder)
+                self.Ccpy(reg_q[0], reg_b, cpy_reg=anc.cpy)
+            self.X(reg_q[0])
 
         return reg_r, reg_q
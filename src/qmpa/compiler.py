@@ -0,0 +1,247 @@
+import numpy as np
+
+from qmpa.gates import OP_X, OP_CNOT, OP_TOFFOLI, OP_ALLOC, OP_FREE, OP_AND, OP_AND_UNCOMPUTE, THREE_QUBIT_OPS, int_to_bin, bin_to_int
+
+'''
+Flat opcode representation of a circuit
+Every gate is resolved once into columnar opcode / ctrl_a / ctrl_b / targ arrays
+Alloc and Free keep their metadata in a side table, their targ column indexes that table
+'''
+
+class AllocRecord():
+    def __init__(self, qubits, initial_value, chunk, name=None):
+        self.qubits = qubits
+        self.initial_value = initial_value
+        self.chunk = chunk
+        self.name = name
+
+class FreeRecord():
+    def __init__(self, qubits, final_value, assert_cleanup):
+        self.qubits = qubits
+        self.final_value = final_value
+        self.assert_cleanup = assert_cleanup
+
+class CompiledCircuit():
+    '''
+        Columnar opcode arrays for a circuit
+        Arrays grow geometrically so the circuit can be compiled incrementally
+    '''
+    def __init__(self, capacity=1024):
+        self.opcode = np.zeros(capacity, dtype=np.int8)
+        self.ctrl_a = np.zeros(capacity, dtype=np.int32)
+        self.ctrl_b = np.zeros(capacity, dtype=np.int32)
+        self.targ = np.zeros(capacity, dtype=np.int32)
+        self.gate_ops = np.zeros(capacity, dtype=np.int64) # First operation of each source gate
+        self.meta = []
+        self.size = 0 # Number of compiled operations
+        self.n_gates = 0 # Number of source gates compiled
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, columns, used, required):
+        capacity = len(getattr(self, columns[0]))
+        if required <= capacity:
+            return
+        while required > capacity:
+            capacity *= 2
+        for column in columns:
+            old = getattr(self, column)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:used] = old[:used]
+            setattr(self, column, new)
+
+    def reserve(self, n_ops, n_gates=0):
+        self._grow(('opcode', 'ctrl_a', 'ctrl_b', 'targ'), self.size, self.size + n_ops)
+        self._grow(('gate_ops',), self.n_gates, self.n_gates + n_gates)
+
+    def gate_range(self, index):
+        '''
+            Range of operations compiled from a single source gate
+        '''
+        start = int(self.gate_ops[index])
+        stop = int(self.gate_ops[index + 1]) if index + 1 < self.n_gates else self.size
+        return start, stop
+
+    def append_op(self, opcode, ctrl_a=0, ctrl_b=0, targ=0):
+        self.reserve(1)
+        self.opcode[self.size] = opcode
+        self.ctrl_a[self.size] = ctrl_a
+        self.ctrl_b[self.size] = ctrl_b
+        self.targ[self.size] = targ
+        self.size += 1
+
+    def append_columns(self, opcodes, ctrl_a, ctrl_b, targ):
+        '''
+            Appends already resolved X, CNOT and Toffoli operations
+        '''
+        n_ops = len(opcodes)
+        self.reserve(n_ops)
+        for column, values in zip((self.opcode, self.ctrl_a, self.ctrl_b, self.targ), (opcodes, ctrl_a, ctrl_b, targ)):
+            column[self.size:self.size + n_ops] = values
+        self.size += n_ops
+
+    def append_gate(self, gate):
+        '''
+            Resolves a gate's qargs to physical qubits and appends its operations
+            Calls and segments compile to their flattened operations
+            Other gates without an opcode (such as Space) compile to nothing
+        '''
+        self.reserve(0, 1)
+        self.gate_ops[self.n_gates] = self.size
+        self.n_gates += 1
+        self.append_ops(gate)
+
+    def append_ops(self, gate):
+        '''
+            Appends the operations of a gate without starting a new source gate
+        '''
+        opcode = gate.opcode
+        if opcode is None:
+            if hasattr(gate, 'columns'):
+                self.append_columns(*gate.columns())
+            elif hasattr(gate, 'flatten'):
+                for inner in gate.flatten():
+                    self.append_ops(inner)
+            return
+        qubits = [int(i) for i in gate.qargs()]
+        if opcode in THREE_QUBIT_OPS:
+            self.append_op(opcode, qubits[0], qubits[1], qubits[2])
+        elif opcode == OP_CNOT:
+            self.append_op(opcode, qubits[0], 0, qubits[1])
+        elif opcode == OP_X:
+            for targ in qubits:
+                self.append_op(opcode, 0, 0, targ)
+        elif opcode == OP_ALLOC:
+            chunk = gate.qargs.qargs[0] if len(gate.qargs.qargs) == 1 else None
+            self.meta.append(AllocRecord(qubits, gate.initial_value, chunk, name=gate.name))
+            self.append_op(opcode, 0, 0, len(self.meta) - 1)
+        elif opcode == OP_FREE:
+            self.meta.append(FreeRecord(qubits, gate.final_value, gate.assert_cleanup))
+            self.append_op(opcode, 0, 0, len(self.meta) - 1)
+
+    def truncate(self, n_gates):
+        '''
+            Drops every operation compiled from source gates at or after n_gates
+        '''
+        if n_gates >= self.n_gates:
+            return
+        self.size = int(self.gate_ops[n_gates])
+        self.n_gates = n_gates
+        meta_ops = np.isin(self.opcode[:self.size], (OP_ALLOC, OP_FREE))
+        self.meta = self.meta[:int(self.targ[:self.size][meta_ops].max(initial=-1)) + 1]
+
+    def extend(self, gates):
+        for gate in gates:
+            self.append_gate(gate)
+        return self
+
+    def columns(self, start=0, stop=None):
+        '''
+            Views of the populated region of each column
+        '''
+        stop = self.size if stop is None else stop
+        return (self.opcode[start:stop],
+                self.ctrl_a[start:stop],
+                self.ctrl_b[start:stop],
+                self.targ[start:stop])
+
+class Checkpoint():
+    '''
+        Simulated state after a prefix of the compiled circuit
+        :: vec : np.ndarray :: State vector
+        :: n_ops : int :: Number of operations executed
+        :: n_gates : int :: Number of source gates those operations came from
+        :: inputs : frozenset :: Key of the inputs the state was simulated with
+    '''
+    def __init__(self, vec, n_ops, n_gates, inputs):
+        self.vec = vec
+        self.n_ops = n_ops
+        self.n_gates = n_gates
+        self.inputs = inputs
+
+def inputs_key(inputs):
+    '''
+        Hashable key for a set of bound inputs
+    '''
+    return frozenset(
+        (chunk_id, tuple(positions), int(value))
+        for chunk_id, bound in bind_inputs(inputs).items()
+        for positions, value in bound
+    )
+
+def compile_gates(gates):
+    '''
+        Compiles an iterable of gates into a CompiledCircuit
+    '''
+    return CompiledCircuit().extend(gates)
+
+def bind_inputs(inputs):
+    '''
+        Groups runtime operand values by the chunk they are bound to
+        Bound values replace the register's initial value when its Alloc gate executes
+        :: inputs : dict :: Map of register to operand value
+        Returns a map of chunk id to a list of (register positions, value)
+    '''
+    slots = {}
+    for reg, value in (inputs or {}).items():
+        chunk = getattr(reg, 'register', reg)
+        positions = [int(i) for i in getattr(reg, 'indices', range(len(reg)))]
+        slots.setdefault(id(chunk), []).append((positions, value))
+    return slots
+
+def check_bound(program, slots):
+    '''
+        Ensures that every bound register is allocated by the program
+    '''
+    allocated = set(id(record.chunk) for record in program.meta if isinstance(record, AllocRecord))
+    for chunk_id in slots:
+        if chunk_id not in allocated:
+            raise Exception("Input bound to a register that is not allocated in this circuit")
+
+def execute(program, vec, start=0, stop=None, inputs=None):
+    '''
+        Execution kernel for a single basis state
+        Runs directly over the opcode arrays without touching gate objects
+        :: program : CompiledCircuit :: Compiled circuit
+        :: vec : np.ndarray :: State vector, one element per qubit
+        :: start : int :: First operation to execute
+        :: stop : int :: One past the last operation to execute
+        :: inputs : dict :: Map of register to operand value
+    '''
+    slots = bind_inputs(inputs)
+    check_bound(program, slots)
+    state = bytearray(np.asarray(vec, dtype=np.uint8).tobytes())
+    meta = program.meta
+    opcodes, ctrl_a, ctrl_b, targ = (column.tolist() for column in program.columns(start, stop))
+    for op, a, b, t in zip(opcodes, ctrl_a, ctrl_b, targ):
+        if op == OP_TOFFOLI:
+            state[t] ^= state[a] & state[b]
+        elif op == OP_CNOT:
+            state[t] ^= state[a]
+        elif op == OP_X:
+            state[t] ^= 1
+        elif op == OP_AND:
+            assert(state[t] == 0)
+            state[t] = state[a] & state[b]
+        elif op == OP_AND_UNCOMPUTE:
+            # The measurement leaves the target in zero, only the phase is corrected
+            assert(state[t] == state[a] & state[b])
+            state[t] = 0
+        elif op == OP_ALLOC:
+            record = meta[t]
+            for i, val in enumerate(int_to_bin(record.initial_value)):
+                state[record.qubits[i]] ^= val
+            for positions, value in slots.get(id(record.chunk), []):
+                value = int(value)
+                if value >> len(positions):
+                    raise Exception(f"Input {value} does not fit in {len(positions)} qubits")
+                for bit, position in enumerate(positions):
+                    state[record.qubits[position]] = (value >> bit) & 1
+        elif op == OP_FREE:
+            record = meta[t]
+            if record.assert_cleanup:
+                assert(bin_to_int([state[i] for i in record.qubits]) == record.final_value)
+            for i in record.qubits:
+                state[i] = 0
+    return np.frombuffer(bytes(state), dtype=np.uint8).astype(np.int32)
@@ -0,0 +1,124 @@
+import numpy as np
+
+from qmpa.compiler import CompiledCircuit, AllocRecord, FreeRecord
+from qmpa.gates import Gate, X, CNOT, Toffoli, And, AndUncompute, Alloc, Free, OP_X, OP_CNOT, OP_TOFFOLI, OP_ALLOC, OP_FREE, OP_AND, OP_AND_UNCOMPUTE
+from qmpa.virtual_chunk import Physical_QChunk
+
+class GateStore(CompiledCircuit):
+    '''
+        Struct-of-arrays gate container
+        Gates are resolved to physical qubits as they are appended and stored as opcodes
+        Alloc and Free metadata lives in the side table inherited from CompiledCircuit
+        Indexing and iteration produce lightweight gate views for display and adapters
+    '''
+    def __len__(self):
+        return self.n_gates
+
+    def append(self, gate):
+        self.append_gate(gate)
+
+    def __iter__(self):
+        for i in range(self.n_gates):
+            yield self.view(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self.view(i) for i in range(*key.indices(self.n_gates))]
+        if key < 0:
+            key += self.n_gates
+        if key < 0 or key >= self.n_gates:
+            raise IndexError(f"Gate index {key} out of range")
+        return self.view(key)
+
+    def splice(self, template, qubits):
+        '''
+            Appends a template mapped onto physical qubits without building gate objects
+        '''
+        n_gates = template.program.n_gates
+        self.reserve(0, n_gates)
+        self.gate_ops[self.n_gates:self.n_gates + n_gates] = self.size + template.program.gate_ops[:n_gates]
+        self.n_gates += n_gates
+        self.append_columns(*template.resolve(qubits))
+
+    def view(self, index):
+        '''
+            Builds a gate object for a stored gate
+        '''
+        start, stop = self.gate_range(index)
+        if start == stop:
+            return Gate()
+        opcode = int(self.opcode[start])
+        three_qubit = {OP_TOFFOLI: Toffoli, OP_AND: And, OP_AND_UNCOMPUTE: AndUncompute}
+        if opcode in three_qubit:
+            return three_qubit[opcode](
+                Physical_QChunk(int(self.ctrl_a[start])),
+                Physical_QChunk(int(self.ctrl_b[start])),
+                Physical_QChunk(int(self.targ[start]))
+            )
+        if opcode == OP_CNOT:
+            return CNOT(Physical_QChunk(int(self.ctrl_a[start])), Physical_QChunk(int(self.targ[start])))
+        if opcode == OP_X:
+            return X(Physical_QChunk(*self.targ[start:stop]))
+        record = self.meta[int(self.targ[start])]
+        if opcode == OP_ALLOC:
+            return Alloc(Physical_QChunk(*record.qubits), name=record.name, initial_value=record.initial_value)
+        if opcode == OP_FREE:
+            return Free(Physical_QChunk(*record.qubits), final_value=record.final_value, assert_cleanup=record.assert_cleanup)
+        raise Exception(f"Unknown opcode {opcode}")
+
+    def reverse(self, start, permit_rev_alloc=False):
+        '''
+            Reverses the order of the gates from index start onwards
+            Alloc and Free swap places when permit_rev_alloc is set
+        '''
+        if start >= self.n_gates:
+            return
+        op_start = int(self.gate_ops[start])
+        segment = slice(op_start, self.size)
+
+        meta_ops = np.flatnonzero(np.isin(self.opcode[segment], (OP_ALLOC, OP_FREE))) + op_start
+        if len(meta_ops) > 0 and not permit_rev_alloc:
+            raise Exception("Cannot reverse gates, contains Alloc or Free")
+        for op in meta_ops:
+            record = self.meta[self.targ[op]]
+            if self.opcode[op] == OP_ALLOC:
+                self.meta[self.targ[op]] = FreeRecord(record.qubits, record.initial_value, True)
+                self.opcode[op] = OP_FREE
+            else:
+                self.meta[self.targ[op]] = AllocRecord(record.qubits, record.final_value, None)
+                self.opcode[op] = OP_ALLOC
+
+        # Temporary ANDs are inverted by their measurement based uncompute
+        ands = self.opcode[segment] == OP_AND
+        uncomputes = self.opcode[segment] == OP_AND_UNCOMPUTE
+        self.opcode[segment][ands] = OP_AND_UNCOMPUTE
+        self.opcode[segment][uncomputes] = OP_AND
+
+        for column in (self.opcode, self.ctrl_a, self.ctrl_b, self.targ):
+            column[segment] = column[segment][::-1].copy()
+
+        lengths = np.diff(np.append(self.gate_ops[start:self.n_gates], self.size))[::-1]
+        self.gate_ops[start:self.n_gates] = op_start + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+class GateTally():
+    '''
+        Gate container for count-only circuits
+        Gates are counted but never stored, so memory is constant in the gate count
+    '''
+    def __init__(self):
+        self.n_gates = 0
+        self.n_alloc_free = 0 # Alloc and Free gates, used to validate reversals
+
+    def __len__(self):
+        return self.n_gates
+
+    def append(self, gate):
+        self.n_gates += 1
+        if gate.opcode in (OP_ALLOC, OP_FREE):
+            self.n_alloc_free += 1
+
+    def __iter__(self):
+        raise Exception("Count-only circuits do not store gates")
+
+    def __getitem__(self, key):
+        raise Exception("Count-only circuits do not store gates")
@@ -4,7 +4,22 @@ from qmpa.qargs import QArgsGroup
 int_to_bin = lambda x : list(map(int, list(bin(x)[2:])[::-1]))
 bin_to_int = lambda x : int(''.join(map(str, x))[::-1], 2)
 
+# Opcodes used by the compiled circuit representation
+OP_X = 0
+OP_CNOT = 1
+OP_TOFFOLI = 2
+OP_ALLOC = 3
+OP_FREE = 4
+OP_AND = 5
+OP_AND_UNCOMPUTE = 6
+
+# Opcodes acting on two controls and a target
+THREE_QUBIT_OPS = (OP_TOFFOLI, OP_AND, OP_AND_UNCOMPUTE)
+
 class Gate():
+    opcode = None
+    costs = dict(cnot_count=0, toffoli_count=0, non_clifford_count=0)
+
     def __init__(self, *qargs,
                 cnot_count = 0,
                 toffoli_count = 0,
@@ -36,9 +51,17 @@ class Gate():
     
     def __len__(self):
         return len(self.qargs)
+
+    def inverse(self):
+        '''
+            Gate undoing this gate, X, CNOT and Toffoli are self inverse
+        '''
+        return self
     
     
 class X(Gate):
+    opcode = OP_X
+
     def __init__(self, targ):
         super().__init__(
             targ,
@@ -54,12 +77,15 @@ class X(Gate):
         return ['\\targ{}'] * len(self.targ())
     
 class CNOT(Gate):
+    opcode = OP_CNOT
+    costs = dict(cnot_count=1, toffoli_count=0, non_clifford_count=0)
+
     #@constrain('|$1| = 1', '|$2| = 1')
     def __init__(self, ctrl, targ):
         super().__init__(
             ctrl, targ,
-            cnot_count = 1,
-            ident_rep = 2
+            ident_rep = 2,
+            **CNOT.costs
         )
         self.ctrl = self.qargs[0]
         self.targ = self.qargs[1]
@@ -74,15 +100,16 @@ class CNOT(Gate):
                                            
         
 class Toffoli(Gate):
+    opcode = OP_TOFFOLI
+    # Different constructions of this gate will vary with these counts
+    costs = dict(cnot_count=6, toffoli_count=1, non_clifford_count=6)
+
     #@constrain('|$1| = 1', '|$2| = 1', '|$3| = 1')
     def __init__(self, ctrl_a, ctrl_b, targ):
         super().__init__(
             ctrl_a, ctrl_b, targ,
-            # Different constructions of this gate will vary with these counts
-            cnot_count = 6,
-            toffoli_count = 1,
-            non_clifford_count = 6,
-            ident_rep = 2
+            ident_rep = 2,
+            **Toffoli.costs
         )
         self.ctrl_a = self.qargs[0]
         self.ctrl_b = self.qargs[1]
@@ -97,6 +124,66 @@ class Toffoli(Gate):
         vec[self.targ()] ^= vec[self.ctrl_a()] & vec[self.ctrl_b()]
         return vec
 
+class And(Gate):
+    '''
+        Temporary logical AND onto a target known to be zero
+        Costs 4 T gates rather than the 7 of a Toffoli, https://arxiv.org/abs/1709.06648
+    '''
+    opcode = OP_AND
+    costs = dict(cnot_count=3, toffoli_count=1, non_clifford_count=4)
+
+    def __init__(self, ctrl_a, ctrl_b, targ):
+        super().__init__(
+            ctrl_a, ctrl_b, targ,
+            **And.costs
+        )
+        self.ctrl_a = self.qargs[0]
+        self.ctrl_b = self.qargs[1]
+        self.targ = self.qargs[2]
+
+    def representation(self):
+        return ["\\ctrl{{{x}}}".format(x=self.targ()[0] - self.ctrl_a()[0]),
+             "\\ctrl{{{x}}}".format(x=self.targ()[0] - self.ctrl_b()[0]),
+             '\\targ{}']
+
+    def __call__(self, vec):
+        assert(vec[self.targ()][0] == 0)
+        vec[self.targ()] ^= vec[self.ctrl_a()] & vec[self.ctrl_b()]
+        return vec
+
+    def inverse(self):
+        return AndUncompute(self.ctrl_a, self.ctrl_b, self.targ)
+
+class AndUncompute(Gate):
+    '''
+        Uncomputes a temporary logical AND by an X basis measurement and a classically controlled CZ
+        No non Clifford gates, the target is returned to zero
+    '''
+    opcode = OP_AND_UNCOMPUTE
+    costs = dict(cnot_count=1, toffoli_count=0, non_clifford_count=0)
+
+    def __init__(self, ctrl_a, ctrl_b, targ):
+        super().__init__(
+            ctrl_a, ctrl_b, targ,
+            **AndUncompute.costs
+        )
+        self.ctrl_a = self.qargs[0]
+        self.ctrl_b = self.qargs[1]
+        self.targ = self.qargs[2]
+
+    def representation(self):
+        return ["\\ctrl{{{x}}}".format(x=self.targ()[0] - self.ctrl_a()[0]),
+             "\\ctrl{{{x}}}".format(x=self.targ()[0] - self.ctrl_b()[0]),
+             '\\meter{}']
+
+    def __call__(self, vec):
+        assert(vec[self.targ()][0] == vec[self.ctrl_a()][0] & vec[self.ctrl_b()][0])
+        vec[self.targ()] = 0
+        return vec
+
+    def inverse(self):
+        return And(self.ctrl_a, self.ctrl_b, self.targ)
+
 class Space(Gate):
     def __init__(self, *args, **kwargs):
         super().__init__([])
@@ -105,6 +192,8 @@ class Space(Gate):
     
     
 class Alloc(Gate):
+    opcode = OP_ALLOC
+
     def __init__(self, *args, name='', initial_value=0):
         self.initial_value = initial_value
         super().__init__(*args, validate=False)
@@ -116,11 +205,16 @@ class Alloc(Gate):
             vec[self.qargs(i)] ^= val
         return vec
     
+    def inverse(self):
+        return Free(*self.qargs.qargs, final_value=self.initial_value)
+
     def representation(self):
         return ([f"\\lstick[wires={len(self)}]{{$\\ket{{{self.initial_value}}}_{{\\text{{{self.name}}}}}$}} \\setwiretype{{q}}"] 
                 + ([" "] * (len(self) - 1)))
         
 class Free(Gate):
+    opcode = OP_FREE
+
     def __init__(self, *args, final_value=0, assert_cleanup=True):
         self.final_value = final_value
         self.assert_cleanup = assert_cleanup
@@ -132,6 +226,57 @@ class Free(Gate):
         for i in self.qargs:
             vec[i] = 0    
         return vec
+
+    def inverse(self):
+        return Alloc(*self.qargs.qargs, initial_value=self.final_value)
+
     def representation(self):
             return [f"\\trash{{\\ket{{{self.final_value}}}}}\\setwiretype{{n}}"] * len(self)
         
+
+class Segment(Gate):
+    '''
+        Run of gates held by reference and applied forwards or backwards
+        Inverting a segment flips a flag rather than copying or rebuilding its gates
+        :: gates : list :: Gates, which may themselves be segments or calls
+        :: inverse : bool :: Apply the inverse of each gate in reverse order
+    '''
+    def __init__(self, gates, inverse=False):
+        super().__init__(
+            cnot_count=sum(gate.cnot_count for gate in gates),
+            toffoli_count=sum(gate.toffoli_count for gate in gates),
+            non_clifford_count=sum(gate.non_clifford_count for gate in gates),
+            validate=False
+        )
+        self.gates = gates
+        self.inverse_flag = inverse
+        self.n_gates = sum(getattr(gate, 'n_gates', 1) for gate in gates)
+        self.n_alloc_free = sum(getattr(gate, 'n_alloc_free', type(gate) in (Alloc, Free)) for gate in gates)
+
+    def inverse(self):
+        return Segment(self.gates, inverse=not self.inverse_flag)
+
+    def items(self):
+        '''
+            Iterates over the immediate gates of the segment in application order
+        '''
+        if not self.inverse_flag:
+            yield from self.gates
+            return
+        for gate in reversed(self.gates):
+            yield gate.inverse()
+
+    def flatten(self):
+        '''
+            Iterates over the gates of the segment and any nested segments or calls
+        '''
+        for gate in self.items():
+            if hasattr(gate, 'flatten'):
+                yield from gate.flatten()
+            else:
+                yield gate
+
+    def __call__(self, vec):
+        for gate in self.flatten():
+            vec = gate(vec)
+        return vec
@@ -0,0 +1,114 @@
+import heapq
+
+import numpy as np
+
+from qmpa.gates import OP_CNOT, OP_ALLOC, OP_FREE, THREE_QUBIT_OPS
+
+'''
+Post construction qubit reuse
+Every Alloc of a physical qubit starts a new live interval which ends at its Free
+Intervals are recoloured onto as few qubits as possible, which is optimal for interval graphs
+'''
+
+class Layout():
+    '''
+        Result of reallocating a compiled circuit
+        :: mapping : np.ndarray :: Original physical qubit to its qubit at the end of the circuit
+        :: width_before : int :: Number of qubits before reallocation
+        :: width_after : int :: Number of qubits after reallocation
+    '''
+    def __init__(self, mapping, width_before, width_after):
+        self.mapping = mapping
+        self.width_before = width_before
+        self.width_after = width_after
+
+    def __repr__(self):
+        return f"Layout({self.width_before} -> {self.width_after})"
+
+def live_intervals(program):
+    '''
+        Splits the physical qubits of a compiled circuit into live intervals
+        Returns (starts, ends, operands, records, last) where
+            starts, ends :: First and last operation of each interval, ends are program.size if never freed
+            operands :: Interval of the ctrl_a, ctrl_b and targ of each gate operation, -1 where unused
+            records :: Alloc or Free record index to the intervals of its qubits
+            last :: Physical qubit to the last interval that occupied it
+    '''
+    opcodes, ctrl_a, ctrl_b, targ = (column.tolist() for column in program.columns())
+    starts, ends = [], []
+    current = {}
+    last = {}
+    records = {}
+    operands = np.full((3, program.size), -1, dtype=np.int64)
+
+    def interval(q, index):
+        if q not in current:
+            # Qubits used before any Alloc are live from the start
+            current[q] = last[q] = len(starts)
+            starts.append(index)
+            ends.append(program.size)
+        return current[q]
+
+    for index, (op, a, b, t) in enumerate(zip(opcodes, ctrl_a, ctrl_b, targ)):
+        if op == OP_ALLOC:
+            qubits = program.meta[t].qubits
+            if any(q in current for q in qubits):
+                raise Exception("Qubit allocated while live")
+            records[t] = [interval(q, index) for q in qubits]
+        elif op == OP_FREE:
+            records[t] = [interval(q, index) for q in program.meta[t].qubits]
+            for q, i in zip(program.meta[t].qubits, records[t]):
+                ends[i] = index
+                del current[q]
+        else:
+            if op in THREE_QUBIT_OPS:
+                operands[1, index] = interval(b, index)
+            if op == OP_CNOT or op in THREE_QUBIT_OPS:
+                operands[0, index] = interval(a, index)
+            operands[2, index] = interval(t, index)
+    return starts, ends, operands, records, last
+
+def colour(starts, ends):
+    '''
+        Greedy interval colouring in order of start, each interval takes the lowest free colour
+        Intervals are assumed to be sorted by start
+    '''
+    colours = [0] * len(starts)
+    active = [] # Heap of (end, colour)
+    free = [] # Heap of released colours
+    n_colours = 0
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        while active and active[0][0] < start:
+            heapq.heappush(free, heapq.heappop(active)[1])
+        if free:
+            colours[i] = heapq.heappop(free)
+        else:
+            colours[i] = n_colours
+            n_colours += 1
+        heapq.heappush(active, (end, colours[i]))
+    return colours, n_colours
+
+def reallocate(program, width=None):
+    '''
+        Rewrites the qubits of a compiled circuit in place to minimise its width
+        :: program : CompiledCircuit :: Compiled circuit
+        :: width : int :: Width before reallocation, defaults to the largest qubit index used
+        Returns a Layout mapping the original qubits to their qubits at the end of the circuit
+    '''
+    starts, ends, operands, records, last = live_intervals(program)
+    colours, n_colours = colour(starts, ends)
+    colours = np.array(colours + [0], dtype=np.int32) # Unused operands index the trailing 0
+
+    opcodes, ctrl_a, ctrl_b, targ = program.columns()
+    gate_ops = ~np.isin(opcodes, (OP_ALLOC, OP_FREE))
+    for column, row in zip((ctrl_a, ctrl_b, targ), operands):
+        column[gate_ops] = colours[row[gate_ops]]
+    for t, intervals in records.items():
+        program.meta[t].qubits = [int(colours[i]) for i in intervals]
+
+    if width is None:
+        width = max(last.keys(), default=-1) + 1
+    mapping = np.zeros(width, dtype=np.int32)
+    for q, i in last.items():
+        mapping[q] = colours[i]
+    return Layout(mapping, width, n_colours)
@@ -0,0 +1,90 @@
+from qmpa.gate_store import GateStore
+from qmpa.gates import X, CNOT, Toffoli
+
+'''
+Peephole optimisation passes over a built circuit
+'''
+
+def roles(gate):
+    '''
+        Splits a gate's qubits into controls and targets
+        Gates that are not self inverse act as barriers on all of their qubits
+        Returns (controls, targets, key) where key identifies identical gates, or None for barriers
+    '''
+    qubits = [int(i) for i in gate.qargs()]
+    if gate.ident_rep == 2 and type(gate) is Toffoli:
+        controls, targets = tuple(sorted(qubits[:2])), tuple(qubits[2:])
+    elif gate.ident_rep == 2 and type(gate) is CNOT:
+        controls, targets = tuple(qubits[:1]), tuple(qubits[1:])
+    elif gate.ident_rep == 2 and type(gate) is X:
+        controls, targets = (), tuple(qubits)
+    else:
+        return tuple(qubits), tuple(qubits), None
+    if set(controls) & set(targets):
+        return tuple(qubits), tuple(qubits), None
+    return controls, targets, (type(gate), controls, targets)
+
+def last_live(stack, removed):
+    '''
+        Most recent gate on a stack that has not been removed, or -1
+    '''
+    while stack and removed[stack[-1]]:
+        stack.pop()
+    return stack[-1] if stack else -1
+
+def cancel_inverses(circuit):
+    '''
+        Removes pairs of identical self inverse gates that meet after commuting through the gates between them
+        Two gates commute when no qubit is a target of one and a control of the other
+        Each qubit tracks the last gates that targeted and controlled on it, so the pass is linear in the gate count
+        Calls and segments are flattened, the circuit's counts are updated in place
+        :: circuit : Circuit :: Circuit to optimise
+        Returns the number of X, CNOT and Toffoli gates eliminated
+    '''
+    if circuit.mode == 'count':
+        raise Exception("Count-only circuits do not store gates")
+    if circuit.layout is not None:
+        raise Exception("Cannot optimise a circuit after its qubits are reallocated")
+
+    gates = list(circuit.gates())
+    removed = [False] * len(gates)
+    last_targ = {} # Qubit to stack of gates targeting it
+    last_ctrl = {} # Qubit to stack of gates controlling on it
+    candidates = {} # Gate key to stack of matching gates
+
+    for index, gate in enumerate(gates):
+        controls, targets, key = roles(gate)
+        if key is not None:
+            # The most recent gate that the new gate cannot commute past
+            barrier = max(
+                [last_live(last_ctrl.get(q, []), removed) for q in targets]
+                + [last_live(last_targ.get(q, []), removed) for q in controls]
+                + [-1]
+            )
+            match = last_live(candidates.get(key, []), removed)
+            if match > barrier:
+                removed[match] = removed[index] = True
+                continue
+            candidates.setdefault(key, []).append(index)
+        for q in controls:
+            last_ctrl.setdefault(q, []).append(index)
+        for q in targets:
+            last_targ.setdefault(q, []).append(index)
+
+    eliminated = {X: 0, CNOT: 0, Toffoli: 0}
+    kept = []
+    for gate, dropped in zip(gates, removed):
+        if not dropped:
+            kept.append(gate)
+            continue
+        eliminated[type(gate)] += 1
+        circuit.toffoli_count -= gate.toffoli_count
+        circuit.cnot_count -= gate.cnot_count
+        circuit.non_clifford_count -= gate.non_clifford_count
+
+    if isinstance(circuit.circuit, GateStore):
+        circuit.circuit = GateStore().extend(kept)
+    else:
+        circuit.circuit = kept
+    circuit.invalidate()
+    return dict(x=eliminated[X], cnot=eliminated[CNOT], toffoli=eliminated[Toffoli])
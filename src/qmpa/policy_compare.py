@@ -0,0 +1,48 @@
+from qmpa.allocator import POLICIES
+from qmpa.circuit import Circuit
+
+'''
+Comparison harness for allocation policies
+Builds the same arithmetic under each policy and reports the allocator statistics
+'''
+
+ALLOCATORS = POLICIES + ('indexed',)
+
+def build(op, n_a, n_b, allocator, mode='count', **kwargs):
+    '''
+        Builds a single arithmetic operation on fresh registers
+        :: op : str :: Name of the Circuit method, such as 'multiply' or 'divide'
+        :: n_a : int :: Size of the first operand
+        :: n_b : int :: Size of the second operand
+        :: allocator : str :: Allocator passed to Circuit
+    '''
+    c = Circuit(mode=mode, allocator=allocator)
+    reg_a = c.register(n_a, 'A')
+    reg_b = c.register(n_b, 'B')
+    getattr(c, op)(reg_a, reg_b, **kwargs)
+    return c
+
+def compare_policies(op, n_a, n_b, allocators=ALLOCATORS, **kwargs):
+    '''
+        Allocator statistics for an operation under each allocator
+        Circuits are built in count mode so large sizes are cheap
+        Returns a list of stats dicts, one per allocator
+    '''
+    rows = []
+    for allocator in allocators:
+        c = build(op, n_a, n_b, allocator, **kwargs)
+        rows.append(dict(op=op, n_a=n_a, n_b=n_b, allocator=allocator, **c.allocator.stats()))
+    return rows
+
+def format_table(rows, columns=('op', 'n_a', 'n_b', 'allocator', 'max_mem', 'peak_live_mem', 'fragmentation')):
+    lines = ['\t'.join(columns)]
+    for row in rows:
+        lines.append('\t'.join(f"{row[column]:.3f}" if isinstance(row[column], float) else str(row[column]) for column in columns))
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    rows = []
+    for n in (8, 32, 128):
+        rows += compare_policies('multiply', n, n)
+        rows += compare_policies('divide', 2 * n, n)
+    print(format_table(rows))
@@ -0,0 +1,130 @@
+import csv
+import io
+import json
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+'''
+Opt-in allocator instrumentation
+Records every allocation and free with the gate index it happened at and the operation that made it
+so the qubits live at the peak width of a circuit can be attributed to the registers holding them
+'''
+
+FIELDS = ('kind', 'gate', 'chunk', 'name', 'size', 'start', 'operation')
+
+# kind is one of alloc, free, free_start or free_end, the latter two being partial frees of size qubits
+AllocEvent = namedtuple('AllocEvent', FIELDS)
+
+class AllocProfiler():
+    '''
+        Event log attached to a QAllocator as its profiler
+        :: clock : function :: Returns the current gate index, defaults to the number of events
+    '''
+    def __init__(self, clock=None):
+        self.clock = clock if clock is not None else (lambda: len(self.events))
+        self.events = []
+        self.operations = [] # Stack of enclosing operation names
+        self.serials = {} # Live chunk to its serial number
+        self.n_chunks = 0
+
+    def __len__(self):
+        return len(self.events)
+
+    @contextmanager
+    def operation(self, name):
+        '''
+            Attributes events inside the block to name, nested operations are joined with /
+        '''
+        self.operations.append(name)
+        try:
+            yield self
+        finally:
+            self.operations.pop()
+
+    def record(self, kind, chunk, size):
+        if kind == 'alloc':
+            self.serials[chunk] = self.n_chunks
+            self.n_chunks += 1
+        serial = self.serials.pop(chunk) if kind == 'free' else self.serials.get(chunk, -1)
+        self.events.append(AllocEvent(
+            kind,
+            self.clock(),
+            serial,
+            chunk.name,
+            size,
+            chunk.start,
+            '/'.join(self.operations)
+        ))
+
+    def replay(self):
+        '''
+            Steps through the events, yielding each event with the live chunks after it
+            Live chunks map serial number to [name, size, operation]
+        '''
+        live = {}
+        for event in self.events:
+            if event.kind == 'alloc':
+                live[event.chunk] = [event.name, event.size, event.operation]
+            elif event.kind == 'free':
+                live.pop(event.chunk, None)
+            elif event.chunk in live:
+                live[event.chunk][1] -= event.size
+            yield event, live
+
+    def curve(self):
+        '''
+            Live width over the gate index
+            Returns arrays of the gate index and the number of live qubits after each event
+        '''
+        gates = np.array([event.gate for event in self.events], dtype=np.int64)
+        deltas = np.array([event.size if event.kind == 'alloc' else -event.size for event in self.events], dtype=np.int64)
+        return gates, np.cumsum(deltas)
+
+    def peak(self):
+        '''
+            Live chunks when the live width first reaches its maximum
+            Returns (width, gate index, list of (name, size, operation) sorted by size)
+        '''
+        width, gate, chunks = 0, 0, []
+        current = 0
+        for event, live in self.replay():
+            current += event.size if event.kind == 'alloc' else -event.size
+            if current > width:
+                width, gate = current, event.gate
+                chunks = [tuple(entry) for entry in live.values()]
+        return width, gate, sorted(chunks, key=lambda entry: -entry[1])
+
+    def to_csv(self, path=None):
+        '''
+            Events as CSV, written to path if one is given
+        '''
+        stream = io.StringIO()
+        writer = csv.writer(stream, lineterminator='\n')
+        writer.writerow(FIELDS)
+        writer.writerows(self.events)
+        if path is not None:
+            with open(path, 'w', newline='') as f:
+                f.write(stream.getvalue())
+        return stream.getvalue()
+
+    def to_json(self, path=None):
+        '''
+            Events, live width curve and peak as JSON, written to path if one is given
+        '''
+        gates, widths = self.curve()
+        width, gate, chunks = self.peak()
+        report = json.dumps(dict(
+            events=[event._asdict() for event in self.events],
+            curve=dict(gate=gates.tolist(), width=widths.tolist()),
+            peak=dict(
+                width=width,
+                gate=gate,
+                chunks=[dict(name=name, size=size, operation=operation) for name, size, operation in chunks]
+            )
+        ))
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(report)
+        return report
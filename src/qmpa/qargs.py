@@ -37,3 +37,10 @@ class QArgsGroup():
     
     def idx(self, *indices, name=None):
         return QArgsGroup(*[self.qargs[i] for i in indices], name=name)   
+
+def join(*regs):
+    '''
+        Joins registers into a single register of their qubits in order
+        Used to zero extend an operand with ancillae held in a different register
+    '''
+    return QArgsGroup(*[reg[i] for reg in regs for i in range(len(reg))])
@@ -0,0 +1,186 @@
+from collections import namedtuple
+
+from qmpa.gates import CNOT, Toffoli, And
+
+'''
+Closed form resource model for the arithmetic macros in Circuit
+Each function mirrors the Circuit method of the same name and evaluates in O(1)
+    toffoli, cnot, non_clifford :: Counts as reported by Circuit.counts()
+    qubits :: High water mark of a circuit holding only the operands and this operation
+    depth :: ASAP depth of the X, CNOT and Toffoli gates, Alloc and Free take no time
+    gates :: Number of gates emitted, as reported by Circuit.circuit_len()
+'''
+
+Resources = namedtuple('Resources', ['toffoli', 'cnot', 'non_clifford', 'qubits', 'depth', 'gates'])
+
+# The CNOT counts, depth and gates of the modular macros depend on the bits of their constants
+ModularResources = namedtuple('ModularResources', ['toffoli', 'non_clifford', 'qubits'])
+
+def tally(n_toffoli, n_cnot, qubits, depth, gates):
+    '''
+        Converts raw gate numbers to the counts tracked by Circuit
+        :: n_toffoli : int :: Number of Toffoli gates
+        :: n_cnot : int :: Number of CNOT gates
+    '''
+    return Resources(
+        n_toffoli * Toffoli.costs['toffoli_count'] + n_cnot * CNOT.costs['toffoli_count'],
+        n_toffoli * Toffoli.costs['cnot_count'] + n_cnot * CNOT.costs['cnot_count'],
+        n_toffoli * Toffoli.costs['non_clifford_count'] + n_cnot * CNOT.costs['non_clifford_count'],
+        qubits,
+        depth,
+        gates
+    )
+
+def triangle(n : int) -> int:
+    '''
+        Sum of 0 .. n - 1
+    '''
+    return n * (n - 1) // 2
+
+def add(n_a : int, n_b : int = None, carry : bool = True, reg_carry : bool = False) -> Resources:
+    '''
+        Cuccaro ripple carry adder
+        :: n_a : int :: Size of reg_a
+        :: n_b : int :: Size of reg_b, defaults to n_a + 1 with a carry out and n_a without
+        :: carry : bool :: Whether the carry out is written
+        :: reg_carry : bool :: Whether the carry ancilla is supplied by the caller
+    '''
+    carry = int(bool(carry))
+    if n_b is None:
+        n_b = n_a + carry
+    ancillae = 0 if reg_carry else 1
+    return tally(
+        2 * n_a,
+        4 * n_a + carry,
+        n_a + n_b + ancillae,
+        5 * n_a + 1 + carry,
+        6 * n_a + carry + 2 * ancillae
+    )
+
+def subtract(n_a : int, n_b : int = None, carry : bool = True, reg_carry : bool = False) -> Resources:
+    '''
+        Reversed Cuccaro adder, identical costs to add
+    '''
+    return add(n_a, n_b, carry=carry, reg_carry=reg_carry)
+
+def multiply(n_a : int, n_b : int, precision : int = None) -> Resources:
+    '''
+        Shift and add multiplier with the optional precision pass
+        :: n_a : int :: Size of reg_a
+        :: n_b : int :: Size of reg_b
+        :: precision : int :: Precision argument of Circuit.multiply, 1 <= precision <= n_b + 2
+    '''
+    # Row i adds an n_a + n_b - i bit copy into the target
+    row_lengths = n_a * (n_a + n_b) - triangle(n_a)
+    n_toffoli = 2 * n_a * n_b + 2 * row_lengths
+    n_cnot = 4 * row_lengths + n_a
+    gates = 5 + 2 * n_a * n_b + 6 * row_lengths + n_a
+    depth = 6 * n_b + 7 + (n_a - 1) * (13 + 5 * n_b) + 5 * triangle(n_a - 1)
+
+    if precision is not None:
+        if precision < 1 or precision > n_b + 2:
+            raise Exception(f"Precision {precision} outside of 1 .. {n_b + 2}")
+
+        # Rows at and above n_a + 2 - precision copy a truncated reg_b and drop the carry out
+        n_partial = min(max(precision - 2, 0), n_a)
+        n_full = n_a - n_partial
+        copy_size = n_full * n_b + n_partial * (n_b + 2 - precision) + triangle(n_partial)
+
+        n_toffoli += 2 * copy_size + 2 * row_lengths
+        n_cnot += 4 * row_lengths + n_full
+        gates += 2 * copy_size + 6 * row_lengths + n_full
+
+        # Rows are sequential, each costs 5L + 3 layers apart from the first row
+        # which overlaps with the end of the multiply, and one extra layer
+        # when a full row follows a truncated row
+        # An empty first copy lets the first row start inside the last multiply row
+        first_copy = n_b if n_partial == 0 else n_b + 2 - precision
+        first_row = 5 * (n_b + 1) + first_copy + 1 + int(n_partial == 0)
+        if first_copy == 0:
+            first_row = 5 * (n_b + 1) + 2 - n_b - int(n_a > 1)
+        depth += 5 * row_lengths + 3 * n_a - (5 * (n_b + 1) + 3) + first_row + int(0 < n_partial < n_a)
+
+    return tally(n_toffoli, n_cnot, 3 * (n_a + n_b) + 2, depth, gates)
+
+def divide(n_a : int, n_b : int) -> Resources:
+    '''
+        Restoring long division
+        :: n_a : int :: Size of the dividend register
+        :: n_b : int :: Size of the divisor register
+    '''
+    # One step per quotient bit, every step after the first brings down a bit with an n_b + i bit adder
+    steps = n_a - n_b + 1
+    shift_lengths = (steps - 1) * n_b + triangle(steps)
+    n_toffoli = 2 * shift_lengths + 6 * n_b * steps
+    n_cnot = n_b + 3 * (steps - 1) + 4 * shift_lengths + steps * (8 * n_b + 3)
+    gates = 6 + n_b + 3 * (steps - 1) + 6 * shift_lengths + steps * (14 * n_b + 4)
+    depth = 11 * n_b + 6 + (steps - 1) * (15 * n_b + 13) + 5 * triangle(steps - 1)
+    return tally(n_toffoli, n_cnot, 5 * n_a + 4, depth, gates)
+
+def modular(n_toffoli : int, n_and : int, qubits : int) -> ModularResources:
+    '''
+        Converts raw gate numbers of a modular macro to the counts tracked by Circuit
+        :: n_toffoli : int :: Number of Toffoli gates
+        :: n_and : int :: Number of temporary logical ANDs, their uncomputes are free
+    '''
+    return ModularResources(
+        n_toffoli * Toffoli.costs['toffoli_count'] + n_and * And.costs['toffoli_count'],
+        n_toffoli * Toffoli.costs['non_clifford_count'] + n_and * And.costs['non_clifford_count'],
+        qubits
+    )
+
+def lookup_ands(n : int, n_address : int, window : int) -> int:
+    '''
+        Logical ANDs of the table lookups in one pass of Circuit.mul_mod_accumulate
+        Each window is looked up twice, unary iteration over w + n_address address bits costs 2 ** (w + n_address) - 2 ANDs
+        :: n : int :: Size of the multiplicand
+        :: n_address : int :: Size of the register selecting the factor
+    '''
+    n_full, remainder = divmod(n, window)
+    total = 2 * n_full * ((1 << (window + n_address)) - 2)
+    if remainder:
+        total += 2 * ((1 << (remainder + n_address)) - 2)
+    return total
+
+def add_mod(n : int) -> ModularResources:
+    '''
+        Modular adder on the Cuccaro adder, three n bit additions and a carry only comparison
+        :: n : int :: Size of both operands
+    '''
+    return modular(8 * n, 0, 3 * n + 3)
+
+def mul_mod(n_a : int, n : int) -> ModularResources:
+    '''
+        Quantum by quantum modular multiplier, a modular doubling, two controlled copies and a modular addition per bit of reg_a
+        :: n_a : int :: Size of reg_a
+        :: n : int :: Size of reg_b and the target
+    '''
+    return modular(14 * n * n_a, 0, n_a + 4 * n + 4)
+
+def mul_mod_const(n : int, window : int = 1, in_place : bool = False) -> ModularResources:
+    '''
+        Windowed multiplication by a classical constant, the in place form runs two passes
+        :: n : int :: Size of the register
+        :: window : int :: Multiplicand bits per table lookup
+    '''
+    passes = 2 if in_place else 1
+    n_windows = -(-n // window)
+    return modular(
+        passes * n_windows * 8 * n,
+        passes * lookup_ands(n, 0, window),
+        max(4 * n + 3, 3 * n + window - 1)
+    )
+
+def exp_mod(n_e : int, n : int, window_exp : int = 1, window_mul : int = 1) -> ModularResources:
+    '''
+        Windowed modular exponentiation, two multiplication passes per exponent window
+        :: n_e : int :: Size of the exponent
+        :: n : int :: Bit length of the modulus
+    '''
+    n_windows = -(-n // window_mul)
+    n_full, remainder = divmod(n_e, window_exp)
+    n_toffoli = 2 * -(-n_e // window_exp) * n_windows * 8 * n
+    n_and = 2 * n_full * lookup_ands(n, window_exp, window_mul)
+    if remainder:
+        n_and += 2 * lookup_ands(n, remainder, window_mul)
+    return modular(n_toffoli, n_and, n_e + max(4 * n + 3, 3 * n + window_mul + window_exp - 1))
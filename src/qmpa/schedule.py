@@ -0,0 +1,109 @@
+import numpy as np
+
+from qmpa.gates import OP_X, OP_CNOT, OP_TOFFOLI, OP_AND, THREE_QUBIT_OPS
+
+'''
+As soon as possible layering of compiled circuits
+Each operation is placed one layer after the latest layer of any qubit it acts on
+Alloc and Free take no time and are not placed in a layer
+'''
+
+def op_qubits(op, a, b, t):
+    '''
+        Qubits an X, CNOT, Toffoli or logical AND operation acts on, empty for Alloc and Free
+    '''
+    if op in THREE_QUBIT_OPS:
+        return (a, b, t)
+    if op == OP_CNOT:
+        return (a, t)
+    if op == OP_X:
+        return (t,)
+    return ()
+
+def asap(columns, ready):
+    '''
+        As soon as possible layering of X, CNOT and Toffoli operations
+        :: columns : tuple :: Opcode, ctrl_a, ctrl_b and targ columns
+        :: ready : np.ndarray :: Layer after which each qubit is free, updated in place
+        Returns the layer of each operation
+    '''
+    opcodes, ctrl_a, ctrl_b, targ = (column.tolist() for column in columns)
+    layers = []
+    for op, a, b, t in zip(opcodes, ctrl_a, ctrl_b, targ):
+        qubits = op_qubits(op, a, b, t)
+        layer = max([ready[q] for q in qubits], default=0) + 1
+        for q in qubits:
+            ready[q] = layer
+        layers.append(layer)
+    return layers
+
+class Schedule():
+    '''
+        Layering of a compiled circuit, extended incrementally as the circuit grows
+        :: n_qubits : int :: Number of qubits in the circuit
+        layer : np.ndarray :: Layer of each operation, starting from 1, 0 for Alloc and Free
+        toffoli_layer : np.ndarray :: Number of Toffoli gates on the longest path ending at each operation
+    '''
+    def __init__(self, n_qubits=0):
+        self.ready = [0] * n_qubits
+        self.toffoli_ready = [0] * n_qubits
+        self.layer = np.zeros(0, dtype=np.int64)
+        self.toffoli_layer = np.zeros(0, dtype=np.int64)
+        self.depth = 0
+        self.toffoli_depth = 0
+
+    def __len__(self):
+        return len(self.layer)
+
+    def extend(self, program):
+        '''
+            Schedules the operations of program that have not yet been scheduled
+            :: program : CompiledCircuit :: Compiled circuit, of which this schedule covers a prefix
+        '''
+        start = len(self.layer)
+        if start >= program.size:
+            return self
+        opcodes, ctrl_a, ctrl_b, targ = (column.tolist() for column in program.columns(start))
+        n_qubits = max([len(self.ready), 1 + max(ctrl_a + ctrl_b + targ)])
+        ready = self.ready + [0] * (n_qubits - len(self.ready))
+        toffoli_ready = self.toffoli_ready + [0] * (n_qubits - len(self.toffoli_ready))
+
+        layers = [0] * len(opcodes)
+        toffoli_layers = [0] * len(opcodes)
+        for i, (op, a, b, t) in enumerate(zip(opcodes, ctrl_a, ctrl_b, targ)):
+            if op in THREE_QUBIT_OPS:
+                layer = max(ready[a], ready[b], ready[t]) + 1
+                ready[a] = ready[b] = ready[t] = layer
+                # The measurement based uncompute of a logical AND has no Toffoli cost
+                toffoli_layer = max(toffoli_ready[a], toffoli_ready[b], toffoli_ready[t]) + (op in (OP_TOFFOLI, OP_AND))
+                toffoli_ready[a] = toffoli_ready[b] = toffoli_ready[t] = toffoli_layer
+            elif op == OP_CNOT:
+                layer = max(ready[a], ready[t]) + 1
+                ready[a] = ready[t] = layer
+                toffoli_layer = max(toffoli_ready[a], toffoli_ready[t])
+                toffoli_ready[a] = toffoli_ready[t] = toffoli_layer
+            elif op == OP_X:
+                layer = ready[t] + 1
+                ready[t] = layer
+                toffoli_layer = toffoli_ready[t]
+            else:
+                continue
+            layers[i] = layer
+            toffoli_layers[i] = toffoli_layer
+
+        self.ready = ready
+        self.toffoli_ready = toffoli_ready
+        self.layer = np.concatenate((self.layer, np.array(layers, dtype=np.int64)))
+        self.toffoli_layer = np.concatenate((self.toffoli_layer, np.array(toffoli_layers, dtype=np.int64)))
+        self.depth = max(ready, default=0)
+        self.toffoli_depth = max(toffoli_ready, default=0)
+        return self
+
+    def layers(self):
+        '''
+            Operation indices of each layer in order
+            Returns a list of depth arrays, operations within a layer act on disjoint qubits
+        '''
+        order = np.argsort(self.layer, kind='stable')
+        bounds = np.searchsorted(self.layer[order], np.arange(1, self.depth + 2))
+        return [order[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
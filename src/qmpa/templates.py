@@ -0,0 +1,217 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from qmpa.compiler import CompiledCircuit
+from qmpa.gates import Gate, X, CNOT, Toffoli, And, AndUncompute, OP_X, OP_CNOT, OP_TOFFOLI, OP_AND, OP_AND_UNCOMPUTE, THREE_QUBIT_OPS
+from qmpa.schedule import op_qubits
+
+'''
+Memoised gate patterns for repeated subroutines
+A template stores the operations of a subroutine over qubit positions relative to its operands
+so a later call with operands of the same shape is spliced in by remapping those positions
+'''
+
+NO_PATH = -(1 << 40) # Path length between qubits the pattern does not connect
+
+class Template():
+    '''
+        Gate pattern over relative qubit indices
+        :: program : CompiledCircuit :: Recorded operations, unused control slots hold -1
+        :: counts : tuple :: Toffoli, CNOT and non Clifford counts of the pattern
+    '''
+    def __init__(self, program, counts):
+        self.program = program
+        self.counts = counts
+
+    def __len__(self):
+        return self.program.n_gates
+
+    @staticmethod
+    def record(gates, qubits, counts):
+        '''
+            Builds a template from gates acting only on the operand qubits
+            :: gates : iterable :: Gates to record, or a CompiledCircuit segment
+            :: qubits : np.ndarray :: Physical qubits of the operands in order
+            Returns None if the gates cannot be expressed as a template
+        '''
+        program = gates if isinstance(gates, CompiledCircuit) else CompiledCircuit().extend(gates)
+        opcodes, ctrl_a, ctrl_b, targ = program.columns()
+        if not np.isin(opcodes, (OP_X, OP_CNOT) + THREE_QUBIT_OPS).all() or program.size != program.n_gates:
+            return None
+
+        # Map each physical qubit to its first position in the operands
+        size = max([int(qubits.max(initial=-1))] + [int(column.max(initial=-1)) for column in (ctrl_a, ctrl_b, targ)]) + 1
+        relative = np.full(size, -1, dtype=np.int32)
+        relative[qubits[::-1]] = np.arange(len(qubits) - 1, -1, -1, dtype=np.int32)
+
+        rel_a = np.where(opcodes != OP_X, relative[ctrl_a], -1)
+        rel_b = np.where(np.isin(opcodes, THREE_QUBIT_OPS), relative[ctrl_b], -1)
+        rel_t = relative[targ]
+        if (rel_t < 0).any() or (rel_a[opcodes != OP_X] < 0).any() or (rel_b[np.isin(opcodes, THREE_QUBIT_OPS)] < 0).any():
+            return None
+
+        pattern = CompiledCircuit(capacity=max(program.size, 1))
+        pattern.size = pattern.n_gates = program.size
+        pattern.opcode[:program.size] = opcodes
+        pattern.ctrl_a[:program.size] = rel_a
+        pattern.ctrl_b[:program.size] = rel_b
+        pattern.targ[:program.size] = rel_t
+        pattern.gate_ops[:program.size] = np.arange(program.size)
+        return Template(pattern, counts)
+
+    def paths(self):
+        '''
+            Longest paths through the pattern in the max plus algebra
+            paths[q, p] is the number of layers from the entry of relative qubit p to the exit of q, NO_PATH if none
+            Qubits the pattern does not touch pass straight through with a path of 0 to themselves
+        '''
+        if getattr(self, '_paths', None) is None:
+            columns = [column.tolist() for column in self.program.columns()]
+            n_qubits = max([max(column, default=-1) for column in columns[1:]]) + 1
+            paths = np.full((n_qubits, n_qubits), NO_PATH, dtype=np.int64)
+            np.fill_diagonal(paths, 0)
+            for op, a, b, t in zip(*columns):
+                qubits = list(op_qubits(op, a, b, t))
+                paths[qubits] = paths[qubits].max(axis=0) + 1
+            self._paths = np.maximum(paths, NO_PATH)
+        return self._paths
+
+    def resolve(self, qubits):
+        '''
+            Maps the pattern onto physical qubits
+            Returns the opcode, ctrl_a, ctrl_b and targ columns
+        '''
+        opcodes, ctrl_a, ctrl_b, targ = self.program.columns()
+        qubits = np.asarray(qubits, dtype=np.int32)
+        return (opcodes,
+                np.where(ctrl_a >= 0, qubits[ctrl_a], 0),
+                np.where(ctrl_b >= 0, qubits[ctrl_b], 0),
+                qubits[targ])
+
+    def gates(self, views):
+        '''
+            Rebuilds gate objects over single qubit views of the operands
+            :: views : list :: One single qubit register per relative index
+        '''
+        opcodes, ctrl_a, ctrl_b, targ = (column.tolist() for column in self.program.columns())
+        for op, a, b, t in zip(opcodes, ctrl_a, ctrl_b, targ):
+            if op == OP_TOFFOLI:
+                yield Toffoli(views[a], views[b], views[t])
+            elif op == OP_AND:
+                yield And(views[a], views[b], views[t])
+            elif op == OP_AND_UNCOMPUTE:
+                yield AndUncompute(views[a], views[b], views[t])
+            elif op == OP_CNOT:
+                yield CNOT(views[a], views[t])
+            else:
+                yield X(views[t])
+
+class Call(Gate):
+    '''
+        Invocation of a shared template over operand registers
+        Stands in for the template's gates and is only flattened when compiled or exported
+        :: template : Template :: Shared gate pattern
+        :: operands : tuple :: Registers the pattern is relative to
+        :: inverse : bool :: Apply the pattern in reverse order
+    '''
+    def __init__(self, template, operands, inverse=False):
+        toffoli_count, cnot_count, non_clifford_count = template.counts
+        super().__init__(
+            *operands,
+            cnot_count=cnot_count,
+            toffoli_count=toffoli_count,
+            non_clifford_count=non_clifford_count,
+            validate=False
+        )
+        self.template = template
+        self.operands = operands
+        self.inverse_flag = inverse
+        self.n_gates = len(template)
+
+    def qubits(self):
+        return np.concatenate([np.asarray(reg(), dtype=np.int32) for reg in self.operands])
+
+    def inverse(self):
+        return Call(self.template, self.operands, inverse=not self.inverse_flag)
+
+    def columns(self):
+        '''
+            Flattened operations over physical qubits
+        '''
+        columns = self.template.resolve(self.qubits())
+        if self.inverse_flag:
+            opcodes, ctrl_a, ctrl_b, targ = columns
+            # Logical ANDs and their uncomputes are each other's inverse
+            opcodes = np.where(opcodes == OP_AND, OP_AND_UNCOMPUTE,
+                np.where(opcodes == OP_AND_UNCOMPUTE, OP_AND, opcodes)).astype(opcodes.dtype)
+            columns = tuple(column[::-1] for column in (opcodes, ctrl_a, ctrl_b, targ))
+        return columns
+
+    def flatten(self):
+        '''
+            Flattened gates over single qubit views of the operands
+        '''
+        views = [reg[i] for reg in self.operands for i in range(len(reg))]
+        gates = list(self.template.gates(views))
+        return [gate.inverse() for gate in gates[::-1]] if self.inverse_flag else gates
+
+    def schedule(self, ready):
+        '''
+            Layers the pattern after the layers in ready, updated in place
+            Each qubit leaves after the latest of its inputs plus the longest path from it,
+            which is the as soon as possible depth of the flattened gates
+        '''
+        paths = self.template.paths()
+        if self.inverse_flag:
+            # Reversing the pattern reverses every path
+            paths = paths.T
+        qubits = self.qubits()[:len(paths)]
+        layers = (paths + ready[qubits][np.newaxis, :]).max(axis=1)
+        touched = np.diagonal(paths) > 0
+        ready[qubits[touched]] = layers[touched]
+
+    def __call__(self, vec):
+        for gate in self.flatten():
+            vec = gate(vec)
+        return vec
+
+class TemplateCache():
+    '''
+        LRU cache of templates keyed by operation, operand sizes and flags
+        :: maxsize : int :: Number of templates kept before the least recently used is evicted
+    '''
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.templates = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.templates)
+
+    def __contains__(self, key):
+        return key in self.templates
+
+    def get(self, key):
+        template = self.templates.get(key)
+        if template is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.templates.move_to_end(key)
+        return template
+
+    def put(self, key, template):
+        self.templates[key] = template
+        self.templates.move_to_end(key)
+        while len(self.templates) > self.maxsize:
+            self.templates.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.templates.clear()
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions, size=len(self.templates))
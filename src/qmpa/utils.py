@@ -3,8 +3,7 @@ def hamming_weight(val : int) -> int:
         Calculates the hamming weight of the value
         :: val : int :: Value to take the hamming weight of
     '''
-    count = 0
-    while val > 0:
-        val &= val - 1
-        count += 1
-    return count
+    if val <= 0:
+        return 0
+    # Linear in the bit length of the value rather than its weight, for wide constants
+    return bin(val).count('1')
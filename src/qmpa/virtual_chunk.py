@@ -63,3 +63,31 @@ class Virtual_QChunk():
     
     def virt(self):
         return self
+
+class Physical_QChunk():
+    '''
+        Register over already resolved physical qubits
+        Used to build lightweight gate views from compiled circuits
+    '''
+    def __init__(self, *qubits, name=None):
+        self.qubits = np.array(qubits, dtype=np.int32)
+        self.size = len(self.qubits)
+        self.name = name
+        self.anc_chunk = None
+
+    def __getitem__(self, key):
+        return Physical_QChunk(*np.atleast_1d(self.qubits[key]), name=self.name)
+
+    def __call__(self, *indices):
+        if len(indices) == 0:
+            return self.qubits
+        return self.qubits[list(indices)]
+
+    def __repr__(self):
+        return f"[{self.name}]:{self.qubits}"
+
+    def __len__(self):
+        return self.size
+
+    def virt(self):
+        return self
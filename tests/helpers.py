@@ -0,0 +1,11 @@
+from qmpa.gates import Toffoli
+
+'''
+Shared helpers for the arithmetic tests
+'''
+
+def n_toffoli(c):
+    '''
+        Number of Toffoli gates in the flattened circuit, logical ANDs are not included
+    '''
+    return sum(type(gate) is Toffoli for gate in c.gates())
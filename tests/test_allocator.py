@@ -0,0 +1,136 @@
+import pytest
+import numpy as np
+
+from qmpa.allocator import QAllocator, IndexedQAllocator
+from qmpa.circuit import Circuit
+from qmpa.policy_compare import ALLOCATORS, build, compare_policies
+
+n_qubits = 6
+n_tests = 20
+
+def check_layout(allocator):
+    '''
+        Chunks are address ordered, disjoint and their gaps match the free space index
+    '''
+    chunks = allocator.chunks
+    for prev_chunk, chunk in zip(chunks, chunks[1:]):
+        assert chunk.prev_chunk is prev_chunk and prev_chunk.next_chunk is chunk
+        assert prev_chunk.end + prev_chunk.trailing_free == chunk.start
+    assert chunks[-1].end + chunks[-1].trailing_free == allocator.max_mem
+    assert allocator.starts == [chunk.start for chunk in chunks]
+    assert allocator.extents == sorted((chunk.trailing_free, chunk.end) for chunk in chunks if chunk.trailing_free > 0)
+
+def test_indexed_random():
+    np.random.seed(0)
+    allocator = IndexedQAllocator()
+    live = []
+    for _ in range(2000):
+        if live and np.random.rand() < 0.45:
+            chunk = live.pop(np.random.randint(len(live)))
+            action = np.random.randint(3)
+            if action == 0 or chunk.size < 2:
+                chunk.free()
+                continue
+            if action == 1:
+                allocator.partial_free_start(chunk, 1)
+            else:
+                allocator.partial_free_end(chunk, 1)
+            live.append(chunk)
+        else:
+            live.append(allocator.alloc(np.random.randint(1, 9)))
+        check_layout(allocator)
+
+    for chunk in live:
+        for i in range(chunk.start, chunk.end):
+            assert allocator.qubit_allocated(i)
+    assert sum(allocator.qubit_allocated(i) for i in range(allocator.max_mem)) == sum(len(chunk) for chunk in live)
+
+    with pytest.raises(Exception):
+        allocator.free(allocator.chunks[0])
+    chunk = live[0]
+    chunk.free()
+    with pytest.raises(Exception):
+        chunk.free()
+
+def test_indexed_best_fit():
+    allocator = IndexedQAllocator()
+    a = allocator.alloc(4)
+    allocator.alloc(1)
+    c = allocator.alloc(2)
+    allocator.alloc(1)
+    a.free()
+    c.free()
+    # First fit would split the larger hole
+    assert allocator.alloc(2).start == 5
+    assert allocator.alloc(3).start == 0
+    assert allocator.max_mem == 8
+
+def test_indexed_circuit():
+    for _ in range(n_tests):
+        x = np.random.randint(1, 2 ** n_qubits)
+        y = np.random.randint(1, 2 ** (n_qubits // 2))
+        c = Circuit(allocator='indexed')
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits // 2, 'B', y)
+        r_r, r_q = c.divide(r_a, r_b)
+        r, q = c.readout(r_r, r_q)
+        assert r + q * y == x
+
+        reference = Circuit()
+        r_a = reference.register(n_qubits, 'A', x)
+        r_b = reference.register(n_qubits // 2, 'B', y)
+        reference.divide(r_a, r_b)
+        assert c.allocator.max_mem == reference.allocator.max_mem
+
+def test_policies():
+    allocator = QAllocator(policy='buddy')
+    a = allocator.alloc(3)
+    b = allocator.alloc(2)
+    assert (a.start, b.start, allocator.max_mem) == (0, 4, 6)
+    a.free()
+    assert allocator.alloc(1).start == 0
+    assert allocator.alloc(3).start == 8
+
+    allocator = QAllocator(policy='stack')
+    a = allocator.alloc(3)
+    b = allocator.alloc(2)
+    a.free()
+    assert allocator.alloc(1).start == 5
+    assert allocator.stats()['fragmentation'] == 0
+
+    allocator = QAllocator(policy='next_fit')
+    chunks = [allocator.alloc(2) for _ in range(4)]
+    chunks[2].free()
+    assert allocator.alloc(1).start == 4
+    chunks[0].free()
+    # Continues after the last allocation before wrapping around
+    assert allocator.alloc(1).start == 5
+    assert allocator.alloc(1).start == 0
+
+    allocator = QAllocator()
+    chunks = [allocator.alloc(2) for _ in range(4)]
+    chunks[0].free()
+    chunks[2].free()
+    assert allocator.fragmentation() == 0.5
+    assert (allocator.live_mem, allocator.peak_live_mem) == (4, 8)
+
+    with pytest.raises(Exception):
+        QAllocator(policy='worst_fit')
+
+@pytest.mark.parametrize('allocator', ALLOCATORS)
+def test_policy_arithmetic(allocator):
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+        c = build('multiply', n_qubits, n_qubits, allocator, mode='build')
+        r_a, r_b = [gate.qargs.qargs[0] for gate in c.circuit[:2]]
+        assert x * y == c.readout(c.circuit[2].qargs.qargs[0], inputs={r_a: x, r_b: y})[0]
+
+def test_compare_policies():
+    rows = compare_policies('divide', 2 * n_qubits, n_qubits)
+    assert [row['allocator'] for row in rows] == list(ALLOCATORS)
+    widths = {row['allocator']: row['max_mem'] for row in rows}
+    assert widths['buddy'] >= widths['first_fit'] == widths['best_fit'] == widths['stack']
+    assert all(row['peak_live_mem'] <= row['max_mem'] for row in rows)
+
+if __name__ == '__main__':
+    pytest.main()
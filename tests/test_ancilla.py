@@ -0,0 +1,91 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+from qmpa.gates import Alloc, Free, CNOT
+
+n_qubits = 6
+n_tests = 50
+
+def test_scope_order():
+    c = Circuit()
+    with c.ancillas(a=2, b=(3, None)) as anc:
+        assert len(anc.a) == 2 and len(anc['b']) == 3
+        c.cnot(anc.a[0], anc.b[0])
+        c.cnot(anc.a[0], anc.b[0])
+    gates = list(c.gates())
+    assert [type(gate) for gate in gates] == [Alloc, Alloc, CNOT, CNOT, Free, Free]
+    # Freed in reverse order of allocation
+    assert gates[4].qargs.qargs[0] is anc.b
+    assert gates[5].qargs.qargs[0] is anc.a
+    c.simulate()
+
+def test_scope_passthrough():
+    c = Circuit()
+    reg = c.register(2, 'reg')
+    with c.ancillas(carry=(1, None), reg=(2, reg)) as anc:
+        assert anc.reg is reg
+    assert sum(isinstance(gate, Free) for gate in c.gates()) == 1
+    assert c.allocator.live_mem == 2
+
+def test_scope_label():
+    c = Circuit()
+    with c.ancillas(cpy=(2, None, 'MULCPY'), carry=1) as anc:
+        assert anc.cpy.name == 'MULCPY' and anc.carry.name == 'carry'
+    assert c.allocator.live_mem == 0
+
+    # Multiply and divide keep the chunk names of their copy and carry registers
+    c = Circuit()
+    profiler = c.profile()
+    r_a = c.register(4, 'A')
+    r_b = c.register(2, 'B')
+    c.multiply(r_a, r_b)
+    c.divide(r_a, r_b)
+    names = {event.name for event in profiler.events if event.kind == 'alloc'}
+    assert {'MULCPY', 'DIVANC', 'Carry'} <= names
+
+def test_anc_register():
+    c = Circuit()
+    reg = c.register(2, 'reg')
+    assert c.anc_register(2, reg=reg) is reg
+    anc = c.anc_register(3, name='scratch')
+    assert anc.name == 'scratch' and c.allocator.live_mem == 5
+    c.cnot(reg[0], anc[0])
+    c.cnot(reg[0], anc[0])
+    c.anc_free(anc)
+    c.anc_free(reg)
+    assert c.allocator.live_mem == 2
+    assert [type(gate) for gate in c.gates()][-1] is Free
+    c.simulate()
+
+def test_scope_dirty():
+    c = Circuit()
+    with c.ancillas(a=1) as anc:
+        c.X(anc.a)
+    with pytest.raises(AssertionError):
+        c.simulate()
+
+def test_scope_exception():
+    c = Circuit()
+    with pytest.raises(ValueError):
+        with c.ancillas(a=1):
+            raise ValueError()
+    # Nothing is freed on the failed path
+    assert not any(isinstance(gate, Free) for gate in c.gates())
+
+def test_scope_arithmetic():
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+        c = Circuit()
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits, 'B', y)
+        r_d = c.multiply(r_a, r_b)
+        r_b2 = c.register(n_qubits + 1, 'B2', y)
+        c.add(r_a, r_b2)
+        assert c.readout(r_d)[0] == x * y
+        assert c.readout(r_b2)[0] == x + y
+        # Only the output registers and inputs stay allocated
+        assert c.allocator.live_mem == 2 * n_qubits + (2 * n_qubits + 1) + n_qubits + 1
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,85 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+
+n_qubits = 10
+n_tests = 1000
+
+def test_batch_addition():
+    x, y = np.random.randint(2 ** n_qubits, size=(2, n_tests))
+
+    c = Circuit()
+    r_a = c.register(n_qubits, 'A')
+    r_b = c.register(n_qubits + 1, 'B')
+    c.add(r_a, r_b)
+
+    out_a, out_b = c.run_batch({r_a: x, r_b: y}, outputs=[r_a, r_b])
+    assert (out_a == x).all()
+    assert (out_b == x + y).all()
+
+def test_batch_initial_value():
+    n = 5
+    y = np.random.randint(2 ** n, size=n_tests)
+
+    c = Circuit()
+    r_a = c.register(n, 'A', 3)
+    r_b = c.register(n, 'B')
+    r_d = c.multiply(r_a, r_b)
+
+    out, = c.run_batch({r_b: y}, outputs=[r_d])
+    assert (out == 3 * y).all()
+
+def test_batch_matches_readout():
+    n = 5
+    x, y = np.random.randint(2 ** n, size=(2, 50))
+
+    c = Circuit()
+    r_a = c.register(n, 'A')
+    r_b = c.register(n, 'B')
+    r_d = c.multiply(r_a, r_b)
+
+    out, = c.run_batch({r_a: x, r_b: y}, outputs=[r_d])
+    for i, j, d in zip(x, y, out):
+        assert d == c.readout(r_d, inputs={r_a: i, r_b: j})[0]
+
+def test_batch_input_range():
+    c = Circuit()
+    r_a = c.register(4, 'A')
+    r_b = c.register(5, 'B')
+    c.add(r_a, r_b)
+    for x in ([20, 3], [3, -1]):
+        with pytest.raises(Exception):
+            c.run_batch({r_a: x, r_b: [3, 3]})
+    with pytest.raises(Exception):
+        c.run_batch({r_a: [3, 3], r_b: [3, 2 ** 70]})
+    out, = c.run_batch({r_a: [15, 0], r_b: [15, 0]}, outputs=[r_b])
+    assert list(out) == [30, 0]
+
+def test_batch_wide_multiply():
+    n = 40
+    x = [int(i) for i in np.random.randint(2 ** 31, size=100)]
+    y = [int(i) << 9 for i in np.random.randint(2 ** 31, size=100)]
+
+    c = Circuit()
+    r_a = c.register(n, 'A')
+    r_b = c.register(n, 'B')
+    r_d = c.multiply(r_a, r_b)
+
+    out, = c.run_batch({r_a: x, r_b: y}, outputs=[r_d])
+    assert all(int(d) == i * j for d, i, j in zip(out, x, y))
+
+def test_batch_division():
+    x = np.random.randint(1, 2 ** n_qubits, size=n_tests)
+    y = np.random.randint(1, 2 ** (n_qubits // 2), size=n_tests)
+
+    c = Circuit()
+    reg_a = c.register(n_qubits, 'A')
+    reg_b = c.register(n_qubits // 2, 'B')
+    reg_r, reg_q = c.divide(reg_a, reg_b)
+
+    out_r, out_q = c.run_batch({reg_a: x, reg_b: y}, outputs=[reg_r, reg_q])
+    assert (out_r + out_q * y == x).all()
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,105 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+from qmpa.gates import And
+
+from helpers import n_toffoli
+
+n_tests = 200
+
+@pytest.mark.parametrize('method, adder', [('ripple', 'cuccaro'), ('ripple', 'gidney'), ('lookahead', 'cuccaro')])
+@pytest.mark.parametrize('n_a, n_b', [(1, 1), (8, 8), (5, 9), (11, 3)])
+def test_compare(method, adder, n_a, n_b):
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_a), np.random.randint(2 ** n_b)
+
+        c = Circuit()
+        r_a = c.register(n_a, 'A', x)
+        r_b = c.register(n_b, 'B', y)
+        flag = c.compare(r_a, r_b, method=method, adder=adder)
+
+        assert c.readout(flag)[0] == int(x < y)
+        assert c.readout(r_a)[0] == x
+        assert c.readout(r_b)[0] == y
+        assert c.allocator.live_mem == n_a + n_b + 1
+
+def test_compare_const_lookahead():
+    for _ in range(n_tests):
+        x = np.random.randint(2 ** 8)
+        value = np.random.randint(-2, 2 ** 8 + 2)
+
+        c = Circuit()
+        r_a = c.register(8, 'A', x)
+        flag = c.compare_const(r_a, value, method='lookahead')
+        assert c.readout(flag)[0] == int(x < value)
+        assert c.readout(r_a)[0] == x
+
+def test_compare_costs():
+    for n in (4, 16, 64):
+        # Against a subtract and restore into a sign bit
+        c = Circuit()
+        r_a = c.register(n, 'A')
+        r_b = c.register(n, 'B')
+        c.compare(r_a, r_b)
+        assert n_toffoli(c) == 2 * n
+        assert c.allocator.max_mem == 2 * n + 2
+
+        # One logical AND per carry, erased by measurement
+        c = Circuit()
+        r_a = c.register(n, 'A')
+        r_b = c.register(n, 'B')
+        c.compare(r_a, r_b, adder='gidney')
+        assert sum(type(gate) is And for gate in c.gates()) == n
+        assert c.counts()[0] == n
+
+        c = Circuit()
+        r_a = c.register(n, 'A')
+        r_b = c.register(n, 'B')
+        c.compare(r_a, r_b, method='lookahead')
+        assert c.toffoli_depth() <= 4 * (n.bit_length() - 1) + 4
+        if n >= 16:
+            assert c.toffoli_depth() < 2 * n
+
+    c = Circuit()
+    r_a = c.register(4, 'A')
+    with pytest.raises(Exception):
+        c.compare(r_a, r_a, method='subtract')
+
+@pytest.mark.parametrize('method', ['ripple', 'lookahead'])
+@pytest.mark.parametrize('adder', ['cuccaro', 'gidney'])
+def test_divide_compare(method, adder):
+    n_a, n_b = 8, 4
+    for _ in range(20):
+        x, y = np.random.randint(2 ** n_a), np.random.randint(2 ** (n_b - 1), 2 ** n_b)
+
+        c = Circuit()
+        r_a = c.register(n_a, 'A', x)
+        r_b = c.register(n_b, 'B', y)
+        r_r, r_q = c.divide_compare(r_a, r_b, method=method, adder=adder)
+
+        assert c.readout(r_q)[0] == x // y
+        assert c.readout(r_r)[0] == x % y
+        assert c.readout(r_a)[0] == x
+        assert c.readout(r_b)[0] == y
+
+def test_divide_compare_costs():
+    def build(divide):
+        c = Circuit()
+        r_a = c.register(16, 'A')
+        r_b = c.register(8, 'B')
+        divide(c)(r_a, r_b)
+        return c
+    restoring = build(lambda c: c.divide)
+    compared = build(lambda c: c.divide_compare)
+    assert compared.counts()[0] < restoring.counts()[0]
+
+    # The Gidney divider compares with logical ANDs too, only the controlled copies use Toffolis
+    gidney = build(lambda c: lambda r_a, r_b: c.divide_compare(r_a, r_b, adder='gidney'))
+    steps = 16 - 8 + 1
+    assert n_toffoli(gidney) == steps * 2 * 8
+    assert sum(type(gate) is And for gate in gidney.gates()) == steps * (2 * 8 + 1)
+    assert gidney.counts()[0] < compared.counts()[0]
+
+if __name__ == '__main__':
+    pytest.main()
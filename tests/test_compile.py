@@ -0,0 +1,61 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+from qmpa.gates import CNOT, OP_TOFFOLI, OP_CNOT
+
+n_qubits = 6
+n_tests = 100
+
+def interpret(c):
+    vec = np.zeros(c.allocator.max_mem, dtype=np.int32)
+    for gate in c.circuit:
+        vec = gate(vec)
+    return vec
+
+def test_compiled_columns():
+    c = Circuit()
+    r_a = c.register(n_qubits, 'A', 5)
+    r_b = c.register(n_qubits + 1, 'B', 7)
+    c.add(r_a, r_b)
+
+    program = c.compile()
+    opcodes, ctrl_a, ctrl_b, targ = program.columns()
+    assert opcodes.dtype == np.int8
+    assert ctrl_a.dtype == ctrl_b.dtype == targ.dtype == np.int32
+    assert (opcodes == OP_TOFFOLI).sum() == c.toffoli_count
+    assert (opcodes == OP_CNOT).sum() == sum(type(gate) is CNOT for gate in c.circuit)
+    assert program.n_gates == c.circuit_len()
+
+def test_compiled_matches_gates():
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+
+        c = Circuit()
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits, 'B', y)
+        r_d = c.multiply(r_a, r_b)
+
+        assert (c() == interpret(c)).all()
+        assert x * y == c.readout(r_d)[0]
+
+def test_compile_incremental():
+    x, y = np.random.randint(2 ** (n_qubits - 1), size=(2))
+
+    c = Circuit()
+    r_a = c.register(n_qubits, 'A', x)
+    r_b = c.register(n_qubits + 2, 'B', y)
+    c.add(r_a, r_b[:n_qubits + 1])
+    assert x + y == c.readout(r_b)[0]
+
+    program = c.compile()
+    c.add(r_a, r_b[:n_qubits + 1])
+    assert c.compile() is program
+    assert 2 * x + y == c.readout(r_b)[0]
+
+    c.subtract(r_a, r_b[:n_qubits + 1])
+    assert x + y == c.readout(r_b)[0]
+    assert (c() == interpret(c)).all()
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,80 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit, naf
+
+from helpers import n_toffoli
+
+n_qubits = 8
+n_tests = 200
+
+def test_naf():
+    for value in range(1000):
+        digits = naf(value)
+        assert sum(d * 2 ** i for i, d in enumerate(digits)) == value
+        assert all(not (a and b) for a, b in zip(digits, digits[1:]))
+
+def test_add_const():
+    for _ in range(n_tests):
+        x = np.random.randint(2 ** n_qubits)
+        value = np.random.randint(-2 ** n_qubits, 2 ** n_qubits)
+
+        c = Circuit()
+        r_a = c.register(n_qubits, 'A', x)
+        c.add_const(r_a, value)
+        assert c.readout(r_a)[0] == (x + value) % 2 ** n_qubits
+
+        c.sub_const(r_a, value)
+        assert c.readout(r_a)[0] == x
+
+def test_mul_const():
+    for _ in range(n_tests):
+        x, value = np.random.randint(2 ** n_qubits, size=(2))
+
+        c = Circuit()
+        r_a = c.register(n_qubits, 'A', x)
+        r_d = c.mul_const(r_a, value)
+        assert c.readout(r_d)[0] == x * value
+        assert c.readout(r_a)[0] == x
+
+def test_compare_const():
+    for _ in range(n_tests):
+        x = np.random.randint(2 ** n_qubits)
+        value = np.random.randint(-2, 2 ** n_qubits + 2)
+
+        c = Circuit()
+        r_a = c.register(n_qubits, 'A', x)
+        flag = c.compare_const(r_a, value)
+        assert c.readout(flag)[0] == int(x < value)
+        assert c.readout(r_a)[0] == x
+
+def test_const_costs():
+    # Against loading the constant into a register and running the quantum quantum macros
+    value = 0b10110110
+    c = Circuit()
+    r_a = c.register(n_qubits + 1, 'A')
+    c.add_const(r_a, value)
+    generic = Circuit()
+    r_a = generic.register(n_qubits + 1, 'A')
+    r_b = generic.register(n_qubits, 'B', value)
+    generic.add(r_b, r_a)
+    assert n_toffoli(c) == 2 * (n_qubits + 1 - 1 - 2)
+    assert n_toffoli(c) < n_toffoli(generic)
+    assert c.allocator.max_mem < generic.allocator.max_mem
+
+    c = Circuit()
+    r_a = c.register(n_qubits, 'A')
+    c.mul_const(r_a, 0b11101111)
+    generic = Circuit()
+    r_a = generic.register(n_qubits, 'A')
+    r_b = generic.register(n_qubits, 'B', 0b11101111)
+    generic.multiply(r_b, r_a)
+    assert n_toffoli(c) < n_toffoli(generic) // 2
+
+    c = Circuit()
+    r_a = c.register(n_qubits, 'A')
+    c.compare_const(r_a, 100)
+    assert n_toffoli(c) <= 2 * (n_qubits - 1)
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,57 @@
+import pytest
+
+from qmpa.circuit import Circuit
+
+def resources(c):
+    return c.counts(), c.circuit_len(), c.allocator.max_mem
+
+def build(mode, op, n_a, n_b, **kwargs):
+    c = Circuit(mode=mode)
+    r_a = c.register(n_a, 'A')
+    r_b = c.register(n_b, 'B')
+    getattr(c, op)(r_a, r_b, **kwargs)
+    return c
+
+@pytest.mark.parametrize('n', [1, 2, 5, 8])
+def test_count_adders(n):
+    for op in ('add', 'subtract'):
+        assert resources(build('build', op, n, n + 1)) == resources(build('count', op, n, n + 1))
+    assert resources(build('build', 'add', n, n, carry=False)) == resources(build('count', 'add', n, n, carry=False))
+    assert resources(build('build', 'add_draper', n, n)) == resources(build('count', 'add_draper', n, n))
+
+@pytest.mark.parametrize('n', [2, 4, 6])
+def test_count_multiply(n):
+    assert resources(build('build', 'multiply', n, n)) == resources(build('count', 'multiply', n, n))
+    for precision in range(1, n + 1):
+        built = build('build', 'multiply', n, n, precision=precision)
+        counted = build('count', 'multiply', n, n, precision=precision)
+        assert resources(built) == resources(counted)
+
+@pytest.mark.parametrize('n_a, n_b', [(4, 2), (6, 3), (8, 8)])
+def test_count_divide(n_a, n_b):
+    assert resources(build('build', 'divide', n_a, n_b)) == resources(build('count', 'divide', n_a, n_b))
+    nonrestoring = build('build', 'divide_nonrestoring', n_a, n_b)
+    assert resources(nonrestoring) == resources(build('count', 'divide_nonrestoring', n_a, n_b))
+
+def test_count_reverse():
+    c = Circuit(mode='count')
+    reg_carry = c.register(1, 'carry')
+    r_a = c.register(4, 'A')
+    r_b = c.register(5, 'B')
+    with pytest.raises(Exception):
+        c.reverse(c.add, r_a, r_b)
+    c.reverse(c.add, r_a, r_b, reg_carry=reg_carry)
+
+def test_count_cannot_simulate():
+    c = build('count', 'add', 4, 5)
+    with pytest.raises(Exception):
+        c.readout()
+
+def test_count_large():
+    n = 512
+    c = build('count', 'multiply', n, n)
+    # Two n bit controlled copies and a 2n - i bit adder per row
+    assert c.counts()[0] == 5 * n ** 2 + n
+
+if __name__ == '__main__':
+    pytest.main()
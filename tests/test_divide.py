@@ -2,6 +2,7 @@ import pytest
 import numpy as np
 
 from qmpa.circuit import Circuit
+from qmpa.gates import Toffoli
 
 n_qubits = 10
 n_tests = 1000
@@ -26,5 +27,75 @@ def test_division():
 
         assert (c.readout(reg_r)[0] + c.readout(reg_q)[0] * y == x)
 
+def test_division_bound_inputs():
+    # Construct once, bind operands at execution
+    c = Circuit()
+    reg_a = c.register(n_qubits, 'A')
+    reg_b = c.register(n_qubits // 2, 'B')
+    reg_r, reg_q = c.divide(reg_a, reg_b)
+
+    for i in range(n_tests):
+        x = np.random.randint(1, 2 ** n_qubits)
+        y = np.random.randint(1, 2 ** (n_qubits // 2))
+        r, q = c.readout(reg_r, reg_q, inputs={reg_a: x, reg_b: y})
+        assert (r + q * y == x)
+
+    # Divisors with their top bit set give the exact quotient and remainder
+    for i in range(n_tests):
+        x = np.random.randint(1, 2 ** n_qubits)
+        y = np.random.randint(2 ** (n_qubits // 2 - 1), 2 ** (n_qubits // 2))
+        r, q = c.readout(reg_r, reg_q, inputs={reg_a: x, reg_b: y})
+        assert (q == x // y)
+        assert (r == x % y)
+
+def test_division_nonrestoring():
+    for _ in range(n_tests // 10):
+        x, y = np.random.randint(1, 2 ** n_qubits, size=(2))
+        x, y = max(x, y), min(x, y)
+        c = Circuit()
+
+        x_len = int(np.floor(np.log2(x)) + 1)
+        y_len = int(np.floor(np.log2(y)) + 1)
+
+        reg_a = c.register(x_len, 'A', x)
+        reg_b = c.register(y_len, 'B', y)
+        reg_r, reg_q = c.divide_nonrestoring(reg_a, reg_b)
+
+        assert (c.readout(reg_r)[0] == x % y)
+        assert (c.readout(reg_q)[0] == x // y)
+
+def test_division_nonrestoring_bound_inputs():
+    c = Circuit()
+    reg_a = c.register(n_qubits, 'A')
+    reg_b = c.register(n_qubits // 2, 'B')
+    reg_r, reg_q = c.divide_nonrestoring(reg_a, reg_b)
+    quotient = Circuit()
+    reg_a_q = quotient.register(n_qubits, 'A')
+    reg_b_q = quotient.register(n_qubits // 2, 'B')
+    _, reg_q_q = quotient.divide_nonrestoring(reg_a_q, reg_b_q, remainder=False)
+
+    for i in range(n_tests // 10):
+        # The quotient register only holds x // y when the top bit of the divisor is set
+        x = np.random.randint(1, 2 ** n_qubits)
+        y = np.random.randint(2 ** (n_qubits // 2 - 1), 2 ** (n_qubits // 2))
+        r, q = c.readout(reg_r, reg_q, inputs={reg_a: x, reg_b: y})
+        assert (q == x // y)
+        assert (r == x % y)
+        assert (quotient.readout(reg_q_q, inputs={reg_a_q: x, reg_b_q: y})[0] == q)
+
+def test_division_nonrestoring_counts():
+    def n_toffoli(method, n_a, n_b):
+        c = Circuit()
+        reg_a = c.register(n_a, 'A')
+        reg_b = c.register(n_b, 'B')
+        getattr(c, method)(reg_a, reg_b)
+        return sum(type(gate) is Toffoli for gate in c.gates()), c.allocator.max_mem
+
+    for n_a, n_b in [(8, 4), (16, 8), (24, 12)]:
+        restoring, restoring_width = n_toffoli('divide', n_a, n_b)
+        nonrestoring, nonrestoring_width = n_toffoli('divide_nonrestoring', n_a, n_b)
+        assert nonrestoring < 0.6 * restoring
+        assert nonrestoring_width < restoring_width
+
 if __name__ == '__main__':
     pytest.main()
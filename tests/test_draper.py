@@ -0,0 +1,90 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+from qmpa.utils import hamming_weight
+
+from helpers import n_toffoli
+
+n_qubits = 10
+n_tests = 200
+
+def log2(n):
+    return max(n.bit_length() - 1, 0)
+
+def test_draper_out_of_place():
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+
+        c = Circuit()
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits, 'B', y)
+        r_s = c.add_draper(r_a, r_b)
+
+        assert(x + y == c.readout(r_s)[0])
+        assert(x == c.readout(r_a)[0])
+        assert(y == c.readout(r_b)[0])
+
+def test_draper_in_place():
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+
+        c = Circuit()
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits + 1, 'B', y)
+        c.add_draper(r_a, r_b, in_place=True)
+
+        assert(x + y == c.readout(r_b)[0])
+        assert(x == c.readout(r_a)[0])
+
+@pytest.mark.parametrize('n', range(1, 18))
+def test_draper_no_carry(n):
+    for _ in range(10):
+        x, y = np.random.randint(2 ** n, size=(2))
+
+        c = Circuit()
+        r_a = c.register(n, 'A', x)
+        r_b = c.register(n, 'B', y)
+        r_s = c.add_draper(r_a, r_b, carry=False)
+        c.add_draper(r_a, r_b, carry=False, in_place=True)
+
+        assert((x + y) % 2 ** n == c.readout(r_s)[0])
+        assert((x + y) % 2 ** n == c.readout(r_b)[0])
+
+@pytest.mark.parametrize('n', range(2, 33))
+def test_draper_counts(n):
+    # Toffoli counts of the out of place and in place adders in the paper
+    c = Circuit()
+    r_a = c.register(n, 'A')
+    r_b = c.register(n, 'B')
+    c.add_draper(r_a, r_b)
+    assert n_toffoli(c) == 5 * n - 3 * hamming_weight(n) - 3 * log2(n) - 1
+    assert c.allocator.max_mem == 3 * n + 1 + n - hamming_weight(n) - log2(n)
+
+    c = Circuit()
+    r_a = c.register(n, 'A')
+    r_b = c.register(n + 1, 'B')
+    c.add_draper(r_a, r_b, in_place=True)
+    assert n_toffoli(c) == (10 * n - 3 * hamming_weight(n) - 3 * hamming_weight(n - 1)
+                            - 3 * log2(n) - 3 * log2(n - 1) - 7)
+
+def test_draper_carry_argument():
+    # The ripple carry adders' carry register is still accepted and left untouched
+    c = Circuit()
+    r_a = c.register(4, 'A', 9)
+    r_b = c.register(4, 'B', 12)
+    r_c = c.register(1, 'C')
+    r_s = c.add_draper(r_a, r_b, reg_carry=r_c)
+    assert c.readout(r_s, r_c) == [21, 0]
+
+def test_draper_depth():
+    # Logarithmic against the linear depth of the ripple carry adder
+    for n in (16, 64):
+        c = Circuit()
+        r_a = c.register(n, 'A')
+        r_b = c.register(n, 'B')
+        c.add_draper(r_a, r_b)
+        assert c.toffoli_depth() <= 2 * log2(n) + 3
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,88 @@
+import pytest
+
+from qmpa.circuit import Circuit
+
+'''
+Every arithmetic entry point is built in each gate store and in count mode
+The stores must emit the same gates and simulate to the same state, count mode must report the same resources
+Ancillae are checked clean when freed, so simulating each entry point also checks that it uncomputes them
+'''
+
+def karatsuba(c):
+    c.multiply(c.register(11, 'A', 1234), c.register(9, 'B', 300), method='karatsuba', cutoff=3)
+
+def constants(c):
+    r_a = c.register(10, 'A', 678)
+    c.add_const(r_a, 345)
+    c.mul_const(r_a, 77)
+    c.compare_const(r_a, 500)
+
+def gidney(c):
+    r_a = c.register(10, 'A', 700)
+    r_b = c.register(6, 'B', 37)
+    r_c = c.register(7, 'C', 5)
+    c.add_gidney(r_b, r_c)
+    c.subtract_gidney(r_b, r_c)
+    c.multiply(r_a, r_b, adder='gidney')
+    c.multiply(r_a, r_b, method='karatsuba', cutoff=3, adder='gidney')
+    c.divide(r_a, r_b, adder='gidney')
+    c.divide_nonrestoring(r_a, r_b, adder='gidney')
+
+def modular(c, adder='cuccaro'):
+    r_e = c.register(5, 'E', 21)
+    c.exp_mod(r_e, 3, 29, window_exp=2, window_mul=2, adder=adder)
+    r_a = c.register(5, 'A', 11)
+    r_b = c.register(5, 'B', 7)
+    c.mul_mod(r_a, r_b, 29, adder=adder)
+    c.sub_mod(r_a, r_b, 29, adder=adder)
+
+def square(c):
+    r_a = c.register(9, 'A', 347)
+    c.square(r_a)
+    c.square(r_a, precision=5)
+    c.square(r_a, adder='gidney')
+
+def compare(c):
+    r_a = c.register(10, 'A', 600)
+    r_b = c.register(7, 'B', 100)
+    for method in ('ripple', 'lookahead'):
+        c.compare(r_a, r_b, method=method)
+        c.compare(r_b, r_a, method=method, adder='gidney')
+        c.compare_const(r_a, 300, method=method)
+        c.divide_compare(r_a, r_b, method=method)
+    c.divide_compare(r_a, r_b, adder='gidney')
+
+ENTRY_POINTS = {
+    'karatsuba': karatsuba,
+    'constants': constants,
+    'gidney': gidney,
+    'modular': modular,
+    'modular_gidney': lambda c: modular(c, adder='gidney'),
+    'square': square,
+    'compare': compare,
+}
+
+def resources(c):
+    return c.counts(), c.circuit_len(), c.allocator.max_mem
+
+def build(entry, store='list', mode='build'):
+    c = Circuit(store=store, mode=mode)
+    ENTRY_POINTS[entry](c)
+    return c
+
+@pytest.mark.parametrize('entry', ENTRY_POINTS)
+def test_count_mode(entry):
+    assert resources(build(entry)) == resources(build(entry, mode='count'))
+
+@pytest.mark.parametrize('store', ['columnar', 'hierarchical'])
+@pytest.mark.parametrize('entry', ENTRY_POINTS)
+def test_stores(entry, store):
+    flat = build(entry)
+    c = build(entry, store=store)
+    assert resources(c) == resources(flat)
+    assert [type(gate) for gate in c.gates()] == [type(gate) for gate in flat.gates()]
+    assert (c() == flat()).all()
+    assert c.depth() == flat.depth()
+
+if __name__ == '__main__':
+    pytest.main()
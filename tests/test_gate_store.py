@@ -0,0 +1,73 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+from qmpa.gate_store import GateStore
+from qmpa.gates import X, CNOT, Toffoli, Alloc, Free
+
+n_qubits = 6
+n_tests = 50
+
+def build_multiply(store, x, y):
+    c = Circuit(store=store)
+    r_a = c.register(n_qubits, 'A', x)
+    r_b = c.register(n_qubits, 'B', y)
+    r_d = c.multiply(r_a, r_b)
+    return c, r_d
+
+def test_columnar_multiply():
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+        c, r_d = build_multiply('columnar', x, y)
+        assert isinstance(c.circuit, GateStore)
+        assert x * y == c.readout(r_d)[0]
+
+def test_columnar_matches_list():
+    x, y = np.random.randint(2 ** n_qubits, size=(2))
+    c_list, _ = build_multiply('list', x, y)
+    c_store, _ = build_multiply('columnar', x, y)
+
+    assert c_list.circuit_len() == c_store.circuit_len()
+    assert c_list.counts() == c_store.counts()
+    assert (c_list() == c_store()).all()
+    for gate_list, gate_store in zip(c_list.circuit, c_store.circuit):
+        assert type(gate_list) is type(gate_store)
+        assert (gate_list.qargs() == gate_store.qargs()).all()
+    assert str(c_list) == str(c_store)
+
+def test_columnar_views():
+    c = Circuit(store='columnar')
+    r_a = c.register(3, 'A', 5)
+    c.X(r_a[0])
+    c.cnot(r_a[0], r_a[1])
+    c.toffoli(r_a[0], r_a[1], r_a[2])
+    c.free(r_a, final_value=6)
+
+    assert [type(gate) for gate in c.circuit] == [Alloc, X, CNOT, Toffoli, Free]
+    assert type(c.circuit[-1]) is Free
+    assert len(c.circuit[1:3]) == 2
+    assert list(c.circuit[3].qargs()) == list(r_a())
+
+def test_columnar_subtract():
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+
+        c = Circuit(store='columnar')
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits + 1, 'B', y)
+        c.subtract(r_a, r_b)
+        assert (y - x) % (2 ** r_b.size) == c.readout(r_b)[0]
+
+def test_columnar_division():
+    c = Circuit(store='columnar')
+    reg_a = c.register(n_qubits, 'A')
+    reg_b = c.register(n_qubits // 2, 'B')
+    reg_r, reg_q = c.divide(reg_a, reg_b)
+
+    x = np.random.randint(1, 2 ** n_qubits, size=n_tests)
+    y = np.random.randint(1, 2 ** (n_qubits // 2), size=n_tests)
+    out_r, out_q = c.run_batch({reg_a: x, reg_b: y}, outputs=[reg_r, reg_q])
+    assert (out_r + out_q * y == x).all()
+
+if __name__ == '__main__':
+    pytest.main()
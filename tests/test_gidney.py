@@ -0,0 +1,134 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+from qmpa.gates import And, AndUncompute, Toffoli
+
+n_qubits = 8
+n_tests = 100
+
+def build_add(x, y, n, carry=True, subtract=False):
+    c = Circuit()
+    r_a = c.register(n, 'A', x)
+    r_b = c.register(n + int(carry), 'B', y)
+    op = c.subtract_gidney if subtract else c.add_gidney
+    op(r_a, r_b, carry=carry)
+    return c, r_a, r_b
+
+@pytest.mark.parametrize('n', range(1, 10))
+def test_gidney(n):
+    for _ in range(10):
+        x, y = np.random.randint(2 ** n, size=(2))
+        for carry in (True, False):
+            c, r_a, r_b = build_add(x, y, n, carry)
+            assert c.readout(r_b)[0] == (x + y) % 2 ** (n + carry)
+            assert c.readout(r_a)[0] == x
+            assert c.allocator.live_mem == 2 * n + carry
+
+def test_subtract_gidney():
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+        c, r_a, r_b = build_add(x, y, n_qubits, subtract=True)
+        assert c.readout(r_b)[0] == (y - x) % 2 ** (n_qubits + 1)
+        assert c.readout(r_a)[0] == x
+
+@pytest.mark.parametrize('n', range(1, 12))
+def test_gidney_counts(n):
+    # 4 T gates per carry against 6 non Clifford gates for each of the 2n Toffolis of the Cuccaro adder
+    for carry in (True, False):
+        c, _, _ = build_add(0, 0, n, carry)
+        assert sum(type(gate) is And for gate in c.gates()) == n - 1 + carry
+        assert sum(type(gate) is AndUncompute for gate in c.gates()) == n - 1 + carry
+        assert sum(type(gate) is Toffoli for gate in c.gates()) == 0
+        assert c.counts()[2] == 4 * (n - 1 + carry)
+
+        cuccaro = Circuit()
+        r_a = cuccaro.register(n, 'A')
+        r_b = cuccaro.register(n + carry, 'B')
+        cuccaro.add(r_a, r_b, carry=carry)
+        assert cuccaro.counts()[2] == 12 * n
+
+def test_gidney_dirty_and():
+    c = Circuit()
+    r_a = c.register(2, 'A', 3)
+    r_t = c.register(1, 'T', 1)
+    c.logical_and(r_a[0], r_a[1], r_t[0])
+    with pytest.raises(AssertionError):
+        c.simulate()
+
+    c = Circuit()
+    r_a = c.register(2, 'A', 3)
+    r_t = c.register(1, 'T')
+    c.logical_and_uncompute(r_a[0], r_a[1], r_t[0])
+    with pytest.raises(AssertionError):
+        c.simulate()
+
+def test_gidney_reverse():
+    # Reversal swaps each AND with its uncompute, so reversed adders subtract at the same cost
+    for store in ('list', 'columnar', 'hierarchical'):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+        c = Circuit(store=store)
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits + 1, 'B', y)
+        r_c = c.register(n_qubits, 'C')
+        c.add_gidney(r_a, r_b, reg_carry=r_c)
+        c.reverse(c.add_gidney, r_a, r_b, reg_carry=r_c)
+        c.reverse(c.add_gidney, r_a, r_b, reg_carry=r_c)
+        assert c.readout(r_b)[0] == (y - x) % 2 ** (n_qubits + 1)
+
+def test_gidney_multiply():
+    for method in ('schoolbook', 'karatsuba'):
+        for _ in range(10):
+            x, y = np.random.randint(2 ** 10, size=(2))
+            c = Circuit()
+            r_a = c.register(10, 'A', x)
+            r_b = c.register(10, 'B', y)
+            r_d = c.multiply(r_a, r_b, method=method, cutoff=3, adder='gidney')
+            assert c.readout(r_d)[0] == x * y
+            assert c.readout(r_a)[0] == x
+
+        cuccaro = Circuit(mode='count')
+        r_a = cuccaro.register(10, 'A')
+        r_b = cuccaro.register(10, 'B')
+        cuccaro.multiply(r_a, r_b, method=method, cutoff=3)
+        gidney = Circuit(mode='count')
+        r_a = gidney.register(10, 'A')
+        r_b = gidney.register(10, 'B')
+        gidney.multiply(r_a, r_b, method=method, cutoff=3, adder='gidney')
+        assert gidney.counts()[2] < 0.6 * cuccaro.counts()[2]
+
+def test_gidney_divide():
+    for _ in range(20):
+        x = np.random.randint(2 ** n_qubits)
+        y = np.random.randint(1, 2 ** (n_qubits // 2))
+        for divide in ('divide', 'divide_nonrestoring'):
+            c = Circuit()
+            r_a = c.register(n_qubits, 'A', x)
+            r_b = c.register(n_qubits // 2, 'B', y)
+            r_r, r_q = getattr(c, divide)(r_a, r_b, adder='gidney')
+            reference = Circuit()
+            r_a = reference.register(n_qubits, 'A', x)
+            r_b = reference.register(n_qubits // 2, 'B', y)
+            ref_r, ref_q = getattr(reference, divide)(r_a, r_b)
+            assert c.readout(r_r)[0] == reference.readout(ref_r)[0]
+            assert c.readout(r_q)[0] == reference.readout(ref_q)[0]
+
+def test_unknown_adder():
+    c = Circuit()
+    r_a = c.register(4, 'A')
+    r_b = c.register(4, 'B')
+    with pytest.raises(Exception):
+        c.multiply(r_a, r_b, adder='ripple')
+
+def test_gidney_batch():
+    x, y = np.random.randint(2 ** n_qubits, size=(2, 1000))
+    c = Circuit()
+    r_a = c.register(n_qubits, 'A')
+    r_b = c.register(n_qubits + 1, 'B')
+    c.add_gidney(r_a, r_b)
+    out_a, out_b = c.run_batch({r_a: x, r_b: y}, outputs=[r_a, r_b])
+    assert (out_a == x).all()
+    assert (out_b == x + y).all()
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,89 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+from qmpa.gates import Alloc, CNOT
+from qmpa.templates import Call
+
+n_qubits = 5
+n_tests = 20
+
+def build_multiply(x, y, store):
+    c = Circuit(store=store)
+    r_a = c.register(n_qubits, 'A', x)
+    r_b = c.register(n_qubits, 'B', y)
+    r_d = c.multiply(r_a, r_b, precision=3)
+    return c, r_d
+
+def test_hierarchical_multiply():
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+        c, r_d = build_multiply(x, y, 'hierarchical')
+        flat, _ = build_multiply(x, y, 'list')
+
+        assert c.readout(r_d)[0] == flat.readout(r_d)[0]
+        assert c.counts() == flat.counts()
+        assert c.circuit_len() == flat.circuit_len()
+        assert c.allocator.max_mem == flat.allocator.max_mem
+
+        # One call per adder and controlled copy, the gates are held once per block
+        assert len(c.circuit) < flat.circuit_len() // 10
+        assert sum(isinstance(gate, Call) for gate in c.circuit) == 6 * n_qubits
+        assert [type(gate) for gate in c.gates()] == [type(gate) for gate in flat.gates()]
+        assert c.depth() == flat.depth()
+
+@pytest.mark.parametrize('adder', ['cuccaro', 'gidney'])
+def test_hierarchical_depth(adder):
+    # Calls share qubits with their neighbours, the depth still matches the flattened circuit
+    depths = []
+    for store in ('list', 'hierarchical'):
+        c = Circuit(store=store)
+        r_a = c.register(16, 'A')
+        r_b = c.register(16, 'B')
+        c.multiply(r_a, r_b, adder=adder)
+        c.divide(r_a, r_b, adder=adder)
+        c.sub_mod(r_a, r_b, 2 ** 16 - 3, adder=adder)
+        depths.append((c.depth(), c.toffoli_depth()))
+    assert depths[0] == depths[1]
+
+def test_hierarchical_reverse():
+    c = Circuit(store='hierarchical')
+    r_a = c.register(n_qubits, 'A', 7)
+    r_b = c.register(n_qubits + 1, 'B', 12)
+    c.add(r_a, r_b)
+    c.subtract(r_a, r_b)
+    c.subtract(r_a, r_b)
+
+    calls = [gate for gate in c.circuit if isinstance(gate, Call)]
+    assert [call.inverse_flag for call in calls] == [False, True, True]
+    assert len(set(id(call.template) for call in calls)) == 1
+    assert 5 == c.readout(r_b)[0]
+    assert c.depth() == 3 * (5 * n_qubits + 2)
+
+def test_reverse_segment():
+    for _ in range(n_tests):
+        x = np.random.randint(2 ** n_qubits)
+        c = Circuit()
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits, 'B')
+
+        def uncompute():
+            c.cpy(r_a, r_b)
+            c.free(r_b)
+
+        with pytest.raises(Exception):
+            c.reverse(uncompute)
+
+        c = Circuit()
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits, 'B', 3)
+        c.free(r_b, final_value=3)
+        c.reverse(uncompute, permit_rev_alloc=True)
+
+        # The free becomes an alloc and runs before the copy
+        assert [type(gate) for gate in c.gates()][-n_qubits - 1:] == [Alloc] + [CNOT] * n_qubits
+        assert len(c.circuit) == 4
+        assert x == c.readout(r_b)[0]
+
+if __name__ == '__main__':
+    pytest.main()
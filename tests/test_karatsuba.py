@@ -0,0 +1,51 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit, karatsuba_garbage
+
+n_tests = 10
+
+def build(x, y, n_a, n_b, cutoff=3, mode='build', method='karatsuba'):
+    c = Circuit(mode=mode)
+    r_a = c.register(n_a, 'A', x)
+    r_b = c.register(n_b, 'B', y)
+    r_d = c.multiply(r_a, r_b, method=method, cutoff=cutoff)
+    return c, r_a, r_b, r_d
+
+@pytest.mark.parametrize('n_a, n_b', [(4, 4), (7, 5), (3, 9), (12, 12), (13, 18)])
+def test_karatsuba(n_a, n_b):
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_a), np.random.randint(2 ** n_b)
+        c, r_a, r_b, r_d = build(x, y, n_a, n_b)
+
+        assert c.readout(r_d)[0] == x * y
+        assert c.readout(r_a)[0] == x
+        assert c.readout(r_b)[0] == y
+        assert c.allocator.live_mem == n_a + n_b + len(r_d)
+
+def test_karatsuba_subquadratic():
+    n = 256
+    karatsuba, _, _, _ = build(0, 0, n, n, cutoff=16, mode='count')
+    schoolbook, _, _, _ = build(0, 0, n, n, mode='count', method='schoolbook')
+    assert karatsuba.counts()[0] < 0.75 * schoolbook.counts()[0]
+
+def test_karatsuba_fallback():
+    # Operands below the cutoff use the shift and add multiplier
+    karatsuba, _, _, _ = build(0, 0, 8, 8, cutoff=8)
+    schoolbook, _, _, _ = build(0, 0, 8, 8, method='schoolbook')
+    assert karatsuba.counts() == schoolbook.counts()
+    assert karatsuba_garbage(8, 8, 8) == 0
+
+def test_karatsuba_arguments():
+    c = Circuit()
+    r_a = c.register(8, 'A')
+    r_b = c.register(8, 'B')
+    with pytest.raises(Exception):
+        c.multiply_karatsuba(r_a, r_b, cutoff=2)
+    with pytest.raises(Exception):
+        c.multiply(r_a, r_b, precision=3, method='karatsuba')
+    with pytest.raises(Exception):
+        c.multiply(r_a, r_b, method='toom')
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,103 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+from qmpa.optimize import cancel_inverses
+
+n_qubits = 5
+n_tests = 20
+
+def test_reuse_fragmented():
+    c = Circuit()
+    r_a = c.register(2, 'A', 3)
+    r_b = c.register(3, 'B', 5)
+    c.free(r_a, final_value=3)
+    r_c = c.register(3, 'C', 6)
+    assert c.allocator.max_mem == 8
+
+    layout = c.reallocate()
+    assert (layout.width_before, layout.width_after) == (8, 6)
+    assert len(c()) == 6
+    assert [5, 6] == c.readout(r_b, r_c)
+
+    with pytest.raises(Exception):
+        c.X(r_b[0])
+
+def test_reuse_views():
+    # Only the columnar store holds the compiled gates, so only its views are recoloured
+    for store, qubit in (('list', 7), ('hierarchical', 7), ('columnar', 5)):
+        c = Circuit(store=store)
+        r_a = c.register(2, 'A', 3)
+        c.register(3, 'B', 5)
+        c.free(r_a, final_value=3)
+        r_c = c.register(3, 'C', 6)
+        c.X(r_c[2])
+        c.reallocate()
+        assert list(c.gates())[-1].qargs()[0] == qubit
+        assert c.readout(r_c)[0] == 2
+
+def test_reuse_chained_multiply():
+    c = Circuit(store='columnar')
+    r_a = c.register(n_qubits, 'A')
+    r_b = c.register(n_qubits, 'B')
+    r_d = c.multiply(r_a, r_b)
+    c.free(r_a)
+    c.free(r_b)
+    r_e = c.register(n_qubits, 'E')
+    r_f = c.multiply(r_d, r_e)
+    width = c.allocator.max_mem
+
+    layout = c.reallocate()
+    assert layout.width_before == width
+    assert layout.width_after < width
+
+    for _ in range(n_tests):
+        x, y, z = np.random.randint(2 ** n_qubits, size=(3))
+        c = Circuit(store='columnar')
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits, 'B', y)
+        r_d = c.multiply(r_a, r_b)
+        c.free(r_a, final_value=x)
+        c.free(r_b, final_value=y)
+        r_e = c.register(n_qubits, 'E', z)
+        r_f = c.multiply(r_d, r_e)
+        expected = c.readout(r_f)[0]
+        c.reallocate()
+        assert expected == c.readout(r_f)[0] == x * y * z
+
+def test_reuse_frozen():
+    # The layout only holds for the compiled gates, so the circuit cannot be rewritten afterwards
+    c = Circuit()
+    r_a = c.register(n_qubits, 'A', 5)
+    r_t = c.register(n_qubits, 'T')
+    c.cpy(r_a, r_t)
+    c.cpy(r_a, r_t)
+    c.free(r_t)
+    r_b = c.register(n_qubits + 1, 'B', 3)
+    c.add(r_a, r_b)
+    c.X(r_b[0])
+    c.X(r_b[0])
+    c.reallocate()
+
+    with pytest.raises(Exception):
+        cancel_inverses(c)
+    with pytest.raises(Exception):
+        c.invalidate()
+    assert c.readout(r_b)[0] == 8
+
+def test_reuse_batch():
+    c = Circuit()
+    r_a = c.register(n_qubits, 'A')
+    r_b = c.register(n_qubits, 'B')
+    r_d = c.multiply(r_a, r_b)
+    r_e = c.register(2 * n_qubits + 1, 'E')
+    c.add(r_d[:2 * n_qubits], r_e)
+    assert c.reallocate().width_after <= c.allocator.max_mem
+
+    x = np.random.randint(2 ** n_qubits, size=50)
+    y = np.random.randint(2 ** n_qubits, size=50)
+    out, = c.run_batch({r_a: x, r_b: y}, outputs=[r_e])
+    assert (np.asarray(out) == x * y).all()
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,90 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+from qmpa.gates import And
+
+moduli = [(4, 13), (5, 29), (6, 59)]
+
+@pytest.mark.parametrize('adder', ['cuccaro', 'gidney'])
+@pytest.mark.parametrize('n, modulus', moduli + [(3, 8), (4, 16), (4, 9)])
+def test_add_mod(n, modulus, adder):
+    for _ in range(50):
+        x, y = np.random.randint(modulus, size=(2))
+        c = Circuit()
+        r_a = c.register(n, 'A', x)
+        r_b = c.register(n, 'B', y)
+        c.add_mod(r_a, r_b, modulus, adder=adder)
+        assert c.readout(r_b)[0] == (x + y) % modulus
+        c.sub_mod(r_a, r_b, modulus, adder=adder)
+        assert c.readout(r_b)[0] == y
+        assert c.readout(r_a)[0] == x
+
+@pytest.mark.parametrize('w', [1, 2, 4])
+def test_lookup(w):
+    for _ in range(10):
+        table = np.random.randint(8, size=1 << w) * (np.random.rand(1 << w) < 0.7)
+        for k in range(1 << w):
+            c = Circuit()
+            r_k = c.register(w, 'K', k)
+            r_t = c.register(3, 'T', 5)
+            c.lookup(r_k, table, r_t)
+            assert c.readout(r_t)[0] == 5 ^ int(table[k])
+            assert c.readout(r_k)[0] == k
+
+    # Unary iteration over a full table
+    c = Circuit()
+    c.lookup(c.register(w, 'K'), [1] * (1 << w), c.register(3, 'T'))
+    assert sum(type(gate) is And for gate in c.gates()) == 2 ** w - 2
+
+@pytest.mark.parametrize('n, modulus', moduli)
+def test_mul_mod(n, modulus):
+    for _ in range(10):
+        x = np.random.randint(2 ** 4)
+        y, t = np.random.randint(modulus, size=(2))
+        c = Circuit()
+        r_a = c.register(4, 'A', x)
+        r_b = c.register(n, 'B', y)
+        r_t = c.register(n, 'T', t)
+        c.mul_mod(r_a, r_b, modulus, target_reg=r_t)
+        assert c.readout(r_t)[0] == (t * 2 ** 4 + x * y) % modulus
+        assert c.readout(r_b)[0] == y
+
+@pytest.mark.parametrize('window', [1, 2, 3])
+def test_mul_mod_const(window):
+    n, modulus = 6, 59
+    for _ in range(10):
+        x = np.random.randint(modulus)
+        value = np.random.randint(1, modulus)
+        c = Circuit()
+        r_a = c.register(n, 'A', x)
+        r_t = c.mul_mod_const(r_a, value, modulus, window=window)
+        assert c.readout(r_t)[0] == x * value % modulus
+
+        c.mul_mod_const(r_a, value, modulus, in_place=True, window=window)
+        assert c.readout(r_a)[0] == x * value % modulus
+
+def test_mul_mod_arguments():
+    c = Circuit()
+    r_a = c.register(4, 'A')
+    r_b = c.register(4, 'B')
+    with pytest.raises(Exception):
+        c.mul_mod_const(r_a, 3, 15, in_place=True)
+    with pytest.raises(Exception):
+        c.mul_mod(r_a, r_b, 14)
+
+@pytest.mark.parametrize('adder', ['cuccaro', 'gidney'])
+@pytest.mark.parametrize('window_exp, window_mul', [(1, 1), (2, 3), (3, 2)])
+def test_exp_mod(window_exp, window_mul, adder):
+    n_e, modulus = 6, 59
+    for _ in range(5):
+        e = np.random.randint(2 ** n_e)
+        base = np.random.choice([2, 3, 5, 7, 11])
+        c = Circuit()
+        r_e = c.register(n_e, 'E', e)
+        r_t = c.exp_mod(r_e, base, modulus, window_exp=window_exp, window_mul=window_mul, adder=adder)
+        assert c.readout(r_t)[0] == pow(int(base), int(e), modulus)
+        assert c.readout(r_e)[0] == e
+
+if __name__ == '__main__':
+    pytest.main()
@@ -36,7 +36,17 @@ def test_multiply_reverse():
             assert(0 == c.readout(r_d)[0])
         except:
             pass
-            
+
+def test_multiply_bound_inputs():
+    # Construct once, bind operands at execution
+    c = Circuit()
+    r_a = c.register(n_qubits, 'A')
+    r_b = c.register(n_qubits, 'B')
+    r_d = c.multiply(r_a, r_b)
+
+    for i in range(n_tests):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+        assert(x * y == c.readout(r_d, inputs={r_a: x, r_b: y})[0])
 
 if __name__ == '__main__':
     pytest.main()
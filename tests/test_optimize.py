@@ -0,0 +1,54 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+from qmpa.optimize import cancel_inverses
+
+n_qubits = 5
+n_tests = 20
+
+def test_cancel_add_subtract():
+    for store in ('list', 'columnar', 'hierarchical'):
+        c = Circuit(store=store)
+        reg_carry = c.register(1, 'carry')
+        r_a = c.register(n_qubits, 'A', 5)
+        r_b = c.register(n_qubits + 1, 'B', 9)
+        c.add(r_a, r_b, reg_carry=reg_carry)
+        c.subtract(r_a, r_b, reg_carry=reg_carry)
+
+        eliminated = cancel_inverses(c)
+        assert eliminated == dict(x=0, cnot=2 * (4 * n_qubits + 1), toffoli=4 * n_qubits)
+        assert c.counts() == (0, 0, 0)
+        assert c.circuit_len() == 3
+        assert 9 == c.readout(r_b)[0]
+
+def test_cancel_commuting():
+    c = Circuit()
+    r_a = c.register(3, 'A', 3)
+    c.toffoli(r_a[0], r_a[1], r_a[2])
+    c.cnot(r_a[0], r_a[1]) # Targets a control, blocks the pair
+    c.toffoli(r_a[1], r_a[0], r_a[2])
+    c.cnot(r_a[1], r_a[2])
+    c.X(r_a[0])
+    c.cnot(r_a[1], r_a[2]) # Commutes past the X on a disjoint qubit
+    assert cancel_inverses(c) == dict(x=0, cnot=2, toffoli=0)
+    assert c.circuit_len() == 5
+
+def test_cancel_multiply():
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+        c = Circuit()
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits, 'B', y)
+        r_d = c.multiply(r_a, r_b, precision=1)
+        expected = c.readout(r_d)[0]
+        toffoli_count = c.toffoli_count
+
+        eliminated = cancel_inverses(c)
+        assert eliminated['toffoli'] > 0
+        assert c.toffoli_count == toffoli_count - eliminated['toffoli']
+        assert c.toffoli_count == sum(type(gate).__name__ == 'Toffoli' for gate in c.circuit)
+        assert expected == c.readout(r_d)[0]
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,82 @@
+import json
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+
+n_qubits = 8
+
+def build_divide(mode='count', profile=True):
+    c = Circuit(mode=mode)
+    profiler = c.profile() if profile else None
+    r_a = c.register(n_qubits, 'A', 200)
+    r_b = c.register(n_qubits // 2, 'B', 7)
+    c.divide(r_a, r_b)
+    return c, profiler
+
+def test_profile_disabled():
+    c, _ = build_divide(profile=False)
+    assert c.allocator.profiler is None
+
+def test_profile_curve():
+    for mode in ('count', 'build'):
+        c, profiler = build_divide(mode)
+        gates, widths = profiler.curve()
+        assert len(gates) == len(profiler)
+        assert (np.diff(gates) >= 0).all()
+        assert widths.max() == c.allocator.peak_live_mem
+        assert widths[-1] == c.allocator.live_mem
+        assert gates[-1] <= c.circuit_len()
+
+def test_profile_peak():
+    c, profiler = build_divide()
+    width, gate, chunks = profiler.peak()
+    assert width == c.allocator.peak_live_mem
+    assert sum(size for _, size, _ in chunks) == width
+    names = {name: operation for name, _, operation in chunks}
+    assert names['A'] == '' and names['Remainder'] == 'divide'
+    assert names['DIVANC'] == names['Carry'] == 'divide'
+
+def test_profile_multiply_names():
+    c = Circuit(mode='count')
+    profiler = c.profile()
+    r_a = c.register(n_qubits, 'A')
+    r_b = c.register(n_qubits, 'B')
+    c.multiply(r_a, r_b)
+    _, _, chunks = profiler.peak()
+    assert ('MULCPY', 2 * n_qubits, 'multiply') in chunks
+
+def test_profile_nested_operations():
+    c = Circuit(mode='count')
+    profiler = c.profile()
+    r_a = c.register(n_qubits, 'A')
+    r_b = c.register(n_qubits + 1, 'B')
+    c.subtract(r_a, r_b)
+    assert [event.operation for event in profiler.events[2:]] == ['subtract', 'subtract']
+    # The carry of the subtract is passed through to the add
+    assert all(event.name == 'carry' for event in profiler.events[2:])
+
+def test_profile_partial_free():
+    c = Circuit()
+    profiler = c.profile()
+    reg = c.allocator.alloc(6, name='reg')
+    c.allocator.partial_free_end(reg, 2)
+    c.allocator.partial_free_start(reg, 1)
+    assert [event.kind for event in profiler.events] == ['alloc', 'free_end', 'free_start']
+    gates, widths = profiler.curve()
+    assert widths.tolist() == [6, 4, 3]
+
+def test_profile_export(tmp_path):
+    c, profiler = build_divide()
+    text = profiler.to_csv(tmp_path / 'events.csv')
+    assert text.splitlines()[0] == 'kind,gate,chunk,name,size,start,operation'
+    assert len(text.splitlines()) == len(profiler) + 1
+    assert (tmp_path / 'events.csv').read_text() == text
+
+    report = json.loads(profiler.to_json(tmp_path / 'events.json'))
+    assert len(report['events']) == len(profiler)
+    assert report['peak']['width'] == c.allocator.peak_live_mem
+    assert report['curve']['width'] == profiler.curve()[1].tolist()
+
+if __name__ == '__main__':
+    pytest.main()
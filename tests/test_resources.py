@@ -0,0 +1,79 @@
+import pytest
+import numpy as np
+
+from qmpa import resources
+from qmpa.circuit import Circuit
+from qmpa.gates import OP_X, OP_CNOT, OP_TOFFOLI
+
+def depth(c):
+    '''
+        ASAP depth of the compiled circuit, Alloc and Free take no time
+    '''
+    opcodes, ctrl_a, ctrl_b, targ = (column.tolist() for column in c.compile().columns())
+    ready = np.zeros(c.allocator.max_mem, dtype=np.int64)
+    for op, a, b, t in zip(opcodes, ctrl_a, ctrl_b, targ):
+        qubits = {OP_X: (t,), OP_CNOT: (a, t), OP_TOFFOLI: (a, b, t)}.get(op, ())
+        if qubits:
+            layer = max(ready[q] for q in qubits) + 1
+            for q in qubits:
+                ready[q] = layer
+    return int(ready.max(initial=0))
+
+def measure(op, n_a, n_b, **kwargs):
+    c = Circuit()
+    r_a = c.register(n_a, 'A')
+    r_b = c.register(n_b, 'B')
+    getattr(c, op)(r_a, r_b, **kwargs)
+    return resources.Resources(*c.counts(), c.allocator.max_mem, depth(c), c.circuit_len() - 2)
+
+@pytest.mark.parametrize('n', [1, 2, 5, 8])
+def test_adder_resources(n):
+    assert measure('add', n, n + 1) == resources.add(n, n + 1)
+    assert measure('subtract', n, n + 1) == resources.subtract(n, n + 1)
+    assert measure('add', n, n, carry=False) == resources.add(n, carry=False)
+
+@pytest.mark.parametrize('n_a, n_b', [(1, 1), (2, 5), (4, 4), (6, 3)])
+def test_multiply_resources(n_a, n_b):
+    assert measure('multiply', n_a, n_b) == resources.multiply(n_a, n_b)
+    for precision in range(1, n_b + 3):
+        assert measure('multiply', n_a, n_b, precision=precision) == resources.multiply(n_a, n_b, precision=precision)
+    with pytest.raises(Exception):
+        resources.multiply(n_a, n_b, precision=n_b + 3)
+
+@pytest.mark.parametrize('n_a, n_b', [(1, 1), (4, 2), (6, 3), (7, 7)])
+def test_divide_resources(n_a, n_b):
+    assert measure('divide', n_a, n_b) == resources.divide(n_a, n_b)
+
+def test_resources_large():
+    n = 2048
+    c = Circuit(mode='count')
+    r_a = c.register(n, 'A')
+    r_b = c.register(n, 'B')
+    c.multiply(r_a, r_b)
+    assert c.counts() == resources.multiply(n, n)[:3]
+
+def measure_modular(c):
+    return resources.ModularResources(c.counts()[0], c.counts()[2], c.allocator.max_mem)
+
+@pytest.mark.parametrize('n, modulus', [(4, 13), (6, 59), (7, 101)])
+def test_modular_resources(n, modulus):
+    c = Circuit(mode='count')
+    c.add_mod(c.register(n, 'A'), c.register(n, 'B'), modulus)
+    assert measure_modular(c) == resources.add_mod(n)
+
+    c = Circuit(mode='count')
+    c.mul_mod(c.register(3, 'A'), c.register(n, 'B'), modulus)
+    assert measure_modular(c) == resources.mul_mod(3, n)
+
+    for window in (1, 2, 3):
+        for in_place in (False, True):
+            c = Circuit(mode='count')
+            c.mul_mod_const(c.register(n, 'A'), 5, modulus, window=window, in_place=in_place)
+            assert measure_modular(c) == resources.mul_mod_const(n, window, in_place)
+        for window_exp in (1, 2, 3):
+            c = Circuit(mode='count')
+            c.exp_mod(c.register(5, 'E'), 5, modulus, window_exp=window_exp, window_mul=window)
+            assert measure_modular(c) == resources.exp_mod(5, n, window_exp, window)
+
+if __name__ == '__main__':
+    pytest.main()
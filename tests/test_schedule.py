@@ -0,0 +1,63 @@
+import pytest
+
+from qmpa import resources
+from qmpa.circuit import Circuit
+from qmpa.schedule import op_qubits
+
+n_qubits = 6
+
+def build(op, n_a, n_b, store='list', **kwargs):
+    c = Circuit(store=store)
+    r_a = c.register(n_a, 'A')
+    r_b = c.register(n_b, 'B')
+    getattr(c, op)(r_a, r_b, **kwargs)
+    return c
+
+@pytest.mark.parametrize('n', [1, 3, n_qubits])
+def test_adder_depth(n):
+    c = build('add', n, n + 1)
+    assert c.depth() == 5 * n + 2
+    # MAJ and UMA Toffolis form a single chain through the carry
+    assert c.toffoli_depth() == 2 * n
+
+def test_depth_matches_resources():
+    for store in ('list', 'columnar'):
+        c = build('multiply', n_qubits, n_qubits, store=store)
+        assert c.depth() == resources.multiply(n_qubits, n_qubits).depth
+        c = build('divide', n_qubits, n_qubits // 2, store=store)
+        assert c.depth() == resources.divide(n_qubits, n_qubits // 2).depth
+
+def test_layers():
+    c = build('multiply', n_qubits, n_qubits)
+    schedule = c.schedule()
+    program = c.compile()
+    layers = schedule.layers()
+    assert len(layers) == c.depth()
+
+    opcodes, ctrl_a, ctrl_b, targ = (column.tolist() for column in program.columns())
+    scheduled = 0
+    for ops in layers:
+        qubits = [q for i in ops for q in op_qubits(opcodes[i], ctrl_a[i], ctrl_b[i], targ[i])]
+        assert len(qubits) == len(set(qubits))
+        scheduled += len(ops)
+    assert scheduled == int((schedule.layer > 0).sum())
+
+def test_incremental_schedule():
+    c = Circuit()
+    reg_carry = c.register(1, 'carry')
+    r_a = c.register(n_qubits, 'A')
+    r_b = c.register(n_qubits + 1, 'B')
+    c.add(r_a, r_b, reg_carry=reg_carry)
+    schedule = c.schedule()
+    c.add(r_a, r_b, reg_carry=reg_carry)
+    assert c.schedule() is schedule
+    assert c.depth() == 2 * (5 * n_qubits + 2)
+    assert c.toffoli_depth() == 4 * n_qubits
+
+    # Reversal rewrites the tail so the schedule is rebuilt
+    c.reverse(c.add, r_a, r_b, reg_carry=reg_carry)
+    assert c.schedule() is not schedule
+    assert c.depth() == 3 * (5 * n_qubits + 2)
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,79 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+
+n_qubits = 5
+n_tests = 20
+
+def test_incremental_readout():
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+
+        c = Circuit()
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits, 'B', y)
+        r_d = c.multiply(r_a, r_b)
+        assert x * y == c.readout(r_d)[0]
+        n_ops = c.simulate().n_ops
+
+        r_e = c.register(2 * n_qubits + 2, 'E')
+        c.add(r_d, r_e)
+        assert c.simulate().n_ops > n_ops
+        assert x * y == c.readout(r_e)[0]
+        assert x * y == c.readout(r_d)[0]
+
+def test_reverse_invalidates():
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+
+        c = Circuit()
+        reg_carry = c.register(1, 'carry')
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits + 1, 'B', y)
+        c.add(r_a, r_b)
+        assert x + y == c.readout(r_b)[0]
+
+        c.reverse(c.add, r_a, r_b, reg_carry=reg_carry)
+        assert y == c.readout(r_b)[0]
+        assert c.simulate().n_gates == len(c.circuit)
+
+def test_checkpoint_resume():
+    c = Circuit()
+    r_a = c.register(n_qubits, 'A')
+    r_b = c.register(n_qubits, 'B')
+    r_d = c.multiply(r_a, r_b)
+
+    x, y = np.random.randint(2 ** n_qubits, size=(2))
+    inputs = {r_a: x, r_b: y}
+    saved = c.checkpoint('product', inputs=inputs)
+    assert saved.n_gates == c.circuit_len()
+
+    r_e = c.register(2 * n_qubits + 2, 'E')
+    c.add(r_d, r_e)
+
+    # Different inputs discard the cached state
+    assert 3 == c.readout(r_e, inputs={r_a: 1, r_b: 3})[0]
+
+    c.resume('product')
+    assert c.simulate(inputs=inputs).n_ops > saved.n_ops
+    assert x * y == c.readout(r_e, inputs=inputs)[0]
+
+    with pytest.raises(Exception):
+        c.resume('missing')
+
+def test_checkpoints_survive_reverse():
+    c = Circuit()
+    reg_carry = c.register(1, 'carry')
+    r_a = c.register(n_qubits, 'A', 3)
+    r_b = c.register(n_qubits + 1, 'B', 10)
+    c.checkpoint('start')
+    c.reverse(c.add, r_a, r_b, reg_carry=reg_carry)
+    c.checkpoint('end')
+    assert 'start' in c.checkpoints
+    c.reverse(c.add, r_a, r_b, reg_carry=reg_carry)
+    assert 'end' in c.checkpoints
+    assert 4 == c.readout(r_b)[0]
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,62 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+
+n_tests = 50
+
+def truncated_square(x, n, precision):
+    # Terms of the symmetric layout, a_i at 2i and a_i a_j at i + j + 1 for i < j
+    cutoff = 2 * n + 1 - precision
+    bits = [(x >> i) & 1 for i in range(n)]
+    total = sum(4 ** i for i in range(n) if bits[i] and 2 * i >= cutoff)
+    for i in range(n):
+        for j in range(i + 1, n):
+            if bits[i] and bits[j] and i + j + 1 >= cutoff:
+                total += 2 ** (i + j + 1)
+    return total
+
+@pytest.mark.parametrize('n', range(1, 11))
+def test_square(n):
+    for _ in range(n_tests):
+        x = np.random.randint(2 ** n)
+        c = Circuit()
+        r_a = c.register(n, 'A', x)
+        r_s = c.square(r_a)
+        assert c.readout(r_s)[0] == x * x
+        assert c.readout(r_a)[0] == x
+
+@pytest.mark.parametrize('n', [4, 7])
+def test_square_precision(n):
+    for precision in range(1, n + 3):
+        for _ in range(10):
+            x = np.random.randint(2 ** n)
+            c = Circuit()
+            r_a = c.register(n, 'A', x)
+            r_s = c.square(r_a, precision=precision)
+            assert c.readout(r_s)[0] == truncated_square(x, n, precision)
+
+def test_square_gidney():
+    for _ in range(n_tests):
+        x = np.random.randint(2 ** 8)
+        c = Circuit()
+        r_a = c.register(8, 'A', x)
+        r_s = c.square(r_a, adder='gidney')
+        assert c.readout(r_s)[0] == x * x
+
+def test_square_costs():
+    # Half the controlled copies and narrower additions than multiplying by a copy
+    for n in (8, 16, 32):
+        square = Circuit(mode='count')
+        r_a = square.register(n, 'A')
+        square.square(r_a)
+        multiply = Circuit(mode='count')
+        r_a = multiply.register(n, 'A')
+        r_b = multiply.register(n, 'B')
+        multiply.multiply(r_a, r_b)
+        assert square.counts()[0] == 2 * n * n + 2 * n
+        assert square.counts()[0] < 0.5 * multiply.counts()[0]
+        assert square.allocator.max_mem < multiply.allocator.max_mem
+
+if __name__ == '__main__':
+    pytest.main()
@@ -0,0 +1,59 @@
+import pytest
+import numpy as np
+
+from qmpa.circuit import Circuit
+from qmpa.templates import TemplateCache
+
+n_qubits = 5
+n_tests = 20
+
+def build_multiply(x, y, **kwargs):
+    c = Circuit(**kwargs)
+    r_a = c.register(n_qubits, 'A', x)
+    r_b = c.register(n_qubits, 'B', y)
+    r_d = c.multiply(r_a, r_b)
+    return c, r_d
+
+@pytest.mark.parametrize('store', ['list', 'columnar'])
+def test_template_multiply(store):
+    for _ in range(n_tests):
+        x, y = np.random.randint(2 ** n_qubits, size=(2))
+        c, r_d = build_multiply(x, y, store=store, templates=TemplateCache())
+        assert x * y == c.readout(r_d)[0]
+
+        reference, _ = build_multiply(x, y, store=store)
+        assert c.counts() == reference.counts()
+        assert c.circuit_len() == reference.circuit_len()
+        for column, expected in zip(c.compile().columns(), reference.compile().columns()):
+            assert (column == expected).all()
+
+def test_template_divide():
+    cache = TemplateCache()
+    for _ in range(n_tests):
+        x = np.random.randint(1, 2 ** n_qubits)
+        y = np.random.randint(1, 2 ** (n_qubits // 2))
+        c = Circuit(templates=cache)
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits // 2, 'B', y)
+        r_r, r_q = c.divide(r_a, r_b)
+        r, q = c.readout(r_r, r_q)
+        assert r + q * y == x
+
+    # Every later circuit is assembled entirely from cached patterns
+    assert cache.misses == len(cache)
+    assert cache.hits > 0
+
+def test_template_cache_stats():
+    cache = TemplateCache(maxsize=1)
+    c, _ = build_multiply(3, 5, templates=cache)
+    # One Ccpy pattern and one adder pattern per row
+    assert cache.misses == 2 * n_qubits + 1
+    assert cache.evictions == cache.misses - 1
+    assert len(cache) == 1
+
+    cache = TemplateCache()
+    c, _ = build_multiply(3, 5, templates=cache)
+    assert cache.stats() == dict(hits=2 * n_qubits - 1, misses=n_qubits + 1, evictions=0, size=n_qubits + 1)
+
+if __name__ == '__main__':
+    pytest.main()
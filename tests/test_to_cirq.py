@@ -46,3 +46,16 @@ def test_addition(n_qubits=4):
         assert x == out_r_a
         assert x + y == out_r_b
 
+
+def test_columnar_store(n_qubits=4):
+    x, y = np.random.randint(2 ** n_qubits, size=(2))
+
+    circuits = []
+    for store in ('list', 'columnar'):
+        c = Circuit(store=store)
+        r_a = c.register(n_qubits, 'A', x)
+        r_b = c.register(n_qubits + 1, 'B', y)
+        c.add(r_a, r_b)
+        circuits.append(adapters_cirq.to_cirq(c))
+
+    assert circuits[0] == circuits[1]